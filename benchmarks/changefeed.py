@@ -0,0 +1,159 @@
+"""
+Fan-out benchmark for the change feed broker at `--clients` connected clients in one worker (10k
+by default). Each client is an asyncio task consuming `project.changefeed.stream`, the generator
+behind `GET /changes`, so the numbers cover subscription, filtering, queueing and SSE framing but
+not socket writes. Scenarios:
+
+* spread   - every client belongs to a different user; each event reaches one client
+* per_list - all clients belong to one user and each watches one of 100 lists; each event
+             reaches 1% of the clients
+* broadcast - all clients belong to one user and watch all lists; each event reaches every client
+
+For each scenario it reports the publish cost per event, the latency from publishing until each
+client has received the frame (p50/p95/p99) and the time until the last client has it, plus the
+memory held per connected client. No database is needed.
+
+Usage:
+    python -m benchmarks.changefeed --clients 10000 --events 200
+    python -m benchmarks.changefeed --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+import project.changefeed
+
+from benchmarks.common import compare, summarize, write_results
+
+LISTS = 100
+
+# name -> (user id of client n, list filter of client n, (user id, list id) of event n)
+SCENARIOS = {
+    "spread": (
+        lambda n: n,
+        lambda n: None,
+        lambda n, clients: (n % clients, 0),
+    ),
+    "per_list": (
+        lambda n: 0,
+        lambda n: [n % LISTS],
+        lambda n, clients: (0, n % LISTS),
+    ),
+    "broadcast": (
+        lambda n: 0,
+        lambda n: None,
+        lambda n, clients: (0, n % LISTS),
+    ),
+}
+
+
+class Clients:
+    def __init__(self):
+        self.published_at = 0.0
+        self.pending = 0
+        self.latencies: List[float] = []
+        self.all_received = asyncio.Event()
+
+    async def consume(self, user_id: int, todo_list_ids: Optional[List[int]]) -> None:
+        frames = project.changefeed.stream(user_id, todo_list_ids)
+        await frames.__anext__()  # the opening retry frame
+        async for _ in frames:
+            self.latencies.append(time.perf_counter() - self.published_at)
+            self.pending -= 1
+            if not self.pending:
+                self.all_received.set()
+
+
+async def run_scenario(
+    name: str, clients: int, events: int
+) -> Tuple[Dict[str, float], float]:
+    user_of, lists_of, target_of = SCENARIOS[name]
+    broker = project.changefeed.broker
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    state = Clients()
+    tasks = [
+        asyncio.create_task(state.consume(user_of(n), lists_of(n)))
+        for n in range(clients)
+    ]
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    memory_per_client = (tracemalloc.get_traced_memory()[0] - before) / clients
+    tracemalloc.stop()
+    publish_samples = []
+    fanout_samples = []
+    for n in range(events):
+        user_id, todo_list_id = target_of(n, clients)
+        state.pending = len(broker._subscriptions.get((user_id, None), ())) + len(
+            broker._subscriptions.get((user_id, todo_list_id), ())
+        )
+        state.all_received.clear()
+        state.published_at = time.perf_counter()
+        project.changefeed.publish(
+            "task.updated",
+            user_id,
+            todo_list_id,
+            {"id": n, "todoListId": todo_list_id, "title": f"task {n}", "version": n},
+        )
+        publish_samples.append(time.perf_counter() - state.published_at)
+        await state.all_received.wait()
+        fanout_samples.append(time.perf_counter() - state.published_at)
+    broker.close()
+    await asyncio.gather(*tasks)
+    result = summarize(state.latencies)
+    result["publish_us"] = sum(publish_samples) / len(publish_samples) * 1e6
+    result["fanout_complete_ms"] = sum(fanout_samples) / len(fanout_samples) * 1000
+    result["deliveries_per_event"] = len(state.latencies) / events
+    return result, memory_per_client
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in args.scenarios:
+        result, memory_per_client = await run_scenario(name, args.clients, args.events)
+        result["memory_per_client_kb"] = memory_per_client / 1024
+        results[name] = result
+        print(
+            f"{name:<10}{result['deliveries_per_event']:>10.0f}{result['publish_us']:>12.1f}"
+            f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            f"{result['fanout_complete_ms']:>10.2f}{result['memory_per_client_kb']:>10.1f}"
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    args = parser.parse_args()
+    if args.compare:
+        print(
+            compare(
+                *args.compare,
+                keys=["publish_us", "p50_ms", "p99_ms", "fanout_complete_ms"],
+            )
+        )
+        return
+    print(
+        f"{'scenario':<10}{'reached':>10}{'publish us':>12}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'last ms':>10}{'KB/client':>10}"
+    )
+    results = asyncio.run(run(args))
+    results["config"] = {
+        key: value for key, value in vars(args).items() if key != "compare"
+    }
+    print(f"results written to {write_results('changefeed', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
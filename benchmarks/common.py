@@ -0,0 +1,102 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """
+    Returns the q-th percentile (0-100) of the samples using linear interpolation.
+
+    Example:
+        percentile([1.0, 2.0, 3.0, 4.0], 50)
+        > 2.5
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """
+    Summarizes latency samples (seconds) as milliseconds.
+    """
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(
+    benchmark: str, results: Dict[str, Any], output: Optional[str] = None
+) -> Path:
+    """
+    Writes machine-readable results, tagged with the git revision and environment, to `output`
+    or to benchmarks/results/<benchmark>-<revision>.json.
+
+    Returns:
+        Path: The file that was written.
+    """
+    revision = git_revision() or "unknown"
+    path = Path(output) if output else RESULTS_DIR / f"{benchmark}-{revision}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "benchmark": benchmark,
+        "revision": revision,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    path.write_text(json.dumps(document, indent=2, sort_keys=True))
+    return path
+
+
+def compare(baseline_path: str, candidate_path: str, keys: List[str]) -> str:
+    """
+    Renders a table of the relative change of the given metric keys between two result files
+    written by `write_results`. Results are matched by their top-level name.
+    """
+    baseline = json.loads(Path(baseline_path).read_text())
+    candidate = json.loads(Path(candidate_path).read_text())
+    lines = [f"{baseline['revision']} -> {candidate['revision']}"]
+    for name, before in sorted(baseline["results"].items()):
+        after = candidate["results"].get(name)
+        if not isinstance(before, dict) or not isinstance(after, dict):
+            continue
+        cells = []
+        for key in keys:
+            if key in before and key in after and before[key]:
+                change = (after[key] - before[key]) / before[key] * 100
+                cells.append(
+                    f"{key} {before[key]:.2f} -> {after[key]:.2f} ({change:+.1f}%)"
+                )
+        if cells:
+            lines.append(f"  {name}: " + ", ".join(cells))
+    return "\n".join(lines)
@@ -0,0 +1,115 @@
+"""
+Bandwidth/CPU tradeoff of response compression. Builds `GET /tasks`-shaped and audit-log-shaped
+JSON payloads of increasing size and reports, for each gzip level and brotli quality (when the
+optional `brotli` package is installed), the compression ratio, compression time and throughput.
+
+Usage:
+    python -m benchmarks.compression --sizes 1000 10000 100000
+"""
+
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from project.compression import brotli
+
+from benchmarks.common import write_results
+
+START = datetime(2024, 1, 1)
+
+
+def tasks_payload(rows: int) -> bytes:
+    return json.dumps(
+        {
+            "tasks": [
+                {
+                    "title": f"Task {n}: follow up with the vendor",
+                    "id": n,
+                    "description": "Remember to check for discounts",
+                    "completed": n % 3 == 0,
+                    "due_date": (START + timedelta(hours=n)).isoformat(),
+                }
+                for n in range(rows)
+            ]
+        }
+    ).encode()
+
+
+def audit_payload(rows: int) -> bytes:
+    return json.dumps(
+        {
+            "audit_logs": [
+                {
+                    "id": n,
+                    "action": ("Task Created", "updateTask", "DELETED_TASK")[n % 3],
+                    "timestamp": (START + timedelta(seconds=n)).isoformat(),
+                    "userId": 1,
+                    "todoListId": n // 100,
+                    "taskId": n,
+                }
+                for n in range(rows)
+            ]
+        }
+    ).encode()
+
+
+def codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    result = {
+        f"gzip-{level}": (lambda body, level=level: gzip.compress(body, level, mtime=0))
+        for level in (1, 3, 5, 6, 9)
+    }
+    if brotli is not None:
+        for quality in (1, 4, 6, 9, 11):
+            result[f"br-{quality}"] = lambda body, quality=quality: brotli.compress(
+                body, quality=quality
+            )
+    return result
+
+
+def measure(compress: Callable[[bytes], bytes], body: bytes, repeat: int) -> Dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compressed = compress(body)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "input_bytes": len(body),
+        "output_bytes": len(compressed),
+        "ratio": len(body) / len(compressed),
+        "compress_ms": best * 1000,
+        "throughput_mb_s": len(body) / best / 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    args = parser.parse_args()
+    results = {}
+    payloads: List = [("tasks", tasks_payload), ("audit", audit_payload)]
+    print(f"{'payload':<22}{'codec':<10}{'ratio':>8}{'ms':>10}{'MB/s':>10}")
+    for kind, build in payloads:
+        for rows in args.sizes:
+            body = build(rows)
+            label = f"{kind}-{rows}"
+            for name, compress in codecs().items():
+                result = results[f"{label}/{name}"] = measure(
+                    compress, body, args.repeat
+                )
+                print(
+                    f"{label + f' ({len(body) // 1024}KiB)':<22}{name:<10}"
+                    f"{result['ratio']:>8.1f}{result['compress_ms']:>10.2f}"
+                    f"{result['throughput_mb_s']:>10.1f}"
+                )
+    print(f"results written to {write_results('compression', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Before/after benchmark for the update and delete services. "before" replays the previous
+implementation of each operation (a `find_unique` lookup followed by the write) and "after" calls
+the current service, which checks existence inside a single conditional write. For each operation
+it reports latency percentiles and the number of Prisma round trips per call, with concurrent
+callers so that lock and pool contention show up. Requires DATABASE_URL to point at a scratch
+database with the schema pushed; the benchmark inserts and deletes its own rows.
+
+Usage:
+    python -m benchmarks.conditional_writes --iterations 500 --concurrency 8
+    python -m benchmarks.conditional_writes --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import prisma
+import prisma.models
+import project.background
+import project.database
+import project.delete_log_service
+import project.deleteTask_service
+import project.query_profiler
+import project.updateTask_service
+import project.updateTodoList_service
+
+from benchmarks.common import compare, summarize, write_results
+
+
+async def before_update_todo_list(todo_list_id: int, n: int) -> None:
+    existing = await prisma.models.TodoList.prisma().find_unique(
+        where={"id": todo_list_id}
+    )
+    if not existing:
+        raise ValueError("TodoList not found")
+    await prisma.models.TodoList.prisma().update(
+        where={"id": todo_list_id}, data={"name": f"list {n}", "description": None}
+    )
+
+
+async def after_update_todo_list(todo_list_id: int, n: int) -> None:
+    await project.updateTodoList_service.updateTodoList(todo_list_id, f"list {n}", None)
+
+
+async def before_update_task(task_id: int, n: int) -> None:
+    task = await prisma.models.Task.prisma().find_unique(
+        where={"id": task_id}, include={"todoList": {"include": {"user": True}}}
+    )
+    if not task or not task.todoList or not task.todoList.user:
+        raise ValueError("Task not found")
+    await prisma.models.Task.prisma().update(
+        where={"id": task_id}, data={"title": f"task {n}", "priority": n % 5}
+    )
+    await prisma.models.AuditLog.prisma().create(
+        data={"action": "updateTask", "userId": task.todoList.userId, "taskId": task_id}
+    )
+
+
+async def after_update_task(task_id: int, n: int) -> None:
+    await project.updateTask_service.updateTask(
+        task_id, f"task {n}", None, n % 5, None, None
+    )
+
+
+async def before_delete_task(task_id: int, n: int) -> None:
+    task = await prisma.models.Task.prisma().find_unique(where={"id": task_id})
+    if not task:
+        raise ValueError("Task not found")
+    todo_list = await prisma.models.TodoList.prisma().find_unique(
+        where={"id": task.todoListId}, include={"user": True}
+    )
+    await prisma.models.Task.prisma().delete(where={"id": task_id})
+    await prisma.models.AuditLog.prisma().create(
+        data={
+            "action": "DELETED_TASK",
+            "todoListId": todo_list.id,
+            "userId": todo_list.userId,
+        }
+    )
+
+
+async def after_delete_task(task_id: int, n: int) -> None:
+    await project.deleteTask_service.deleteTask(task_id)
+
+
+async def before_delete_log(log_id: int, n: int) -> None:
+    audit_log = await prisma.models.AuditLog.prisma().find_unique(where={"id": log_id})
+    if audit_log is not None:
+        await prisma.models.AuditLog.prisma().delete(where={"id": log_id})
+
+
+async def after_delete_log(log_id: int, n: int) -> None:
+    await project.delete_log_service.delete_log(log_id)
+
+
+Operation = Callable[[int, int], Awaitable[None]]
+
+# name -> (before, after, kind of target row; deletes consume one fresh row per call)
+OPERATIONS: Dict[str, tuple] = {
+    "updateTodoList": (before_update_todo_list, after_update_todo_list, "list"),
+    "updateTask": (before_update_task, after_update_task, "task"),
+    "deleteTask": (before_delete_task, after_delete_task, "fresh_task"),
+    "delete_log": (before_delete_log, after_delete_log, "fresh_log"),
+}
+
+
+async def seed(rows: int) -> Dict[str, List[int]]:
+    user = await prisma.models.User.prisma().create(
+        data={"email": f"bench-{time.time_ns()}@bench.test", "password": "x"}
+    )
+    todo_list = await prisma.models.TodoList.prisma().create(
+        data={"name": "bench", "userId": user.id}
+    )
+    await prisma.models.Task.prisma().create_many(
+        data=[{"title": f"task {n}", "todoListId": todo_list.id} for n in range(rows)]
+    )
+    await prisma.models.AuditLog.prisma().create_many(
+        data=[{"action": "bench", "userId": user.id} for _ in range(rows)]
+    )
+    tasks = await prisma.models.Task.prisma().find_many(
+        where={"todoListId": todo_list.id}, order={"id": "asc"}
+    )
+    logs = await prisma.models.AuditLog.prisma().find_many(
+        where={"userId": user.id, "action": "bench"}, order={"id": "asc"}
+    )
+    return {
+        "user": [user.id],
+        "list": [todo_list.id],
+        "task": [task.id for task in tasks],
+        "log": [log.id for log in logs],
+    }
+
+
+async def measure(
+    operation: Operation, targets: List[int], iterations: int, concurrency: int
+) -> Dict[str, float]:
+    samples: List[float] = []
+    round_trips: List[int] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(n: int) -> None:
+        async with semaphore:
+            with project.query_profiler.profile_queries() as profile:
+                start = time.perf_counter()
+                await operation(targets[n % len(targets)], n)
+                samples.append(time.perf_counter() - start)
+            round_trips.append(profile.count)
+
+    await asyncio.gather(*(call(n) for n in range(iterations)))
+    result = summarize(samples)
+    result["round_trips"] = sum(round_trips) / len(round_trips)
+    return result
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    await project.database.connect()
+    # Audit inserts are deferred after the response, as in the running application.
+    await project.background.executor.start()
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        for name, (before, after, kind) in OPERATIONS.items():
+            for variant, operation in (("before", before), ("after", after)):
+                rows = await seed(args.iterations if kind.startswith("fresh") else 100)
+                targets = rows[kind.removeprefix("fresh_")]
+                if kind.startswith("fresh"):
+                    targets = targets[: args.iterations]
+                result = results[f"{name}/{variant}"] = await measure(
+                    operation, targets, args.iterations, args.concurrency
+                )
+                print(
+                    f"{name:<16}{variant:<8}{result['round_trips']:>6.1f}"
+                    f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                    f"{result['p99_ms']:>10.2f}"
+                )
+    finally:
+        await project.background.executor.stop()
+        await project.database.disconnect()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    args = parser.parse_args()
+    if args.compare:
+        print(
+            compare(*args.compare, keys=["round_trips", "p50_ms", "p95_ms", "p99_ms"])
+        )
+        return
+    print(
+        f"{'operation':<16}{'':<8}{'trips':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    results = asyncio.run(run(args))
+    results["config"] = {
+        key: value for key, value in vars(args).items() if key != "compare"
+    }
+    print(
+        f"results written to "
+        f"{write_results('conditional_writes', results, args.output)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
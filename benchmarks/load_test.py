@@ -0,0 +1,679 @@
+"""
+End-to-end load test. Starts the Postgres container from docker-compose.yml, pushes the schema,
+seeds a deterministic dataset, starts the API under uvicorn and drives every route in
+`project.server` with a weighted, read-heavy mix plus periodic audit queries. Reports p50/p95/p99
+latency, throughput and errors per route and writes them as JSON.
+
+With --in-process no database or server is started: the API runs in this process on the in-memory
+storage backend and is driven through httpx's ASGI transport, which
+measures the application itself without Postgres or the network.
+
+Usage:
+    python -m benchmarks.load_test --duration 60 --concurrency 32
+    python -m benchmarks.load_test --no-docker --base-url http://localhost:8000
+    python -m benchmarks.load_test --in-process --duration 20
+    python -m benchmarks.load_test --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import compare, summarize, write_results
+
+PASSWORD = "load-test-password"
+
+Request = Tuple[str, str, Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+@dataclass
+class Dataset:
+    """
+    Ids of the seeded rows, updated as the workload creates and deletes records.
+    """
+
+    user_ids: List[int] = field(default_factory=list)
+    emails: Dict[int, str] = field(default_factory=dict)
+    list_ids: List[int] = field(default_factory=list)
+    task_ids: List[int] = field(default_factory=list)
+    log_ids: List[int] = field(default_factory=list)
+    tokens: List[str] = field(default_factory=list)
+    created_list_ids: List[int] = field(default_factory=list)
+    created_task_ids: List[int] = field(default_factory=list)
+
+
+@dataclass
+class Operation:
+    route: str
+    weight: float
+    build: Callable[[Dataset, random.Random], Optional[Request]]
+    on_success: Optional[Callable[[Dataset, Dict[str, Any]], None]] = None
+
+
+def _due(rng: random.Random) -> str:
+    return (datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 365))).isoformat()
+
+
+def _pop(ids: List[int], rng: random.Random) -> Optional[int]:
+    if not ids:
+        return None
+    return ids.pop(rng.randrange(len(ids)))
+
+
+def _record(key: str, pool: str) -> Callable[[Dataset, Dict[str, Any]], None]:
+    def record(dataset: Dataset, body: Dict[str, Any]) -> None:
+        if isinstance(body.get(key), int):
+            getattr(dataset, pool).append(body[key])
+
+    return record
+
+
+def task(dataset: Dataset, rng: random.Random) -> int:
+    return rng.choice(dataset.task_ids)
+
+
+def todo_list(dataset: Dataset, rng: random.Random) -> int:
+    return rng.choice(dataset.list_ids)
+
+
+def user(dataset: Dataset, rng: random.Random) -> int:
+    return rng.choice(dataset.user_ids)
+
+
+def token(dataset: Dataset, rng: random.Random) -> str:
+    return rng.choice(dataset.tokens) if dataset.tokens else "invalid"
+
+
+def _operations() -> List[Operation]:
+    return [
+        # Reads dominate: clients mostly open lists and their tasks.
+        Operation(
+            "GET /tasks",
+            35,
+            lambda d, r: ("GET", "/tasks", {"todo_list_id": todo_list(d, r)}, None),
+        ),
+        Operation(
+            "GET /todolists/{id}",
+            25,
+            lambda d, r: ("GET", f"/todolists/{todo_list(d, r)}", {}, None),
+        ),
+        Operation(
+            "GET /tasks/{taskId}",
+            8,
+            lambda d, r: ("GET", f"/tasks/{task(d, r)}", {}, None),
+        ),
+        Operation(
+            "GET /todolists",
+            5,
+            lambda d, r: ("GET", "/todolists", {}, {"userId": user(d, r)}),
+        ),
+        # Writes.
+        Operation(
+            "POST /tasks",
+            6,
+            lambda d, r: (
+                "POST",
+                "/tasks",
+                {
+                    "todo_list_id": todo_list(d, r),
+                    "title": f"task {r.random():.6f}",
+                    "description": "created by load test",
+                    "due_date": _due(r),
+                    "priority": r.randint(1, 5),
+                    "notes": "load test",
+                },
+                None,
+            ),
+            _record("id", "created_task_ids"),
+        ),
+        Operation(
+            "PUT /tasks/{taskId}",
+            5,
+            lambda d, r: (
+                "PUT",
+                f"/tasks/{task(d, r)}",
+                {
+                    "title": f"updated {r.random():.6f}",
+                    "dueDate": _due(r),
+                    "priority": r.randint(1, 5),
+                    "notes": "updated by load test",
+                    "completed": r.random() < 0.5,
+                },
+                None,
+            ),
+        ),
+        Operation(
+            "PATCH /tasks/{taskId}",
+            2,
+            lambda d, r: (
+                "PATCH",
+                f"/tasks/{task(d, r)}",
+                {
+                    "title": None,
+                    "dueDate": None,
+                    "priority": None,
+                    "notes": None,
+                    "completed": r.random() < 0.5,
+                },
+                None,
+            ),
+        ),
+        Operation(
+            "DELETE /tasks/{taskId}",
+            1,
+            lambda d, r: (
+                (
+                    "DELETE",
+                    f"/tasks/{_pop(d.created_task_ids, r)}",
+                    {},
+                    None,
+                )
+                if d.created_task_ids
+                else None
+            ),
+        ),
+        Operation(
+            "POST /todolists",
+            1,
+            lambda d, r: (
+                "POST",
+                "/todolists",
+                {
+                    "title": f"list {r.random():.6f}",
+                    "description": "created by load test",
+                    "userId": user(d, r),
+                },
+                None,
+            ),
+            _record("id", "created_list_ids"),
+        ),
+        Operation(
+            "PUT /todolists/{id}",
+            1,
+            lambda d, r: (
+                "PUT",
+                f"/todolists/{todo_list(d, r)}",
+                {"title": f"renamed {r.random():.6f}", "description": "renamed"},
+                None,
+            ),
+        ),
+        Operation(
+            "DELETE /todolists/{id}",
+            0.2,
+            lambda d, r: (
+                ("DELETE", f"/todolists/{_pop(d.created_list_ids, r)}", {}, None)
+                if d.created_list_ids
+                else None
+            ),
+        ),
+        # Audit log.
+        Operation(
+            "POST /audit/logs",
+            1,
+            lambda d, r: (
+                "POST",
+                "/audit/logs",
+                {
+                    "user_id": user(d, r),
+                    "action": "load test",
+                    "todo_list_id": None,
+                    "task_id": None,
+                },
+                None,
+            ),
+            _record("id", "log_ids"),
+        ),
+        Operation(
+            "GET /audit/logs/{log_id}",
+            1,
+            lambda d, r: (
+                ("GET", f"/audit/logs/{r.choice(d.log_ids)}", {}, None)
+                if d.log_ids
+                else None
+            ),
+        ),
+        Operation(
+            "DELETE /audit/logs/{log_id}",
+            0.2,
+            lambda d, r: (
+                ("DELETE", f"/audit/logs/{_pop(d.log_ids, r)}", {}, None)
+                if d.log_ids
+                else None
+            ),
+        ),
+        # Accounts and tokens.
+        Operation(
+            "POST /api/token",
+            0.5,
+            lambda d, r: (
+                "POST",
+                "/api/token",
+                {"username": d.emails[user(d, r)], "password": PASSWORD},
+                None,
+            ),
+        ),
+        Operation(
+            "GET /api/token/validate",
+            0.5,
+            lambda d, r: ("GET", "/api/token/validate", {"token": token(d, r)}, None),
+        ),
+        Operation(
+            "POST /api/token/refresh",
+            0.3,
+            lambda d, r: (
+                "POST",
+                "/api/token/refresh",
+                {"refresh_token": token(d, r)},
+                None,
+            ),
+        ),
+        Operation(
+            "DELETE /api/token/invalidate",
+            0.1,
+            lambda d, r: (
+                "DELETE",
+                "/api/token/invalidate",
+                {"token": token(d, r)},
+                None,
+            ),
+        ),
+        Operation(
+            "POST /api/users/login",
+            0.3,
+            lambda d, r: (
+                "POST",
+                "/api/users/login",
+                {"username": d.emails[user(d, r)], "password": PASSWORD},
+                None,
+            ),
+        ),
+        Operation(
+            "POST /api/users/register",
+            0.1,
+            lambda d, r: (
+                "POST",
+                "/api/users/register",
+                {
+                    "username": f"user{r.random():.9f}",
+                    "password": PASSWORD,
+                    "email": f"{r.random():.9f}@load.test",
+                },
+                None,
+            ),
+        ),
+        Operation(
+            "GET /api/users/profile",
+            0.3,
+            lambda d, r: (
+                "GET",
+                "/api/users/profile",
+                {"Authorization": f"Bearer {token(d, r)}"},
+                None,
+            ),
+        ),
+        Operation(
+            "PUT /api/users/profile",
+            0.1,
+            lambda d, r: (
+                "PUT",
+                "/api/users/profile",
+                {"email": None, "password": None, "role": "User"},
+                None,
+            ),
+        ),
+    ]
+
+
+PERIODIC_OPERATIONS = [
+    Operation(
+        "GET /audit/logs/user/{user_id}",
+        1,
+        lambda d, r: ("GET", f"/audit/logs/user/{r.choice(d.user_ids)}", {}, None),
+    ),
+    Operation("GET /audit/logs", 1, lambda d, r: ("GET", "/audit/logs", {}, {})),
+]
+
+
+def _compose(*args: str) -> None:
+    subprocess.run(["docker", "compose", *args], check=True)
+
+
+def start_database() -> None:
+    _compose("up", "-d", "--wait", "db")
+    subprocess.run(["prisma", "db", "push", "--skip-generate"], check=True)
+
+
+async def seed(
+    rng: random.Random, users: int, lists_per_user: int, tasks_per_list: int
+) -> Dataset:
+    """
+    Truncates the database and inserts a deterministic dataset through Prisma.
+    """
+    from passlib.context import CryptContext
+    from prisma import Prisma
+
+    db = Prisma()
+    await db.connect()
+    try:
+        await db.execute_raw(
+            'TRUNCATE "AuditLog", "Task", "TodoList", "User" RESTART IDENTITY CASCADE'
+        )
+        password = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+        dataset = Dataset()
+        for n in range(users):
+            account = await db.user.create(
+                data={"email": f"user{n}@load.test", "password": password}
+            )
+            dataset.user_ids.append(account.id)
+            dataset.emails[account.id] = account.email
+            for m in range(lists_per_user):
+                new_list = await db.todolist.create(
+                    data={"name": f"list {n}-{m}", "userId": account.id}
+                )
+                dataset.list_ids.append(new_list.id)
+                await db.task.create_many(
+                    data=[
+                        {
+                            "title": f"task {k}",
+                            "notes": "seeded",
+                            "priority": rng.randint(1, 5),
+                            "completed": rng.random() < 0.3,
+                            "todoListId": new_list.id,
+                        }
+                        for k in range(tasks_per_list)
+                    ]
+                )
+            await db.auditlog.create(data={"action": "seeded", "userId": account.id})
+        dataset.task_ids = [
+            row["id"] for row in await db.query_raw('SELECT id FROM "Task"')
+        ]
+        dataset.log_ids = [
+            row["id"] for row in await db.query_raw('SELECT id FROM "AuditLog"')
+        ]
+        return dataset
+    finally:
+        await db.disconnect()
+
+
+async def seed_in_process(
+    rng: random.Random, users: int, lists_per_user: int, tasks_per_list: int
+) -> Dataset:
+    """
+    Inserts the same dataset as `seed` through the in-memory storage backend.
+    """
+    import project.repository
+    from passlib.context import CryptContext
+
+    repo = project.repository.get()
+    password = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+    dataset = Dataset()
+    for n in range(users):
+        account = await repo.create_user(f"user{n}@load.test", password)
+        dataset.user_ids.append(account.id)
+        dataset.emails[account.id] = account.email
+        for m in range(lists_per_user):
+            new_list = await repo.create_todo_list(account.id, f"list {n}-{m}", None)
+            dataset.list_ids.append(new_list.id)
+            await repo.import_tasks(
+                account.id,
+                [
+                    {
+                        "title": f"task {k}",
+                        "notes": "seeded",
+                        "priority": rng.randint(1, 5),
+                        "completed": rng.random() < 0.3,
+                        "todoListId": new_list.id,
+                    }
+                    for k in range(tasks_per_list)
+                ],
+                {},
+                {},
+            )
+        log = await repo.create_audit_log({"action": "seeded", "userId": account.id})
+        dataset.log_ids.append(log.id)
+    for list_id in dataset.list_ids:
+        dataset.task_ids += [
+            task.id for task in (await repo.read_todo_list(list_id)).tasks
+        ]
+    return dataset
+
+
+def start_server(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "project.server:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ]
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/metrics")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start in time")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+
+    async def send(
+        self,
+        client: httpx.AsyncClient,
+        dataset: Dataset,
+        operation: Operation,
+        rng: random.Random,
+    ) -> None:
+        request = operation.build(dataset, rng)
+        if request is None:
+            return
+        method, url, params, body = request
+        params = {k: v for k, v in params.items() if v is not None}
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, params=params, json=body)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            response, failed = None, True
+        elapsed = time.perf_counter() - start
+        if not failed and operation.on_success is not None:
+            operation.on_success(dataset, response.json())
+        if self.recording:
+            self.latencies.setdefault(operation.route, []).append(elapsed)
+            if failed:
+                self.errors[operation.route] = self.errors.get(operation.route, 0) + 1
+
+
+async def run_workload(
+    client: httpx.AsyncClient,
+    dataset: Dataset,
+    seed_value: int,
+    concurrency: int,
+    warmup: float,
+    duration: float,
+    audit_interval: float,
+) -> Tuple[Recorder, float]:
+    operations = _operations()
+    weights = [operation.weight for operation in operations]
+    recorder = Recorder()
+    stop_at = time.monotonic() + warmup + duration
+
+    async def worker(n: int) -> None:
+        rng = random.Random(seed_value * 1000 + n)
+        while time.monotonic() < stop_at:
+            operation = rng.choices(operations, weights)[0]
+            await recorder.send(client, dataset, operation, rng)
+
+    async def auditor() -> None:
+        rng = random.Random(seed_value)
+        while time.monotonic() < stop_at:
+            for operation in PERIODIC_OPERATIONS:
+                await recorder.send(client, dataset, operation, rng)
+            await asyncio.sleep(audit_interval)
+
+    async def start_recording() -> None:
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+
+    tasks = [asyncio.create_task(worker(n)) for n in range(concurrency)]
+    tasks += [asyncio.create_task(auditor()), asyncio.create_task(start_recording())]
+    await asyncio.gather(*tasks)
+    return recorder, duration
+
+
+def report(recorder: Recorder, duration: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for route, samples in sorted(recorder.latencies.items()):
+        summary = summarize(samples)
+        summary["rps"] = len(samples) / duration
+        summary["errors"] = recorder.errors.get(route, 0)
+        results[route] = summary
+    all_samples = [s for samples in recorder.latencies.values() for s in samples]
+    results["total"] = {
+        **summarize(all_samples),
+        "rps": len(all_samples) / duration,
+        "errors": sum(recorder.errors.values()),
+    }
+    print(
+        f"{'route':<32}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    )
+    for route, summary in results.items():
+        print(
+            f"{route:<32}{summary['rps']:>9.1f}{summary['p50_ms']:>9.1f}"
+            f"{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}{summary['errors']:>8}"
+        )
+    return results
+
+
+async def drive(
+    client: httpx.AsyncClient, dataset: Dataset, args: argparse.Namespace
+) -> Tuple[Recorder, float]:
+    await wait_until_up(client)
+    for user_id in dataset.user_ids:
+        response = await client.post(
+            "/api/token",
+            params={"username": dataset.emails[user_id], "password": PASSWORD},
+        )
+        if response.status_code == 200 and "token" in response.json():
+            dataset.tokens.append(response.json()["token"])
+    return await run_workload(
+        client,
+        dataset,
+        args.seed,
+        args.concurrency,
+        args.warmup,
+        args.duration,
+        args.audit_interval,
+    )
+
+
+async def run_in_process(args: argparse.Namespace) -> Tuple[Recorder, float]:
+    import project.memory_repository
+    import project.repository
+
+    project.repository.use(project.memory_repository.MemoryRepository())
+    rng = random.Random(args.seed)
+    dataset = await seed_in_process(
+        rng, args.users, args.lists_per_user, args.tasks_per_list
+    )
+    from project.server import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+            base_url="http://load-test",
+            timeout=30,
+        ) as client:
+            return await drive(client, dataset, args)
+
+
+async def run_external(args: argparse.Namespace) -> Tuple[Recorder, float]:
+    rng = random.Random(args.seed)
+    server = None
+    if not args.no_docker:
+        start_database()
+    dataset = await seed(rng, args.users, args.lists_per_user, args.tasks_per_list)
+    base_url = args.base_url
+    if base_url is None:
+        server = start_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    try:
+        async with httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=30
+        ) as client:
+            return await drive(client, dataset, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+async def run(args: argparse.Namespace) -> None:
+    if args.in_process:
+        recorder, duration = await run_in_process(args)
+    else:
+        recorder, duration = await run_external(args)
+    results = report(recorder, duration)
+    results["config"] = {
+        key: value for key, value in vars(args).items() if key != "compare"
+    }
+    print(f"results written to {write_results('load_test', results, args.output)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=60, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds discarded")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--audit-interval", type=float, default=5)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--lists-per-user", type=int, default=10)
+    parser.add_argument("--tasks-per-list", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8765")))
+    parser.add_argument("--base-url", help="use an already running server")
+    parser.add_argument(
+        "--no-docker",
+        action="store_true",
+        help="use the database at DATABASE_URL instead of docker compose",
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="run the API in this process on the in-memory storage backend",
+    )
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    args = parser.parse_args()
+    if args.compare:
+        print(compare(*args.compare, keys=["rps", "p50_ms", "p95_ms", "p99_ms"]))
+        return
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Micro-benchmarks for building and serializing the read services' response models from database
+rows. For each model it compares the validated constructor against `model_construct`, and the
+FastAPI response_model path (dump, re-validate, serialize) against rendering the built model
+directly with `project.responses.ModelResponse`. Costs are reported per row.
+
+On pydantic 2.x the validated constructor runs in pydantic-core and is cheaper than the
+pure-Python `model_construct`, so the services keep it; the saving comes from not validating the
+response a second time.
+
+Usage:
+    python -m benchmarks.response_models --rows 10000
+"""
+
+import argparse
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple, Type
+
+import project.get_logs_by_user_service
+import project.getAllTodoLists_service
+import project.getTaskById_service
+import project.getTasks_service
+import project.getTodoList_service
+from pydantic import BaseModel, TypeAdapter
+
+from benchmarks.common import write_results
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def task_row(n: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=n,
+        title=f"task {n}",
+        dueDate=NOW,
+        priority=n % 5,
+        notes="remember to check for discounts",
+        completed=n % 3 == 0,
+        createdAt=NOW,
+        updatedAt=NOW,
+        position=f"{n:06d}",
+        version=0,
+        todoListId=1,
+    )
+
+
+def list_row(n: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=n,
+        name=f"list {n}",
+        description="groceries",
+        userId=1,
+        taskCount=40,
+        completedCount=12,
+    )
+
+
+def log_row(n: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=n, action="Task Created", timestamp=NOW, userId=1, todoListId=1, taskId=n
+    )
+
+
+def task_fields(row: SimpleNamespace) -> Dict[str, Any]:
+    return dict(
+        id=row.id,
+        title=row.title,
+        dueDate=row.dueDate,
+        priority=row.priority,
+        notes=row.notes,
+        completed=row.completed,
+        createdAt=row.createdAt,
+        updatedAt=row.updatedAt,
+        position=row.position,
+        version=row.version,
+    )
+
+
+def task_details_fields(row: SimpleNamespace) -> Dict[str, Any]:
+    return dict(
+        id=row.id,
+        title=row.title,
+        description=row.notes or "",
+        completed=row.completed,
+        due_date=row.dueDate,
+        position=row.position,
+        version=row.version,
+    )
+
+
+def list_fields(row: SimpleNamespace) -> Dict[str, Any]:
+    return dict(
+        id=row.id,
+        name=row.name,
+        description=row.description,
+        userId=row.userId,
+        taskCount=row.taskCount,
+        completedCount=row.completedCount,
+    )
+
+
+def log_fields(row: SimpleNamespace) -> Dict[str, Any]:
+    return dict(
+        id=row.id,
+        action=row.action,
+        timestamp=row.timestamp,
+        userId=row.userId,
+        todoListId=row.todoListId,
+        taskId=row.taskId,
+    )
+
+
+def get_todo_list_wrapper(construct: Callable, items: List[BaseModel]) -> BaseModel:
+    return construct(
+        id=1,
+        name="Groceries",
+        description=None,
+        createdAt=NOW,
+        updatedAt=NOW,
+        version=0,
+        tasks=items,
+    )
+
+
+# name -> (item model, row factory, field mapper, response model, wrapper builder)
+CASES: Dict[
+    str, Tuple[Type[BaseModel], Callable, Callable, Type[BaseModel], Callable]
+] = {
+    "TodoListResponse": (
+        project.getAllTodoLists_service.TodoListResponse,
+        list_row,
+        list_fields,
+        project.getAllTodoLists_service.GetTodoListsResponse,
+        lambda construct, items: construct(todolists=items),
+    ),
+    "Task": (
+        project.getTodoList_service.Task,
+        task_row,
+        task_fields,
+        project.getTodoList_service.GetTodoListResponse,
+        get_todo_list_wrapper,
+    ),
+    "TaskDetails": (
+        project.getTasks_service.TaskDetails,
+        task_row,
+        task_details_fields,
+        project.getTasks_service.GetTasksResponse,
+        lambda construct, items: construct(tasks=items),
+    ),
+    "AuditLogEntry": (
+        project.get_logs_by_user_service.AuditLogEntry,
+        log_row,
+        log_fields,
+        project.get_logs_by_user_service.GetUserAuditLogsResponse,
+        lambda construct, items: construct(audit_logs=items),
+    ),
+    "GetTaskResponseModel": (
+        project.getTaskById_service.GetTaskResponseModel,
+        task_row,
+        task_fields,
+        None,
+        None,
+    ),
+}
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_case(name: str, rows: int, repeat: int) -> Dict[str, float]:
+    model, make_row, fields, response_model, wrap = CASES[name]
+    if response_model is None:
+        rows, repeat = 1, max(repeat, 1000)
+    data = [fields(make_row(n)) for n in range(rows)]
+    adapter = TypeAdapter(response_model or model)
+
+    def build(construct: bool) -> List[BaseModel]:
+        factory = model.model_construct if construct else model
+        return [factory(**row) for row in data]
+
+    def fastapi_response() -> bytes:
+        # What FastAPI does with a returned model when response_model is set.
+        value = wrap(response_model, build(False)) if wrap else build(False)[0]
+        return adapter.dump_json(adapter.validate_python(value.model_dump()))
+
+    def model_response() -> bytes:
+        value = wrap(response_model, build(False)) if wrap else build(False)[0]
+        return value.__pydantic_serializer__.to_json(value)
+
+    timings = {
+        "validated_build": best_of(repeat, lambda: build(False)),
+        "model_construct_build": best_of(repeat, lambda: build(True)),
+        "fastapi_response": best_of(repeat, fastapi_response),
+        "model_response": best_of(repeat, model_response),
+    }
+    result = {f"{key}_us_per_row": value / rows * 1e6 for key, value in timings.items()}
+    result["rows"] = rows
+    result["response_speedup"] = timings["fastapi_response"] / timings["model_response"]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    args = parser.parse_args()
+    results = {}
+    print(
+        f"{'model':<22}{'rows':>7}{'validated':>11}{'construct':>11}"
+        f"{'fastapi':>11}{'direct':>11}   (us/row)"
+    )
+    for name in CASES:
+        result = results[name] = bench_case(name, args.rows, args.repeat)
+        print(
+            f"{name:<22}{result['rows']:>7}"
+            f"{result['validated_build_us_per_row']:>11.2f}"
+            f"{result['model_construct_build_us_per_row']:>11.2f}"
+            f"{result['fastapi_response_us_per_row']:>11.2f}"
+            f"{result['model_response_us_per_row']:>11.2f}"
+            f"   {result['response_speedup']:.1f}x"
+        )
+    print(
+        f"results written to {write_results('response_models', results, args.output)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Latency of task full-text search on a large seeded dataset. Seeds `--tasks` tasks (one million by
+default) spread over `--users` users with 10 lists each, with titles and notes drawn from a fixed
+vocabulary, then times `searchTasks` for common, rare, multi-word, phrase and no-match queries,
+scoped to random users. For comparison, "scan" runs the same single-term queries as a
+case-insensitive substring match, which cannot use the index. Requires DATABASE_URL to point at a
+scratch database with the schema pushed and sql/task_search.sql applied; seeding a million tasks
+takes a few minutes and is skipped with --no-seed on a database seeded before.
+
+Usage:
+    python -m benchmarks.search --tasks 1000000 --iterations 200
+    python -m benchmarks.search --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import prisma.models
+import project.database
+import project.searchTasks_service
+
+from benchmarks.common import compare, summarize, write_results
+
+# fmt: off
+VOCABULARY = [
+    "call", "buy", "email", "review", "meeting", "report", "milk", "invoice", "doctor",
+    "groceries", "project", "deadline", "budget", "dentist", "passport", "renew", "garden",
+    "birthday", "present", "flight", "hotel", "insurance", "tax", "return", "plumber",
+    "quarterly", "roadmap", "onboarding", "migration", "kubernetes", "saxophone", "origami",
+]
+# fmt: on
+
+QUERIES = {
+    "common": "call",
+    "rare": "saxophone",
+    "multi_word": "quarterly report",
+    "phrase": '"renew passport"',
+    "no_match": "xylophone",
+}
+
+SEED_BATCH = 50000
+
+
+async def seed(tasks: int, users: int) -> None:
+    client = project.database.db_client
+    await client.execute_raw(
+        """
+        INSERT INTO "User" ("email", "password", "updatedAt")
+        SELECT 'search-bench-' || n || '@bench.test', 'x', now()
+        FROM generate_series(1, $1) AS n
+        ON CONFLICT ("email") DO NOTHING
+        """,
+        users,
+    )
+    await client.execute_raw(
+        """
+        INSERT INTO "TodoList" ("name", "userId", "updatedAt")
+        SELECT 'list ' || n, u."id", now()
+        FROM "User" AS u, generate_series(1, 10) AS n
+        WHERE u."email" LIKE 'search-bench-%'
+        """
+    )
+    words = "ARRAY[" + ",".join(f"'{word}'" for word in VOCABULARY) + "]"
+    # Squaring a uniform draw skews picks towards the start of the vocabulary.
+    pick = f"({words})[1 + floor(power(random(), 2) * {len(VOCABULARY)})::int]"
+    for start in range(0, tasks, SEED_BATCH):
+        await client.execute_raw(
+            f"""
+            WITH lists AS (
+                SELECT array_agg(l."id") AS "ids"
+                FROM "TodoList" AS l JOIN "User" AS u ON u."id" = l."userId"
+                WHERE u."email" LIKE 'search-bench-%'
+            )
+            INSERT INTO "Task" ("title", "notes", "todoListId", "updatedAt")
+            SELECT {pick} || ' ' || {pick} || ' ' || {pick},
+                {pick} || ' ' || {pick} || ' ' || {pick} || ' ' || {pick},
+                lists."ids"[1 + floor(random() * cardinality(lists."ids"))::int], now()
+            FROM lists, generate_series(1, $1)
+            """,
+            min(SEED_BATCH, tasks - start),
+        )
+        print(f"seeded {min(start + SEED_BATCH, tasks)} tasks")
+    await client.execute_raw('ANALYZE "Task"')
+
+
+async def scan(user_id: int, query: str) -> None:
+    await project.database.db_client.query_raw(
+        """
+        SELECT t."id" FROM "Task" AS t JOIN "TodoList" AS l ON l."id" = t."todoListId"
+        WHERE l."userId" = $1 AND (t."title" ILIKE $2 OR t."notes" ILIKE $2)
+        ORDER BY t."id" LIMIT 20
+        """,
+        user_id,
+        f"%{query}%",
+    )
+
+
+async def measure(
+    operation: Callable[[int], Awaitable[None]], user_ids: List[int], iterations: int
+) -> Dict[str, float]:
+    samples = []
+    for _ in range(iterations):
+        user_id = random.choice(user_ids)
+        start = time.perf_counter()
+        await operation(user_id)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    await project.database.connect()
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        if not args.no_seed:
+            await seed(args.tasks, args.users)
+        users = await prisma.models.User.prisma().find_many(
+            where={"email": {"startswith": "search-bench-"}}
+        )
+        user_ids = [user.id for user in users]
+        for name, query in QUERIES.items():
+            variants = {
+                "search": lambda user_id, query=query: (
+                    project.searchTasks_service.searchTasks(user_id, query)
+                )
+            }
+            if " " not in query:
+                variants["scan"] = lambda user_id, query=query: scan(user_id, query)
+            for variant, operation in variants.items():
+                result = results[f"{name}/{variant}"] = await measure(
+                    operation, user_ids, args.iterations
+                )
+                print(
+                    f"{name:<12}{variant:<8}{result['p50_ms']:>10.2f}"
+                    f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                )
+    finally:
+        await project.database.disconnect()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    args = parser.parse_args()
+    if args.compare:
+        print(compare(*args.compare, keys=["p50_ms", "p95_ms", "p99_ms"]))
+        return
+    print(f"{'query':<12}{'':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    results = asyncio.run(run(args))
+    results["config"] = {
+        key: value for key, value in vars(args).items() if key != "compare"
+    }
+    print(f"results written to {write_results('search', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
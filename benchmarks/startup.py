@@ -0,0 +1,96 @@
+"""
+Cold-start benchmark. Each run starts a fresh interpreter that imports `project.server`, runs the
+FastAPI lifespan (database connection and route registration) and issues one request, recording
+how long each phase took. Requires DATABASE_URL to point at a reachable database.
+
+Usage:
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.common import compare, summarize, write_results
+
+PHASES = [
+    "import",
+    "db_connect",
+    "register_routes",
+    "lifespan",
+    "first_request",
+    "process_to_first_request",
+]
+
+
+async def _measure(path: str) -> dict:
+    start = time.perf_counter()
+    import project.server
+
+    timings = {"import": time.perf_counter() - start}
+
+    import httpx
+
+    app = project.server.app
+    async with app.router.lifespan_context(app):
+        timings.update(project.server.startup_timings)
+        request_start = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            response = await client.get(path)
+        timings["first_request"] = time.perf_counter() - request_start
+        timings["status"] = response.status_code
+    return timings
+
+
+def _run_child(path: str) -> dict:
+    start = time.perf_counter()
+    output = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.startup", "--child", "--path", path],
+        text=True,
+    )
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process_to_first_request"] = time.perf_counter() - start
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--path",
+        default="/tasks?todo_list_id=0",
+        help="request issued once the app is up; should touch the database",
+    )
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_measure(args.path))))
+        return
+    if args.compare:
+        print(compare(*args.compare, keys=["p50_ms", "p95_ms"]))
+        return
+
+    runs = [_run_child(args.path) for _ in range(args.runs)]
+    failed = [run["status"] for run in runs if run["status"] >= 400]
+    if failed:
+        print(f"warning: {len(failed)} runs got error statuses {sorted(set(failed))}")
+    results = {phase: summarize([run[phase] for run in runs]) for phase in PHASES}
+    for phase, summary in results.items():
+        print(
+            f"{phase:>26}: p50 {summary['p50_ms']:8.1f}ms  p95 {summary['p95_ms']:8.1f}ms"
+        )
+    print(f"results written to {write_results('startup', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional
+
+import project.metrics
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+
+QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", "1000"))
+
+MAX_ATTEMPTS = int(os.getenv("BACKGROUND_MAX_ATTEMPTS", "5"))
+
+RETRY_BASE_DELAY_SECONDS = float(
+    os.getenv("BACKGROUND_RETRY_BASE_DELAY_SECONDS", "0.1")
+)
+
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT_SECONDS", "10"))
+
+
+@dataclass
+class Job:
+    """
+    A unit of deferred work. `fn` is called again for every attempt, so it must build a fresh
+    coroutine each time and be safe to repeat after a failure. It runs in a copy of the submitter's
+    context, so it sees the same context variables (e.g. the request's database shard).
+    """
+
+    name: str
+    fn: Callable[[], Awaitable[Any]]
+    attempts: int = 0
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class BackgroundExecutor:
+    """
+    Runs work that does not affect the response body (audit inserts, cleanup) after the handler has
+    returned. Jobs go through a bounded queue served by a fixed number of workers; failed jobs are
+    retried with exponential backoff and jitter up to `max_attempts` times, then logged and dropped.
+
+    When the executor is not running (scripts, before startup, during shutdown) or its queue is
+    full, `submit` runs the job, retries included, inline instead, so the caller is slowed down
+    rather than work being lost.
+
+    Example:
+        await executor.submit("audit", lambda: repository.create_audit_log({...}))
+    """
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        queue_size: int = QUEUE_SIZE,
+        max_attempts: int = MAX_ATTEMPTS,
+        retry_base_delay: float = RETRY_BASE_DELAY_SECONDS,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(self._queue)) for _ in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> None:
+        """
+        Stops accepting jobs and waits up to `timeout` seconds for the queued and running ones to
+        finish, then cancels the workers. Jobs still queued after the timeout are logged as lost.
+        """
+        queue, self._queue = self._queue, None
+        if queue is None:
+            return
+        try:
+            await asyncio.wait_for(queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                "Background executor drain timed out, %d jobs not run", queue.qsize()
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, name: str, fn: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Schedules `fn` to run after the current request.
+
+        Args:
+            name (str): Job kind, used in logs and as the metrics label.
+            fn (Callable[[], Awaitable[Any]]): Builds the coroutine to run; called once per attempt.
+        """
+        job = Job(name, fn)
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(job)
+                project.metrics.background_queue_depth.inc()
+                return
+            except asyncio.QueueFull:
+                logger.warning("Background queue full, running %s inline", name)
+        project.metrics.background_jobs_total.inc(name, "inline")
+        await self._run(job)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job = await queue.get()
+            project.metrics.background_queue_depth.dec()
+            try:
+                await self._run(job)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        while True:
+            job.attempts += 1
+            start = time.perf_counter()
+            try:
+                await asyncio.create_task(job.context.run(job.fn), context=job.context)
+                error = None
+            except Exception as e:
+                error = e
+            project.metrics.background_job_duration_seconds.observe(
+                job.name, value=time.perf_counter() - start
+            )
+            if error is None:
+                project.metrics.background_jobs_total.inc(job.name, "succeeded")
+                return
+            if job.attempts >= self.max_attempts:
+                logger.error(
+                    "Background job %s failed after %d attempts",
+                    job.name,
+                    job.attempts,
+                    exc_info=error,
+                )
+                project.metrics.background_jobs_total.inc(job.name, "failed")
+                return
+            project.metrics.background_jobs_total.inc(job.name, "retried")
+            delay = self.retry_base_delay * 2 ** (job.attempts - 1)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+
+executor = BackgroundExecutor()
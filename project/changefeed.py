@@ -0,0 +1,205 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from functools import cached_property
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import project.metrics
+
+QUEUE_SIZE = int(os.getenv("CHANGEFEED_QUEUE_SIZE", "256"))
+
+HEARTBEAT_SECONDS = float(os.getenv("CHANGEFEED_HEARTBEAT_SECONDS", "15"))
+
+TASK_FIELDS = (
+    "id",
+    "title",
+    "dueDate",
+    "priority",
+    "notes",
+    "completed",
+    "recurrence",
+    "position",
+    "version",
+    "updatedAt",
+    "todoListId",
+)
+
+HEARTBEAT = b": keepalive\n\n"
+
+# Sent first: how long EventSource clients wait before reconnecting, in milliseconds.
+OPEN = b"retry: 3000\n\n"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ChangeEvent:
+    """
+    A committed change to a task or TODO list, delivered to the subscribers of the list's owner.
+    """
+
+    def __init__(
+        self,
+        type: str,
+        user_id: int,
+        todo_list_id: int,
+        data: Dict[str, Any],
+    ):
+        self.type = type
+        self.user_id = user_id
+        self.todo_list_id = todo_list_id
+        self.data = data
+
+    @cached_property
+    def frame(self) -> bytes:
+        # Encoded once per event, however many subscribers receive it.
+        data = json.dumps(self.data, default=_json_default, separators=(",", ":"))
+        return f"event: {self.type}\ndata: {data}\n\n".encode()
+
+
+RESYNC = ChangeEvent("resync", 0, 0, {})
+
+CLOSED = ChangeEvent("closed", 0, 0, {})
+
+
+class Subscription:
+    """
+    One client's view of the feed: the events for its user, optionally narrowed to some lists,
+    buffered up to QUEUE_SIZE events. A client that falls further behind loses its buffer and
+    receives a single `resync` event telling it to reload instead.
+    """
+
+    def __init__(self, user_id: int, todo_list_ids: Optional[Iterable[int]] = None):
+        self.user_id = user_id
+        self.todo_list_ids = None if todo_list_ids is None else frozenset(todo_list_ids)
+        self.queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+        self.active = True
+
+    def deliver(self, event: ChangeEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._replace_buffer(RESYNC)
+            project.metrics.changefeed_resyncs_total.inc()
+
+    def close(self) -> None:
+        self._replace_buffer(CLOSED)
+
+    def _replace_buffer(self, event: ChangeEvent) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def frames(
+        self, heartbeat: float = HEARTBEAT_SECONDS
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields the Server-Sent Events frames for this subscription, with a comment line every
+        `heartbeat` seconds without events so that proxies keep the connection open.
+        """
+        while True:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            if event is CLOSED:
+                return
+            yield event.frame
+
+
+class ChangeBroker:
+    """
+    In-process publish/subscribe hub. Subscriptions are indexed by user, and those narrowed to
+    some lists by user and list, so publishing costs two dictionary lookups plus one queue append
+    per interested subscriber, and never blocks: each worker process only sees the writes it
+    serves itself.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[Tuple[int, Optional[int]], Set[Subscription]] = {}
+
+    @staticmethod
+    def _keys(subscription: Subscription) -> List[Tuple[int, Optional[int]]]:
+        if subscription.todo_list_ids is None:
+            return [(subscription.user_id, None)]
+        return [
+            (subscription.user_id, todo_list_id)
+            for todo_list_id in subscription.todo_list_ids
+        ]
+
+    def subscribe(
+        self, user_id: int, todo_list_ids: Optional[Iterable[int]] = None
+    ) -> Subscription:
+        subscription = Subscription(user_id, todo_list_ids)
+        for key in self._keys(subscription):
+            self._subscriptions.setdefault(key, set()).add(subscription)
+        project.metrics.changefeed_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if not subscription.active:
+            return
+        subscription.active = False
+        for key in self._keys(subscription):
+            subscriptions = self._subscriptions[key]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[key]
+        project.metrics.changefeed_subscribers.dec()
+
+    def publish(self, event: ChangeEvent) -> None:
+        project.metrics.changefeed_events_total.inc(event.type)
+        for key in ((event.user_id, None), (event.user_id, event.todo_list_id)):
+            for subscription in self._subscriptions.get(key, ()):
+                subscription.deliver(event)
+
+    def close(self) -> None:
+        """
+        Ends every subscription's stream, e.g. on shutdown.
+        """
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+
+broker = ChangeBroker()
+
+
+def publish(type: str, user_id: int, todo_list_id: int, data: Dict[str, Any]) -> None:
+    """
+    Publishes a change on the process-wide broker. Call it after the change is committed.
+
+    Example:
+        publish("task.deleted", 1, 7, {"id": 42, "todoListId": 7})
+    """
+    broker.publish(ChangeEvent(type, user_id, todo_list_id, data))
+
+
+async def stream(
+    user_id: int, todo_list_ids: Optional[Iterable[int]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Subscribes to the changes of the user's lists (or only of `todo_list_ids`) and yields them as
+    Server-Sent Events frames until the client disconnects or the application shuts down.
+    """
+    subscription = broker.subscribe(user_id, todo_list_ids)
+    try:
+        yield OPEN
+        async for frame in subscription.frames():
+            yield frame
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def task_data(task: Any) -> Dict[str, Any]:
+    """
+    Returns the fields of a task sent in change events, from a Prisma model or a raw query row.
+    """
+    if isinstance(task, dict):
+        return {field: task[field] for field in TASK_FIELDS}
+    return {field: getattr(task, field) for field in TASK_FIELDS}
@@ -0,0 +1,147 @@
+import asyncio
+import gzip
+import os
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses fall back to gzip
+    brotli = None
+
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "4096"))
+
+OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", "262144"))
+
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv")
+
+# Long-lived streams whose response start is sent at once rather than held for the first body.
+STREAMING_TYPES = ("text/event-stream",)
+
+
+def gzip_compress(body: bytes, level: int = GZIP_LEVEL) -> bytes:
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def brotli_compress(body: bytes, quality: int = BROTLI_QUALITY) -> bytes:
+    return brotli.compress(body, quality=quality)
+
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {"gzip": gzip_compress}
+
+if brotli is not None:
+    COMPRESSORS["br"] = brotli_compress
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Picks the response encoding from an Accept-Encoding header, preferring brotli over gzip when
+    the client accepts both with the same weight.
+
+    Args:
+        accept_encoding (str): The raw Accept-Encoding header value.
+
+    Returns:
+        Optional[str]: "br", "gzip" or None when no supported encoding is acceptable.
+
+    Example:
+        negotiate("gzip, deflate, br;q=0.9")
+        > "gzip"
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip()] = weight
+    best, best_weight = None, 0.0
+    for coding in ("br", "gzip"):
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if coding in COMPRESSORS and weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies of at least `minimum_size` bytes with the best
+    encoding the client accepts. Bodies of `offload_size` bytes or more are compressed in a worker
+    thread so large list and audit payloads do not stall the event loop. Streaming responses and
+    already-encoded bodies are passed through untouched; event streams are forwarded as soon as the
+    response starts, so clients see the connection open before the first event.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = MINIMUM_SIZE,
+        offload_size: int = OFFLOAD_SIZE,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start_message = None
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, streaming
+            if streaming:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if content_type.startswith(STREAMING_TYPES):
+                    streaming = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            compressible = "content-encoding" not in headers and headers.get(
+                "content-type", ""
+            ).startswith(COMPRESSIBLE_TYPES)
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if (
+                not compressible
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+            ):
+                await send(start)
+                await send(message)
+                return
+            compress = COMPRESSORS[encoding]
+            if len(body) >= self.offload_size:
+                body = await asyncio.to_thread(compress, body)
+            else:
+                body = compress(body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
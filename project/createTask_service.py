@@ -1,8 +1,13 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
-import prisma
-import prisma.models
+import project.background
+import project.changefeed
+import project.ranking
+import project.recurrence
+import project.repository
+import project.shards
+import project.singleflight
 from pydantic import BaseModel
 
 
@@ -18,6 +23,8 @@ class CreateTaskResponse(BaseModel):
     priority: Optional[int] = None
     notes: Optional[str] = None
     todo_list_id: int
+    position: str
+    recurrence: Optional[str] = None
 
 
 async def createTask(
@@ -27,9 +34,10 @@ async def createTask(
     due_date: Optional[datetime] = None,
     priority: Optional[int] = None,
     notes: Optional[str] = None,
+    recurrence: Optional[str] = None,
 ) -> CreateTaskResponse:
     """
-    This endpoint allows users to create a new task within a specific TODO list. The user needs to provide the TODO list ID and the task details (e.g., title, description, due date). Upon successful creation, the response will include the new task's ID and details. This operation will interact with TodoListModule to ensure the TODO list exists and with AuditLogModule to log the task creation event.
+    This endpoint allows users to create a new task within a specific TODO list. The user needs to provide the TODO list ID and the task details (e.g., title, description, due date). Upon successful creation, the response will include the new task's ID and details. The task is appended at the end of the list. This operation will interact with TodoListModule to ensure the TODO list exists and with AuditLogModule to log the task creation event.
 
     Args:
         todo_list_id (int): The ID of the TODO list where the task will be created.
@@ -38,35 +46,52 @@ async def createTask(
         due_date (Optional[datetime]): The due date of the new task.
         priority (Optional[int]): The priority level of the new task.
         notes (Optional[str]): Additional notes for the new task.
+        recurrence (Optional[str]): A recurrence rule making the task repeat, e.g. "FREQ=WEEKLY;BYDAY=MO", see project.recurrence. The first occurrence is the due date.
 
     Returns:
         CreateTaskResponse: The response model for the newly created task. This includes the task ID, title, description, due date, priority, notes, and related todo list ID.
 
+    Raises:
+        InvalidRecurrenceError: The recurrence rule cannot be parsed.
+
     Example:
         response = createTask(1, 'Buy groceries', 'Buy milk and eggs', datetime.now(), 2, 'Remember to check for discounts')
     """
-    todo_list = await prisma.models.TodoList.prisma().find_unique(
-        where={"id": todo_list_id}
-    )
-    if not todo_list:
-        raise ValueError(f"TODO list with ID {todo_list_id} does not exist")
-    task = await prisma.models.Task.prisma().create(
-        data={
+    recurrence = project.recurrence.validate(recurrence)
+    await project.shards.use_todo_list(todo_list_id)
+    created = await project.repository.get().create_task(
+        todo_list_id,
+        {
             "title": title,
             "dueDate": due_date,
             "priority": priority,
             "notes": notes,
-            "todoListId": todo_list_id,
-        }
+            "recurrence": recurrence,
+        },
+    )
+    if created is None:
+        raise ValueError(f"TODO list with ID {todo_list_id} does not exist")
+    task = created.task
+    project.singleflight.todo_list_reads.forget(todo_list_id)
+    project.changefeed.publish(
+        "task.created",
+        created.user_id,
+        todo_list_id,
+        project.changefeed.task_data(task),
     )
-    await prisma.models.AuditLog.prisma().create(
-        data={
-            "action": "Task Created",
-            "timestamp": datetime.now(),
-            "userId": todo_list.userId,
-            "todoListId": todo_list_id,
-            "taskId": task.id,
-        }
+    await project.ranking.rebalance_if_long(todo_list_id, task.position)
+    timestamp = datetime.now(timezone.utc)
+    await project.background.executor.submit(
+        "audit",
+        lambda: project.repository.get().create_audit_log(
+            {
+                "action": "Task Created",
+                "timestamp": timestamp,
+                "userId": created.user_id,
+                "todoListId": todo_list_id,
+                "taskId": task.id,
+            }
+        ),
     )
     response = CreateTaskResponse(
         id=task.id,
@@ -76,5 +101,7 @@ async def createTask(
         priority=task.priority,
         notes=task.notes,
         todo_list_id=task.todoListId,
+        position=task.position,
+        recurrence=task.recurrence,
     )
     return response
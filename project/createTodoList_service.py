@@ -1,8 +1,9 @@
 from datetime import datetime
 from typing import Optional
 
-import prisma
-import prisma.models
+import project.changefeed
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -37,8 +38,20 @@ async def createTodoList(
         createTodoList("Groceries", "List of grocery items to buy", 1)
         > CreateTodoListResponse(id=1, title="Groceries", description="List of grocery items to buy", createdAt=datetime(...), updatedAt=datetime(...))
     """
-    new_todo_list = await prisma.models.TodoList.prisma().create(
-        data={"name": title, "description": description, "userId": userId}
+    await project.shards.use_user(userId)
+    new_todo_list = await project.repository.get().create_todo_list(
+        userId, title, description
+    )
+    project.changefeed.publish(
+        "todolist.created",
+        userId,
+        new_todo_list.id,
+        {
+            "id": new_todo_list.id,
+            "name": new_todo_list.name,
+            "description": new_todo_list.description,
+            "updatedAt": new_todo_list.updatedAt,
+        },
     )
     response = CreateTodoListResponse(
         id=new_todo_list.id,
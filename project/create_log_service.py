@@ -1,8 +1,8 @@
 from datetime import datetime
 from typing import Optional
 
-import prisma
-import prisma.models
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -38,13 +38,14 @@ async def create_log(
         create_log(1, 'created', 2, None)
         > AuditLogResponse(id=1, action='created', timestamp=datetime.now(), userId=1, todoListId=2, taskId=None)
     """
+    await project.shards.use_user(user_id)
     log_data = {
         "action": action,
         "userId": user_id,
         "todoListId": todo_list_id,
         "taskId": task_id,
     }
-    created_log = await prisma.models.AuditLog.prisma().create(data=log_data)
+    created_log = await project.repository.get().create_audit_log(log_data)
     return AuditLogResponse(
         id=created_log.id,
         action=created_log.action,
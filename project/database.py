@@ -0,0 +1,228 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import prisma
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DATABASE_REPLICA_MAX_LAG_SECONDS", "5"))
+
+REPLICA_LAG_CHECK_INTERVAL_SECONDS = float(
+    os.getenv("DATABASE_REPLICA_LAG_CHECK_INTERVAL_SECONDS", "1")
+)
+
+# Extra databases holding the TODO lists, tasks and audit logs of some users, see project.shards.
+# The first shard is always DATABASE_URL, which also holds the tables shared by all users.
+SHARD_URLS = [url for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url]
+
+db_client = Prisma()
+
+shard_clients: List[Prisma] = [db_client] + [
+    Prisma(datasource={"url": url}) for url in SHARD_URLS
+]
+
+replica_client: Optional[Prisma] = (
+    Prisma(datasource={"url": REPLICA_URL}) if REPLICA_URL else None
+)
+
+
+@dataclass
+class ReadConsistency:
+    """
+    Per-request read routing state. `last_write_at` is the wall-clock time (unix seconds) of the
+    caller's most recent write, as echoed back in the `X-Last-Write-At` request header.
+    """
+
+    last_write_at: Optional[float] = None
+
+
+@dataclass
+class ReplicaStatus:
+    """
+    Last observed replication state of the replica. `lag` is None until the first successful probe,
+    which keeps reads on the primary while the replica's freshness is unknown.
+    """
+
+    lag: Optional[float] = None
+    checked_at: float = 0.0
+
+
+_read_consistency: contextvars.ContextVar[ReadConsistency] = contextvars.ContextVar(
+    "read_consistency", default=ReadConsistency()
+)
+
+_shard: contextvars.ContextVar[int] = contextvars.ContextVar("shard", default=0)
+
+replica_status = ReplicaStatus()
+
+_lag_monitor: Optional[asyncio.Task] = None
+
+QueryObserver = Callable[[str, str, float], None]
+
+_query_observers: List[QueryObserver] = []
+
+
+def add_query_observer(observer: QueryObserver) -> None:
+    """
+    Registers a callback invoked after every Prisma operation on any client (primary, replica or
+    transaction) with the model name, the action and the elapsed time in seconds.
+
+    Args:
+        observer (QueryObserver): Callable taking (model, action, elapsed). Raw queries without a
+            model are reported with the model name "raw".
+    """
+    _query_observers.append(observer)
+
+
+def _instrument_queries() -> None:
+    execute = Prisma._execute
+
+    async def _execute(self, *, method, arguments, model=None, root_selection=None):
+        start = time.perf_counter()
+        try:
+            return await execute(
+                self,
+                method=method,
+                arguments=arguments,
+                model=model,
+                root_selection=root_selection,
+            )
+        finally:
+            elapsed = time.perf_counter() - start
+            name = getattr(model, "__prisma_model__", "raw")
+            for observer in _query_observers:
+                observer(name, method, elapsed)
+
+    Prisma._execute = _execute
+
+
+_instrument_queries()
+
+
+def set_read_consistency(last_write_at: Optional[float]) -> contextvars.Token:
+    """
+    Records the caller's last write time for the current request so that `read_client` can decide
+    whether the replica is fresh enough to serve it.
+
+    Args:
+        last_write_at (Optional[float]): Unix timestamp of the caller's last write, if known.
+
+    Returns:
+        contextvars.Token: Token to pass to `reset_read_consistency` once the request is done.
+    """
+    return _read_consistency.set(ReadConsistency(last_write_at=last_write_at))
+
+
+def reset_read_consistency(token: contextvars.Token) -> None:
+    _read_consistency.reset(token)
+
+
+def use_shard(index: int) -> None:
+    """
+    Sends the rest of the current request's queries (and the background work it submits) to shard
+    `index`. Called by project.shards once it has found the shard holding the request's data.
+    """
+    _shard.set(index)
+
+
+def current_shard() -> int:
+    return _shard.get()
+
+
+def client() -> Prisma:
+    """
+    Returns the client of the shard selected for the current request, `db_client` unless sharding
+    is configured. Services run their writes and transactions on it; `prisma.models.*.prisma()`
+    without an explicit client resolves to it too.
+    """
+    return shard_clients[_shard.get()]
+
+
+prisma.register(client)
+
+
+def read_client() -> Prisma:
+    """
+    Returns the client that read-only services should query. The replica is used only when it is
+    configured, connected, within REPLICA_MAX_LAG_SECONDS of the primary and has already replayed
+    the caller's last write; otherwise reads fall back to the primary. Requests routed to another
+    shard than the first read from that shard, which has no replica.
+
+    Returns:
+        Prisma: Either the replica client or the current shard's client.
+
+    Example:
+        todo_list = await prisma.models.TodoList.prisma(read_client()).find_unique(where={"id": 1})
+    """
+    if _shard.get():
+        return client()
+    if replica_client is None or not replica_client.is_connected():
+        return db_client
+    lag = replica_status.lag
+    if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+        return db_client
+    last_write_at = _read_consistency.get().last_write_at
+    if last_write_at is not None and last_write_at > replica_status.checked_at - lag:
+        return db_client
+    return replica_client
+
+
+async def _probe_replica_lag() -> None:
+    rows = await replica_client.query_raw(
+        """
+        SELECT CASE
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END::float8 AS lag
+        """
+    )
+    replica_status.lag = float(rows[0]["lag"]) if rows else None
+    replica_status.checked_at = time.time()
+
+
+async def _monitor_replica_lag() -> None:
+    while True:
+        try:
+            await _probe_replica_lag()
+        except Exception:
+            logger.exception("Error probing replica lag")
+            replica_status.lag = None
+        await asyncio.sleep(REPLICA_LAG_CHECK_INTERVAL_SECONDS)
+
+
+async def connect() -> None:
+    """
+    Connects the primary client, the clients of the shards in DATABASE_SHARD_URLS and, when
+    DATABASE_REPLICA_URL is set, the replica client along with its lag monitor. A replica that
+    cannot be reached is logged and left unused.
+    """
+    global _lag_monitor
+    await asyncio.gather(*(shard.connect() for shard in shard_clients))
+    if replica_client is None:
+        return
+    try:
+        await replica_client.connect()
+    except Exception:
+        logger.exception("Error connecting to read replica, serving reads from primary")
+        return
+    _lag_monitor = asyncio.create_task(_monitor_replica_lag())
+
+
+async def disconnect() -> None:
+    global _lag_monitor
+    if _lag_monitor is not None:
+        _lag_monitor.cancel()
+        _lag_monitor = None
+    if replica_client is not None and replica_client.is_connected():
+        await replica_client.disconnect()
+    await asyncio.gather(
+        *(shard.disconnect() for shard in shard_clients if shard.is_connected())
+    )
@@ -1,5 +1,9 @@
-import prisma
-import prisma.models
+import project.background
+import project.changefeed
+import project.repository
+import project.shards
+import project.singleflight
+import project.tombstones
 from pydantic import BaseModel
 
 
@@ -11,22 +15,27 @@ class DeleteTaskResponseModel(BaseModel):
     confirmation_message: str
 
 
-async def log_audit_event(taskId: int, userId: int):
+async def log_audit_event(taskId: int, userId: int, todoListId: int):
     """
-    Logs the deletion event of a task in the `AuditLog` table.
+    Logs the deletion event of a task in the audit log. The task no longer exists, so the entry references its TODO list and names the task in the action.
 
     Args:
         taskId (int): The ID of the task being deleted.
         userId (int): The ID of the user who is performing the deletion.
+        todoListId (int): The ID of the TODO list the task belonged to.
 
     Returns:
         None
 
     Example:
-        await log_audit_event(123, 1)
+        await log_audit_event(123, 1, 7)
     """
-    await prisma.models.AuditLog.prisma().create(
-        data={"action": "DELETED_TASK", "taskId": taskId, "userId": userId}
+    await project.repository.get().create_audit_log(
+        {
+            "action": f"DELETED_TASK {taskId}",
+            "todoListId": todoListId,
+            "userId": userId,
+        }
     )
 
 
@@ -49,15 +58,22 @@ async def deleteTask(taskId: int) -> DeleteTaskResponseModel:
         await deleteTask(123)
         > DeleteTaskResponseModel(confirmation_message="Task successfully deleted.")
     """
-    task = await prisma.models.Task.prisma().find_unique(where={"id": taskId})
-    if not task:
+    await project.shards.use_task(taskId)
+    # The delete also takes the task off its list's counters and leaves a tombstone for
+    # `GET /sync`. Audit entries that reference the task are kept and detached from it.
+    deleted = await project.repository.get().delete_task(taskId)
+    if deleted is None:
         raise ValueError(f"Task with ID {taskId} does not exist.")
-    todoList = await prisma.models.TodoList.prisma().find_unique(
-        where={"id": task.todoListId}, include={"user": True}
+    todo_list_id = deleted.task.todoListId
+    project.singleflight.todo_list_reads.forget(todo_list_id)
+    project.changefeed.publish(
+        "task.deleted",
+        deleted.user_id,
+        todo_list_id,
+        {"id": taskId, "todoListId": todo_list_id},
+    )
+    await project.tombstones.schedule_purge()
+    await project.background.executor.submit(
+        "audit", lambda: log_audit_event(taskId, deleted.user_id, todo_list_id)
     )
-    if not todoList:
-        raise ValueError(f"TodoList with ID {task.todoListId} does not exist.")
-    userId = todoList.userId
-    await prisma.models.Task.prisma().delete(where={"id": taskId})
-    await log_audit_event(taskId, userId)
     return DeleteTaskResponseModel(confirmation_message="Task successfully deleted.")
@@ -1,20 +1,88 @@
-import prisma
-import prisma.models
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import project.background
+import project.changefeed
+import project.jobs
+import project.repository
+import project.shards
+import project.singleflight
+import project.tombstones
 from fastapi import HTTPException
 from pydantic import BaseModel
 
+INLINE_TASK_LIMIT = int(os.getenv("TODO_LIST_DELETE_INLINE_TASK_LIMIT", "1000"))
+
+CHUNK_SIZE = int(os.getenv("TODO_LIST_DELETE_CHUNK_SIZE", "1000"))
+
 
 class DeleteTodoListResponse(BaseModel):
     """
-    Response model confirming the deletion of the TODO list.
+    Response model confirming the deletion of the TODO list. For large lists the deletion runs as a background job whose progress can be followed on `GET /jobs/{job_id}`.
     """
 
     message: str
+    job_id: Optional[int] = None
+
+
+async def _record_deletion(todo_list_id: int, user_id: int) -> None:
+    await project.tombstones.schedule_purge()
+    project.changefeed.publish(
+        "todolist.deleted", user_id, todo_list_id, {"id": todo_list_id}
+    )
+    # The list no longer exists, so the entry names it in the action instead of referencing it.
+    timestamp = datetime.now(timezone.utc)
+    await project.background.executor.submit(
+        "audit",
+        lambda: project.repository.get().create_audit_log(
+            {
+                "action": f"Deleted TODO list {todo_list_id}",
+                "timestamp": timestamp,
+                "userId": user_id,
+            }
+        ),
+    )
+
+
+async def delete_todo_list_in_chunks(
+    job: project.jobs.JobContext, todo_list_id: int, chunk_size: int = CHUNK_SIZE
+) -> None:
+    """
+    Deletes a TODO list of any size. Its tasks are deleted in transactions of `chunk_size` rows, so no transaction locks more than one chunk, and the list itself is deleted last. Progress is reported on `job`. Safe to resume after a restart.
+
+    Args:
+        job (project.jobs.JobContext): The job the deletion is part of.
+        todo_list_id (int): The TODO list to delete.
+        chunk_size (int): The number of tasks deleted per transaction.
+    """
+    repo = project.repository.get()
+    while True:
+        deleted = await repo.delete_tasks_chunk(todo_list_id, chunk_size)
+        project.singleflight.todo_list_reads.forget(todo_list_id)
+        if deleted < chunk_size:
+            break
+        await job.advance(deleted)
+    deleted += await repo.delete_todo_list(todo_list_id)
+    project.singleflight.todo_list_reads.forget(todo_list_id)
+    await job.advance(deleted)
+
+
+async def purge_todo_list(job: project.jobs.JobContext) -> None:
+    """
+    Job handler deleting a large TODO list with `delete_todo_list_in_chunks`.
+
+    Args:
+        job (project.jobs.JobContext): Job with payload {"todo_list_id": int, "user_id": int}.
+    """
+    await project.shards.use_user(job.payload["user_id"])
+    await delete_todo_list_in_chunks(job, job.payload["todo_list_id"])
+    await _record_deletion(job.payload["todo_list_id"], job.payload["user_id"])
 
 
 async def deleteTodoList(id: int) -> DeleteTodoListResponse:
     """
-    Deletes a specific TODO list by its unique identifier. The response will confirm the deletion. Note: This will also trigger interactions with the TaskModule to delete all associated tasks and with AuditLogModule to log the deletion action.
+    Deletes a specific TODO list by its unique identifier. The response will confirm the deletion. Note: This will also trigger interactions with the TaskModule to delete all associated tasks and with AuditLogModule to log the deletion action. Lists with up to INLINE_TASK_LIMIT tasks are deleted in one transaction; larger lists are deleted in chunks by a background job whose id is returned.
 
     Args:
     id (int): The unique identifier of the TODO list to be deleted.
@@ -26,20 +94,25 @@ async def deleteTodoList(id: int) -> DeleteTodoListResponse:
     deleteTodoList(1)
     > DeleteTodoListResponse(message="TODO list with ID 1 has been deleted successfully.")
     """
-    todo_list = await prisma.models.TodoList.prisma().find_unique(where={"id": id})
+    await project.shards.use_todo_list(id)
+    todo_list = await project.repository.get().get_todo_list(id)
     if not todo_list:
         raise HTTPException(
             status_code=404, detail=f"TODO list with ID {id} not found."
         )
-    await prisma.models.Task.prisma().delete_many(where={"todoListId": id})
-    await prisma.models.TodoList.prisma().delete(where={"id": id})
-    await prisma.models.AuditLog.prisma().create(
-        data={
-            "action": "Deleted TODO list",
-            "userId": todo_list.userId,
-            "todoListId": id,
-        }
-    )
+    task_count = todo_list.taskCount
+    if task_count > INLINE_TASK_LIMIT:
+        job_id = await project.jobs.start(
+            "delete_todo_list",
+            {"todo_list_id": id, "user_id": todo_list.userId},
+            total=task_count,
+        )
+        return DeleteTodoListResponse(
+            message=f"TODO list with ID {id} is being deleted.", job_id=job_id
+        )
+    await project.repository.get().delete_todo_list(id)
+    project.singleflight.todo_list_reads.forget(id)
+    await _record_deletion(id, todo_list.userId)
     return DeleteTodoListResponse(
         message=f"TODO list with ID {id} has been deleted successfully."
     )
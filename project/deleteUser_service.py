@@ -0,0 +1,111 @@
+import os
+from datetime import datetime, timezone
+
+import jwt
+import project.database
+import project.deleteTodoList_service
+import project.generate_token_service
+import project.jobs
+import project.repository
+import project.shards
+from pydantic import BaseModel
+
+CHUNK_SIZE = int(os.getenv("USER_DELETE_CHUNK_SIZE", "1000"))
+
+
+class DeleteUserResponse(BaseModel):
+    """
+    Response model confirming that the account has been disabled and its data is being deleted. The deletion runs as a background job whose progress can be followed on `GET /jobs/{job_id}`.
+    """
+
+    message: str
+    user_id: int
+    job_id: int
+
+
+def decode_user_id(auth_token: str) -> int:
+    """
+    Returns the id of the user an access token issued by `generate_token` belongs to.
+
+    Args:
+        auth_token (str): The JWT access token, optionally prefixed with "Bearer ".
+
+    Returns:
+        int: The user id from the token's "sub" claim.
+
+    Example:
+        decode_user_id("Bearer eyJhbGciOiJIUzI1NiIs...")
+        > 1
+    """
+    token = auth_token.removeprefix("Bearer ").strip()
+    try:
+        payload = jwt.decode(
+            token,
+            project.generate_token_service.SECRET_KEY,
+            algorithms=[project.generate_token_service.ALGORITHM],
+        )
+        return int(payload["sub"])
+    except jwt.ExpiredSignatureError:
+        raise ValueError("Token has expired")
+    except (jwt.InvalidTokenError, KeyError, ValueError):
+        raise ValueError("Invalid token")
+
+
+async def purge_user(job: project.jobs.JobContext) -> None:
+    """
+    Job handler deleting a disabled user's data in bounded batches: the user's audit entries in
+    chunks of CHUNK_SIZE rows, then each TODO list with its tasks in per-chunk transactions, then
+    the account itself, on the user's shard and then on the first shard when they differ. Every step
+    only deletes what is left, so the job can be resumed at any point.
+
+    Args:
+        job (project.jobs.JobContext): Job with payload {"user_id": int}.
+    """
+    user_id = job.payload["user_id"]
+    shard = await project.shards.use_user(user_id)
+    repo = project.repository.get()
+    if job.total is None:
+        await job.set_total(await repo.count_user_rows(user_id))
+    while await repo.get_user(user_id):
+        while deleted := await repo.delete_audit_logs_chunk(user_id, CHUNK_SIZE):
+            await job.advance(deleted)
+        while todo_list := await repo.first_todo_list(user_id):
+            await project.deleteTodoList_service.delete_todo_list_in_chunks(
+                job, todo_list.id, CHUNK_SIZE
+            )
+            await job.advance(1)
+        if not await repo.delete_user(user_id):
+            # A list was created concurrently; delete it on the next pass.
+            continue
+    if shard:
+        project.database.use_shard(0)
+        await repo.delete_user(user_id)
+    await project.shards.forget(user_id)
+
+
+async def deleteUser(auth_token: str) -> DeleteUserResponse:
+    """
+    Deletes the authenticated user account from the system. This action removes all associated data, including TODO lists. Requires a valid token. The account is disabled immediately, so no new token can be issued for it, and its data is deleted by a background job.
+
+    Args:
+        auth_token (str): The JWT access token of the user to delete.
+
+    Returns:
+        DeleteUserResponse: Confirmation with the id of the deletion job.
+
+    Example:
+        await deleteUser("Bearer eyJhbGciOiJIUzI1NiIs...")
+        > DeleteUserResponse(message="User 1 has been disabled and is being deleted.", user_id=1, job_id=12)
+    """
+    user_id = decode_user_id(auth_token)
+    user = await project.repository.get().update_user(
+        user_id, {"disabledAt": datetime.now(timezone.utc)}
+    )
+    if not user:
+        raise ValueError(f"User with id {user_id} not found")
+    job_id = await project.jobs.start("delete_user", {"user_id": user_id})
+    return DeleteUserResponse(
+        message=f"User {user_id} has been disabled and is being deleted.",
+        user_id=user_id,
+        job_id=job_id,
+    )
@@ -1,5 +1,5 @@
-import prisma
-import prisma.models
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -27,8 +27,8 @@ async def delete_log(log_id: int) -> DeleteAuditLogResponse:
         response = await delete_log(log_id)
         > DeleteAuditLogResponse(status='Audit log entry successfully deleted.')
     """
-    audit_log = await prisma.models.AuditLog.prisma().find_unique(where={"id": log_id})
-    if audit_log is None:
+    await project.shards.use_audit_log(log_id)
+    deleted = await project.repository.get().delete_audit_log(log_id)
+    if not deleted:
         return DeleteAuditLogResponse(status="Audit log entry not found.")
-    await prisma.models.AuditLog.prisma().delete(where={"id": log_id})
     return DeleteAuditLogResponse(status="Audit log entry successfully deleted.")
@@ -1,8 +1,7 @@
 from datetime import datetime, timedelta
 
 import jwt
-import prisma
-import prisma.models
+import project.repository
 from passlib.context import CryptContext
 from pydantic import BaseModel
 
@@ -56,9 +55,11 @@ async def generate_token(username: str, password: str) -> TokenResponseModel:
         generate_token("john_doe", "password123")
         > TokenResponseModel(token="eyJhbGciOiJIUzI1NiI", token_type="Bearer", expires_in=3600, user_id=1)
     """
-    user = await prisma.models.User.prisma().find_unique(where={"email": username})
+    user = await project.repository.get().find_user_by_email(username)
     if not user or not verify_password(password, user.password):
         raise ValueError("Incorrect username or password")
+    if user.disabledAt is not None:
+        raise ValueError("This account has been disabled")
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {
         "sub": str(user.id),
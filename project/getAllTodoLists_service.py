@@ -1,7 +1,7 @@
 from typing import List, Optional
 
-import prisma
-import prisma.models
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -10,18 +10,20 @@ class GetTodoListsRequest(BaseModel):
     Request model for retrieving all TODO lists for the authenticated user. The request should include the user's identifier to fetch their TODO lists.
     """
 
-    pass
+    userId: int
 
 
 class TodoListResponse(BaseModel):
     """
-    The response model for a TODO list, including its unique identifier, title, and description.
+    The response model for a TODO list, including its unique identifier, title, and description, and how many of its tasks are completed.
     """
 
     id: int
     name: str
     description: Optional[str] = None
     userId: int
+    taskCount: int
+    completedCount: int
 
 
 class GetTodoListsResponse(BaseModel):
@@ -47,16 +49,16 @@ async def getAllTodoLists(request: GetTodoListsRequest) -> GetTodoListsResponse:
         response = await getAllTodoLists(request)
         print(response)
     """
-    todo_lists = await prisma.models.TodoList.prisma().find_many(
-        where={"userId": request.userId}
-    )  # TODO(autogpt): Cannot access attribute "userId" for class "GetTodoListsRequest"
-    #     Attribute "userId" is unknown. reportAttributeAccessIssue
+    await project.shards.use_user(request.userId)
+    todo_lists = await project.repository.get().find_todo_lists(request.userId)
     todo_list_responses = [
         TodoListResponse(
             id=todo_list.id,
             name=todo_list.name,
             description=todo_list.description,
             userId=todo_list.userId,
+            taskCount=todo_list.taskCount,
+            completedCount=todo_list.completedCount,
         )
         for todo_list in todo_lists
     ]
@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+
+import project.repository
+from pydantic import BaseModel
+
+
+class JobStatusResponse(BaseModel):
+    """
+    Progress of a background job, such as the deletion of a large TODO list. `status` is one of Pending, Running, Succeeded or Failed; `processed` counts the items handled so far out of `total`.
+    """
+
+    id: int
+    kind: str
+    status: str
+    processed: int
+    total: Optional[int] = None
+    error: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+    finishedAt: Optional[datetime] = None
+
+
+async def getJob(job_id: int) -> JobStatusResponse:
+    """
+    Fetches the status and progress of a background job started by an endpoint that returned a `job_id`.
+
+    Args:
+        job_id (int): The unique identifier of the job.
+
+    Returns:
+        JobStatusResponse: The job's status and progress.
+
+    Example:
+        await getJob(7)
+        > JobStatusResponse(id=7, kind='delete_todo_list', status='Running', processed=42000, total=100000, ...)
+    """
+    job = await project.repository.get().get_job(job_id)
+    if not job:
+        raise ValueError(f"Job with id {job_id} not found")
+    return JobStatusResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        processed=job.processed,
+        total=job.total,
+        error=job.error,
+        createdAt=job.createdAt,
+        updatedAt=job.updatedAt,
+        finishedAt=job.finishedAt,
+    )
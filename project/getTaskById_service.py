@@ -1,8 +1,8 @@
 from datetime import datetime
 from typing import Optional
 
-import prisma
-import prisma.models
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -18,8 +18,11 @@ class GetTaskResponseModel(BaseModel):
     priority: Optional[int] = None
     notes: Optional[str] = None
     completed: bool
+    recurrence: Optional[str] = None
     createdAt: datetime
     updatedAt: datetime
+    position: str
+    version: int
 
 
 async def getTaskById(taskId: int) -> GetTaskResponseModel:
@@ -36,7 +39,8 @@ async def getTaskById(taskId: int) -> GetTaskResponseModel:
         task = await getTaskById(1)
         print(task)
     """
-    task = await prisma.models.Task.prisma().find_unique(where={"id": taskId})
+    await project.shards.use_task(taskId)
+    task = await project.repository.get().get_task(taskId)
     if not task:
         raise ValueError(f"Task with ID {taskId} not found")
     return GetTaskResponseModel(
@@ -46,6 +50,9 @@ async def getTaskById(taskId: int) -> GetTaskResponseModel:
         priority=task.priority,
         notes=task.notes,
         completed=task.completed,
+        recurrence=task.recurrence,
         createdAt=task.createdAt,
         updatedAt=task.updatedAt,
+        position=task.position,
+        version=task.version,
     )
@@ -1,8 +1,11 @@
 from datetime import datetime
 from typing import List, Optional
 
-import prisma
-import prisma.models
+import project.database
+import project.recurrence
+import project.repository
+import project.shards
+import project.singleflight
 from pydantic import BaseModel
 
 
@@ -16,24 +19,36 @@ class TaskDetails(BaseModel):
     description: Optional[str] = None
     completed: bool
     due_date: Optional[datetime] = None
+    position: str
+    version: int
+    recurrence: Optional[str] = None
+    occurrence_at: Optional[datetime] = None
 
 
 class GetTasksResponse(BaseModel):
     """
-    Response model containing the list of tasks associated with the specified TODO list. Each task includes details such as task ID, title, description, status, and due date.
+    Response model containing the list of tasks associated with the specified TODO list. Each task includes details such as task ID, title, description, status, and due date. `truncated` tells that the occurrences of repeating tasks were cut off at RECURRENCE_MAX_OCCURRENCES; ask for a shorter window.
     """
 
     tasks: List[TaskDetails]
+    truncated: bool = False
 
 
-async def getTasks(todo_list_id: int) -> GetTasksResponse:
+async def getTasks(
+    todo_list_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> GetTasksResponse:
     """
     This endpoint fetches all tasks associated with a specific TODO list. Users need to provide the TODO list ID.
     The response will include a list of all tasks with their details (e.g., task ID, title, description, status, due date).
     This is primarily used to display tasks belonging to a TODO list, leveraging interaction with the TodoListModule.
+    Given a `start` and `end`, each repeating task is replaced by its occurrences in that window, expanded from its rule on the fly, with the state of the completed or edited ones merged in; an occurrence carries the task's id, its `occurrence_at` and its own version. Tasks that do not repeat are listed either way.
 
     Args:
     todo_list_id (int): The ID of the TODO list whose tasks are to be fetched.
+    start (Optional[datetime]): The start of the window to expand repeating tasks over.
+    end (Optional[datetime]): The end of the window, excluded.
 
     Returns:
     GetTasksResponse: Response model containing the list of tasks associated with the specified TODO list. Each task includes details such as task ID, title, description, status, and due date.
@@ -44,11 +59,20 @@ async def getTasks(todo_list_id: int) -> GetTasksResponse:
     print(response)
     > GetTasksResponse(tasks=[TaskDetails(id=1, title="Task1", description="Desc1", completed=False, due_date="2023-12-31T00:00:00"), ...])
     """
-    todo_list = await prisma.models.TodoList.prisma().find_unique(
-        where={"id": todo_list_id}, include={"tasks": True}
+    windowed = project.recurrence.windowed(start, end)
+    await project.shards.use_todo_list(todo_list_id)
+    todo_list = await project.singleflight.todo_list_reads.do(
+        todo_list_id,
+        lambda: project.repository.get().read_todo_list(todo_list_id),
+        scope=project.database.read_client(),
     )
     if not todo_list or not todo_list.tasks:
         return GetTasksResponse(tasks=[])
+    expansion = project.recurrence.Expansion(
+        [(task, None) for task in todo_list.tasks], False
+    )
+    if windowed:
+        expansion = await project.recurrence.expand(todo_list.tasks, start, end)
     task_details_list = [
         TaskDetails(
             id=task.id,
@@ -56,8 +80,12 @@ async def getTasks(todo_list_id: int) -> GetTasksResponse:
             description=task.notes or "",
             completed=task.completed,
             due_date=task.dueDate,
+            position=task.position,
+            version=task.version,
+            recurrence=task.recurrence,
+            occurrence_at=occurrence_at,
         )
-        for task in todo_list.tasks
+        for task, occurrence_at in expansion.tasks
     ]
-    response = GetTasksResponse(tasks=task_details_list)
+    response = GetTasksResponse(tasks=task_details_list, truncated=expansion.truncated)
     return response
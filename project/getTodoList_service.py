@@ -1,8 +1,11 @@
 from datetime import datetime
 from typing import List, Optional
 
-import prisma
-import prisma.models
+import project.database
+import project.recurrence
+import project.repository
+import project.shards
+import project.singleflight
 from pydantic import BaseModel
 
 
@@ -19,11 +22,15 @@ class Task(BaseModel):
     completed: bool
     createdAt: datetime
     updatedAt: datetime
+    position: str
+    version: int
+    recurrence: Optional[str] = None
+    occurrenceAt: Optional[datetime] = None
 
 
 class GetTodoListResponse(BaseModel):
     """
-    Response model for fetching a specific TODO list by its unique identifier. It includes details of the TODO list such as title, description, creation date, and associated tasks.
+    Response model for fetching a specific TODO list by its unique identifier. It includes details of the TODO list such as title, description, creation date, and associated tasks. `truncated` tells that the occurrences of repeating tasks were cut off at RECURRENCE_MAX_OCCURRENCES.
     """
 
     id: int
@@ -31,15 +38,21 @@ class GetTodoListResponse(BaseModel):
     description: Optional[str] = None
     createdAt: datetime
     updatedAt: datetime
+    version: int
     tasks: List[Task]
+    truncated: bool = False
 
 
-async def getTodoList(id: int) -> GetTodoListResponse:
+async def getTodoList(
+    id: int, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> GetTodoListResponse:
     """
-    Fetches a specific TODO list by its unique identifier. The response will include all the details of the TODO list such as title, description, creation date, and associated tasks.
+    Fetches a specific TODO list by its unique identifier. The response will include all the details of the TODO list such as title, description, creation date, and associated tasks. Given a `start` and `end`, repeating tasks are listed as their occurrences in that window, see project.recurrence.expand.
 
     Args:
         id (int): The unique identifier of the TODO list to be fetched.
+        start (Optional[datetime]): The start of the window to expand repeating tasks over.
+        end (Optional[datetime]): The end of the window, excluded.
 
     Returns:
         GetTodoListResponse: Response model for fetching a specific TODO list by its unique identifier. It includes details of the TODO list such as title, description, creation date, and associated tasks.
@@ -49,12 +62,21 @@ async def getTodoList(id: int) -> GetTodoListResponse:
         print(todo_list)
         # Output: GetTodoListResponse(id=1, name='Groceries', description='Weekly groceries list', ...)
     """
-    todo_list = await prisma.models.TodoList.prisma().find_unique(
-        where={"id": id}, include={"tasks": True}
+    windowed = project.recurrence.windowed(start, end)
+    await project.shards.use_todo_list(id)
+    todo_list = await project.singleflight.todo_list_reads.do(
+        id,
+        lambda: project.repository.get().read_todo_list(id),
+        scope=project.database.read_client(),
     )
     if not todo_list:
         raise ValueError(f"TODO list with id {id} not found")
     tasks_list = todo_list.tasks if todo_list.tasks is not None else []
+    expansion = project.recurrence.Expansion(
+        [(task, None) for task in tasks_list], False
+    )
+    if windowed:
+        expansion = await project.recurrence.expand(tasks_list, start, end)
     tasks = [
         Task(
             id=task.id,
@@ -65,8 +87,12 @@ async def getTodoList(id: int) -> GetTodoListResponse:
             completed=task.completed,
             createdAt=task.createdAt,
             updatedAt=task.updatedAt,
+            position=task.position,
+            version=task.version,
+            recurrence=task.recurrence,
+            occurrenceAt=occurrence_at,
         )
-        for task in tasks_list
+        for task, occurrence_at in expansion.tasks
     ]
     response = GetTodoListResponse(
         id=todo_list.id,
@@ -74,6 +100,8 @@ async def getTodoList(id: int) -> GetTodoListResponse:
         description=todo_list.description,
         createdAt=todo_list.createdAt,
         updatedAt=todo_list.updatedAt,
+        version=todo_list.version,
         tasks=tasks,
+        truncated=expansion.truncated,
     )
     return response
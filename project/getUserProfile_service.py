@@ -1,8 +1,7 @@
 from datetime import datetime
 
 import jwt
-import prisma
-import prisma.models
+import project.repository
 from pydantic import BaseModel
 
 
@@ -39,7 +38,7 @@ async def getUserProfile(Authorization: str) -> UserProfileResponse:
     user_id = payload.get("user_id")
     if not user_id:
         raise ValueError("Invalid token or token does not contain user information")
-    user = await prisma.models.User.prisma().find_unique(where={"id": user_id})
+    user = await project.repository.get().get_user(user_id)
     if not user:
         raise ValueError("User not found")
     return UserProfileResponse(
@@ -0,0 +1,118 @@
+import heapq
+from datetime import datetime
+from typing import List, Optional
+
+import prisma.models
+import project.database
+import project.deleteUser_service
+import project.repository
+import project.shards
+from pydantic import BaseModel
+
+MAX_LIMIT = 1000
+
+
+class NotAdminError(PermissionError):
+    pass
+
+
+class GetAuditLogsRequest(BaseModel):
+    """
+    Request model for reading the audit logs of all users. Requires an administrator's access token. Pages go back in time: pass the `next_before` and `next_before_id` of the previous page to continue.
+    """
+
+    auth_token: str
+    limit: int = 100
+    before: Optional[datetime] = None
+    before_id: Optional[int] = None
+
+
+class AuditLogEntry(BaseModel):
+    """
+    A single audit log entry providing details of an action performed.
+    """
+
+    id: int
+    action: str
+    timestamp: datetime
+    userId: int
+    todoListId: Optional[int] = None
+    taskId: Optional[int] = None
+
+
+class AuditLogsResponse(BaseModel):
+    """
+    One page of audit log entries of all users, newest first. `next_before` and `next_before_id` locate the next page, and are None on the last page.
+    """
+
+    logs: List[AuditLogEntry]
+    next_before: Optional[datetime] = None
+    next_before_id: Optional[int] = None
+
+
+async def _require_admin(auth_token: str) -> None:
+    user_id = project.deleteUser_service.decode_user_id(auth_token)
+    # The role is read from the account rather than the token, so demoting an admin takes effect
+    # at once.
+    project.database.use_shard(0)
+    user = await project.repository.get().get_user(user_id)
+    if user is None or user.disabledAt is not None or user.role != "Admin":
+        raise NotAdminError("Reading all audit logs requires an administrator")
+
+
+async def get_all_logs(request: GetAuditLogsRequest) -> AuditLogsResponse:
+    """
+    Fetches the audit logs of all users, newest first, for administrators. Audit logs are stored on the shard of the user they belong to, so every shard is queried concurrently for its newest `limit` entries before the cursor and the results are merged; entries of a user being moved between shards are reported once.
+
+    Args:
+        request (GetAuditLogsRequest): The administrator's token, the page size (at most MAX_LIMIT) and the cursor of the previous page.
+
+    Returns:
+        AuditLogsResponse: The page of entries and the cursor of the next page.
+
+    Example:
+        await get_all_logs(GetAuditLogsRequest(auth_token="Bearer eyJhbGciOiJIUzI1NiIs...", limit=2))
+        > AuditLogsResponse(logs=[AuditLogEntry(id=9, action="createTask", ...), AuditLogEntry(id=4, ...)], next_before=datetime(...), next_before_id=4)
+    """
+    if not 1 <= request.limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    await _require_admin(request.auth_token)
+    before = None
+    if request.before is not None:
+        before = (request.before, request.before_id or 0)
+
+    async def newest() -> List[prisma.models.AuditLog]:
+        return await project.repository.get().recent_audit_logs(
+            before, request.limit + 1
+        )
+
+    merged = heapq.merge(
+        *await project.shards.gather(newest),
+        key=lambda log: (log.timestamp, log.id),
+        reverse=True,
+    )
+    logs: List[AuditLogEntry] = []
+    seen = set()
+    more = False
+    for log in merged:
+        if log.id in seen:
+            continue
+        if len(logs) == request.limit:
+            more = True
+            break
+        seen.add(log.id)
+        logs.append(
+            AuditLogEntry(
+                id=log.id,
+                action=log.action,
+                timestamp=log.timestamp,
+                userId=log.userId,
+                todoListId=log.todoListId,
+                taskId=log.taskId,
+            )
+        )
+    return AuditLogsResponse(
+        logs=logs,
+        next_before=logs[-1].timestamp if more else None,
+        next_before_id=logs[-1].id if more else None,
+    )
@@ -1,8 +1,8 @@
 from datetime import datetime
 from typing import Optional
 
-import prisma
-import prisma.models
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -33,7 +33,8 @@ async def get_log_by_id(log_id: int) -> AuditLogResponse:
     log = await get_log_by_id(123)
     print(log)
     """
-    log = await prisma.models.AuditLog.prisma().find_unique(where={"id": log_id})
+    await project.shards.use_audit_log(log_id)
+    log = await project.repository.get().get_audit_log(log_id)
     if not log:
         raise ValueError(f"Audit log with ID {log_id} not found.")
     return AuditLogResponse(
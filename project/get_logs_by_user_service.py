@@ -1,6 +1,8 @@
 from datetime import datetime
 from typing import List, Optional
 
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -38,11 +40,8 @@ async def get_logs_by_user(user_id: int) -> GetUserAuditLogsResponse:
     Example:
         user_logs = await get_logs_by_user(1)
     """
-    import prisma.models
-
-    audit_log_entries = await prisma.models.AuditLog.prisma().find_many(
-        where={"userId": user_id}
-    )
+    await project.shards.use_user(user_id)
+    audit_log_entries = await project.repository.get().find_audit_logs(user_id)
     audit_logs = [
         AuditLogEntry(
             id=log.id,
@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+import project.background
+import project.repository
+import project.singleflight
+from pydantic import BaseModel
+
+TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5"))
+
+CLAIM_SECONDS = float(os.getenv("IDEMPOTENCY_CLAIM_SECONDS", "60"))
+
+PURGE_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "3600"))
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class IdempotencyError(Exception):
+    status_code = 409
+
+
+class IdempotencyKeyReusedError(IdempotencyError):
+    """
+    The key was already used for a request with different parameters.
+    """
+
+    status_code = 422
+
+
+class IdempotencyInProgressError(IdempotencyError):
+    """
+    Another instance is still processing the original request and did not finish in time.
+    """
+
+    status_code = 409
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    body: Dict[str, Any]
+    expires_at: float
+
+
+def fingerprint(params: Dict[str, Any]) -> str:
+    """
+    Hashes the request parameters so a reused key can be told apart from a retry.
+
+    Example:
+        fingerprint({"title": "Milk", "todo_list_id": 1})
+        > "5f1c..."
+    """
+    payload = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Remembers the response of each request carrying an `Idempotency-Key` header for `ttl` seconds,
+    so that a retried request gets the original response back without a new write. Responses are
+    kept in an in-process LRU of `cache_size` entries in front of the repository's idempotency keys
+    (the `IdempotencyKey` table on Postgres), which are shared by all instances.
+
+    Concurrent duplicates on one instance share a single execution. Across instances the first
+    request claims the key by inserting its row before running; a duplicate that finds the claim
+    waits up to WAIT_SECONDS for the response to be stored. A claim whose request crashed expires
+    after CLAIM_SECONDS.
+    """
+
+    def __init__(self, ttl: float = TTL_SECONDS, cache_size: int = CACHE_SIZE):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], StoredResponse]" = OrderedDict()
+        self._inflight = project.singleflight.SingleFlight("idempotency")
+        self._last_purge = 0.0
+
+    async def run(
+        self,
+        route: str,
+        key: str,
+        params: Dict[str, Any],
+        fn: Callable[[], Awaitable[M]],
+        model: Type[M],
+    ) -> M:
+        """
+        Runs `fn` once per (route, key) and returns its response, or the stored response when the
+        key was seen before.
+
+        Args:
+            route (str): Name of the operation the key belongs to, e.g. "createTask".
+            key (str): The client-supplied Idempotency-Key.
+            params (Dict[str, Any]): The request parameters, fingerprinted to detect key reuse.
+            fn (Callable[[], Awaitable[M]]): Performs the write and builds the response.
+            model (Type[M]): The response model, used to rebuild stored responses.
+
+        Returns:
+            M: The response of the first request made with this key.
+
+        Raises:
+            IdempotencyKeyReusedError: The key was used before with different parameters.
+            IdempotencyInProgressError: The original request is still running elsewhere.
+        """
+        request_fingerprint = fingerprint(params)
+        stored = await self._inflight.do(
+            (route, key), lambda: self._execute(route, key, request_fingerprint, fn)
+        )
+        if stored.fingerprint != request_fingerprint:
+            raise IdempotencyKeyReusedError(
+                f"Idempotency-Key {key} was already used with different parameters"
+            )
+        return model.model_validate(stored.body)
+
+    async def _execute(
+        self,
+        route: str,
+        key: str,
+        request_fingerprint: str,
+        fn: Callable[[], Awaitable[BaseModel]],
+    ) -> StoredResponse:
+        stored = self._cached(route, key)
+        if stored is not None:
+            return stored
+        for _ in range(2):
+            claimed = await project.repository.get().claim_idempotency_key(
+                route,
+                key,
+                request_fingerprint,
+                datetime.now(timezone.utc) + timedelta(seconds=CLAIM_SECONDS),
+            )
+            if claimed:
+                break
+            stored = await self._wait_for_stored(route, key)
+            if stored is not None:
+                return stored
+        else:
+            raise IdempotencyInProgressError(
+                f"Request with Idempotency-Key {key} is being processed, retry it"
+            )
+        try:
+            response = await fn()
+        except Exception:
+            await project.repository.get().delete_idempotency_key(route, key)
+            raise
+        body = response.model_dump(mode="json")
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        await project.repository.get().store_idempotency_response(
+            route, key, body, expires_at
+        )
+        stored = StoredResponse(request_fingerprint, body, expires_at.timestamp())
+        self._remember(route, key, stored)
+        await self._schedule_purge()
+        return stored
+
+    async def _wait_for_stored(self, route: str, key: str) -> Optional[StoredResponse]:
+        # Returns None when the claim is gone or has expired, so the caller can claim the key.
+        deadline = time.monotonic() + WAIT_SECONDS
+        delay = 0.05
+        while True:
+            row = await project.repository.get().get_idempotency_key(route, key)
+            now = datetime.now(timezone.utc)
+            if row is None:
+                return None
+            if row.expiresAt <= now:
+                await project.repository.get().delete_idempotency_key(
+                    route, key, expired_at=now
+                )
+                return None
+            if row.response is not None:
+                stored = StoredResponse(
+                    row.fingerprint, row.response, row.expiresAt.timestamp()
+                )
+                self._remember(route, key, stored)
+                return stored
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgressError(
+                    f"Request with Idempotency-Key {key} is still being processed"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def _cached(self, route: str, key: str) -> Optional[StoredResponse]:
+        stored = self._cache.get((route, key))
+        if stored is None:
+            return None
+        if stored.expires_at <= time.time():
+            del self._cache[(route, key)]
+            return None
+        self._cache.move_to_end((route, key))
+        return stored
+
+    def _remember(self, route: str, key: str, stored: StoredResponse) -> None:
+        self._cache[(route, key)] = stored
+        self._cache.move_to_end((route, key))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _schedule_purge(self) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        await project.background.executor.submit("idempotency_purge", purge_expired)
+
+
+async def purge_expired() -> int:
+    """
+    Deletes expired idempotency keys from the repository.
+
+    Returns:
+        int: The number of keys deleted.
+    """
+    return await project.repository.get().purge_idempotency_keys(
+        datetime.now(timezone.utc)
+    )
+
+
+store = IdempotencyStore()
@@ -0,0 +1,461 @@
+import codecs
+import csv
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import project.background
+import project.changefeed
+import project.ranking
+import project.repository
+import project.shards
+import project.singleflight
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    TypeAdapter,
+    ValidationError,
+    field_validator,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+MAX_JSON_ELEMENT_SIZE = int(os.getenv("IMPORT_MAX_JSON_ELEMENT_SIZE", "1048576"))
+
+# Characters a JSON token can still be missing when decoding stops at the end of the input:
+# the rest of `false` or of a `\uXXXX` escape.
+TOKEN_TAIL = 5
+
+
+class ImportRow(BaseModel):
+    """
+    One imported task. `list` names the TODO list it goes into; lists that the user does not have yet are created. It may be omitted when the import targets an existing list.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    list: Optional[str] = None
+    title: str
+    dueDate: Optional[datetime] = None
+    priority: Optional[int] = None
+    notes: Optional[str] = None
+    completed: bool = False
+
+    @field_validator("title")
+    @classmethod
+    def title_not_blank(cls, title: str) -> str:
+        if not title.strip():
+            raise ValueError("title must not be blank")
+        return title
+
+
+class ImportRowError(BaseModel):
+    """
+    A rejected row: its 1-based position in the upload (data rows only, the CSV header is not counted) and the reason.
+    """
+
+    row: int
+    error: str
+
+
+class ImportTasksResponse(BaseModel):
+    """
+    Summary of an import. Rows that failed validation or whose batch could not be written are listed in `errors` in row order, up to IMPORT_MAX_REPORTED_ERRORS entries; every other row was imported.
+    """
+
+    imported_tasks: int
+    created_lists: int
+    rejected_rows: int
+    errors: List[ImportRowError]
+    errors_truncated: bool
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+_rows_adapter = TypeAdapter(List[ImportRow])
+
+
+async def _decoded(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = ""
+    async for text in _decoded(chunks):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the data rows of a CSV upload with a header row as dicts, one at a time. Empty cells are left out, so those fields take their defaults. Quoted fields may span lines: lines are joined until their quotes are balanced, so a record is only parsed once it is complete.
+    """
+    header: Optional[List[str]] = None
+    record = ""
+    async for line in _lines(chunks):
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record.rstrip("\r")]), [])
+        record = ""
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield ImportFormatError(
+                f"expected {len(header)} columns, found {len(values)}"
+            )
+            continue
+        yield {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        yield ImportFormatError("unterminated quoted field")
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the objects of a newline-delimited JSON upload, one per non-empty line.
+    """
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ImportFormatError(f"invalid JSON: {e.msg}")
+
+
+class _JSONArray:
+    """
+    Incremental decoder for the elements of a JSON array that arrives in pieces. A failure to decode only means "wait for more input" when it is within the last few characters of the input so far; any other failure is a malformed element, which is reported and skipped up to the next `,` outside brackets and strings.
+    """
+
+    def __init__(self) -> None:
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.started = False
+        self.done = False
+        # A "," was read and no element after it yet: "]" now would be a trailing comma.
+        self.separated = False
+        # Scan state while skipping a malformed element, which may span several pieces.
+        self.skipping = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str, final: bool = False) -> Iterator[Any]:
+        buffer = self.buffer + text
+        position = 0
+        while not self.done:
+            if self.skipping:
+                position = self._skip(buffer, position)
+                if self.skipping:
+                    break
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position == len(buffer):
+                break
+            if not self.started:
+                if buffer[position] != "[":
+                    raise ImportFormatError("JSON upload must be an array")
+                self.started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                if self.separated:
+                    yield ImportFormatError("invalid JSON: Expecting value")
+                self.done = True
+                break
+            try:
+                item, end = self.decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # Unterminated strings are reported at their opening quote.
+                incomplete = e.pos >= len(buffer) - TOKEN_TAIL or e.msg.startswith(
+                    "Unterminated string"
+                )
+                error = f"invalid JSON: {e.msg}"
+            else:
+                separator = end
+                while separator < len(buffer) and buffer[separator] in " \t\r\n":
+                    separator += 1
+                if separator < len(buffer) and buffer[separator] in ",]":
+                    yield item
+                    self.separated = buffer[separator] == ","
+                    position = separator + self.separated
+                    continue
+                if final and separator == len(buffer):
+                    # parse_json reports the missing "]".
+                    yield item
+                    position = separator
+                    continue
+                # A number cut off at "1." or "1e-" decodes as 1 followed by garbage.
+                incomplete = separator == len(buffer) or end >= len(buffer) - TOKEN_TAIL
+                error = "invalid JSON: Expecting ',' delimiter"
+            if incomplete and not final:
+                if len(buffer) - position <= MAX_JSON_ELEMENT_SIZE:
+                    break
+                error = f"JSON element longer than {MAX_JSON_ELEMENT_SIZE} characters"
+            yield ImportFormatError(error)
+            self.skipping = True
+            self.separated = False
+            self.depth = 0
+            self.in_string = self.escaped = False
+        self.buffer = "" if self.skipping else buffer[position:]
+
+    def _skip(self, buffer: str, position: int) -> int:
+        for index in range(position, len(buffer)):
+            char = buffer[index]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+            elif char in "]}" and self.depth > 0:
+                self.depth -= 1
+            elif char == "]":
+                self.skipping = False
+                return index
+            elif char == "," and self.depth == 0:
+                self.skipping = False
+                self.separated = True
+                return index + 1
+        return len(buffer)
+
+
+async def parse_json(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the elements of a JSON array upload one at a time, decoding each element as soon as it is complete instead of loading the whole document. A malformed element, or one longer than IMPORT_MAX_JSON_ELEMENT_SIZE characters, is yielded as an ImportFormatError and the import goes on with the next element.
+
+    Raises:
+        ImportFormatError: The upload is not a JSON array, or ends before its closing bracket.
+    """
+    array = _JSONArray()
+    async for text in _decoded(chunks):
+        for item in array.feed(text):
+            yield item
+        if array.done:
+            return
+    for item in array.feed("", final=True):
+        yield item
+    if not array.done:
+        raise ImportFormatError("unexpected end of JSON array")
+
+
+PARSERS = {"csv": parse_csv, "json": parse_json, "ndjson": parse_ndjson}
+
+
+def detect_format(content_type: Optional[str]) -> str:
+    """
+    Picks the upload format from a Content-Type header.
+
+    Example:
+        detect_format("text/csv; charset=utf-8")
+        > "csv"
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return "csv"
+    if media_type in (
+        "application/x-ndjson",
+        "application/jsonl",
+        "application/ndjson",
+    ):
+        return "ndjson"
+    if media_type == "application/json":
+        return "json"
+    raise ImportFormatError(
+        "Content-Type must be text/csv, application/json or application/x-ndjson"
+    )
+
+
+def validate_batch(
+    batch: List[Tuple[int, Any]]
+) -> Tuple[List[Tuple[int, ImportRow]], List[ImportRowError]]:
+    """
+    Validates a batch of (row number, raw row) pairs in one pass. Only batches with invalid rows are split up to find out which rows failed.
+    """
+    try:
+        rows = _rows_adapter.validate_python([raw for _, raw in batch])
+        return [(number, row) for (number, _), row in zip(batch, rows)], []
+    except ValidationError as e:
+        failed: Dict[int, List[str]] = {}
+        for error in e.errors():
+            index = error["loc"][0]
+            field = ".".join(str(part) for part in error["loc"][1:])
+            failed.setdefault(index, []).append(
+                f"{field}: {error['msg']}" if field else error["msg"]
+            )
+    valid = [
+        (number, ImportRow.model_validate(raw))
+        for index, (number, raw) in enumerate(batch)
+        if index not in failed
+    ]
+    errors = [
+        ImportRowError(row=batch[index][0], error="; ".join(messages))
+        for index, messages in sorted(failed.items())
+    ]
+    return valid, errors
+
+
+class _Import:
+    def __init__(self, user_id: int, todo_list_id: Optional[int]):
+        self.user_id = user_id
+        self.todo_list_id = todo_list_id
+        self.list_ids: Dict[str, int] = {}
+        self.touched_lists: set = set()
+        # List id -> position of its last task, so each batch is appended after the previous one.
+        self.last_positions: Dict[int, Optional[str]] = {}
+        self.imported_tasks = 0
+        self.created_lists = 0
+        self.rejected_rows = 0
+        self.errors: List[ImportRowError] = []
+
+    def reject(self, errors: List[ImportRowError]) -> None:
+        self.rejected_rows += len(errors)
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        self.errors.extend(errors[: max(room, 0)])
+
+    async def write(self, batch: List[Tuple[int, Any]]) -> None:
+        """
+        Validates a batch and inserts its valid rows, creating the lists they name, in one atomic `import_tasks` write. A batch that fails to insert is rejected as a whole and the import goes on.
+        """
+        valid, errors = validate_batch(batch)
+        if self.todo_list_id is None:
+            errors.extend(
+                ImportRowError(row=number, error="list: Field required")
+                for number, row in valid
+                if row.list is None
+            )
+            valid = [(number, row) for number, row in valid if row.list is not None]
+        self.reject(sorted(errors, key=lambda error: error.row))
+        if not valid:
+            return
+        tasks = [
+            {
+                "title": row.title,
+                "dueDate": row.dueDate,
+                "priority": row.priority,
+                "notes": row.notes,
+                "completed": row.completed,
+                "list": row.list,
+                "todoListId": self.todo_list_id,
+            }
+            for _, row in valid
+        ]
+        try:
+            imported = await project.repository.get().import_tasks(
+                self.user_id, tasks, self.list_ids, self.last_positions
+            )
+        except Exception as e:
+            logger.exception("Import batch of %d rows failed", len(valid))
+            self.reject(
+                [ImportRowError(row=number, error=str(e)) for number, _ in valid]
+            )
+            return
+        self.list_ids = imported.list_ids
+        self.touched_lists.update(imported.last_positions)
+        self.last_positions.update(imported.last_positions)
+        self.created_lists += imported.created_lists
+        self.imported_tasks += len(valid)
+
+
+async def importTasks(
+    user_id: int,
+    chunks: AsyncIterator[bytes],
+    format: str,
+    todo_list_id: Optional[int] = None,
+) -> ImportTasksResponse:
+    """
+    Imports TODO lists and tasks from a CSV, JSON array or newline-delimited JSON upload. The upload is parsed as it arrives and written in batches of IMPORT_BATCH_SIZE rows, each validated in one pass and inserted in its own atomic write, so memory use does not grow with the upload. Imported tasks are appended to their lists in upload order. Invalid rows are reported and skipped without aborting the import, and a single audit entry summarizes it.
+
+    Args:
+        user_id (int): The ID of the user the lists belong to.
+        chunks (AsyncIterator[bytes]): The request body.
+        format (str): One of "csv", "json" or "ndjson".
+        todo_list_id (Optional[int]): An existing list of the user receiving the rows that name no list.
+
+    Returns:
+        ImportTasksResponse: How many tasks and lists were created, and the rejected rows.
+
+    Example:
+        await importTasks(1, request.stream(), "csv")
+        > ImportTasksResponse(imported_tasks=100000, created_lists=12, rejected_rows=1, errors=[ImportRowError(row=17, error="title: Field required")], errors_truncated=False)
+    """
+    await project.shards.use_user(user_id)
+    if format not in PARSERS:
+        raise ImportFormatError(f"Unknown import format {format}")
+    repo = project.repository.get()
+    user = await repo.get_user(user_id)
+    if not user:
+        raise ValueError(f"User with id {user_id} not found")
+    if todo_list_id is not None:
+        todo_list = await repo.get_todo_list(todo_list_id)
+        if not todo_list or todo_list.userId != user_id:
+            raise ValueError(f"TODO list with ID {todo_list_id} does not exist")
+    state = _Import(user_id, todo_list_id)
+    batch: List[Tuple[int, Any]] = []
+    number = 0
+    try:
+        async for item in PARSERS[format](chunks):
+            number += 1
+            if isinstance(item, ImportFormatError):
+                state.reject([ImportRowError(row=number, error=str(item))])
+                continue
+            batch.append((number, item))
+            if len(batch) >= BATCH_SIZE:
+                await state.write(batch)
+                batch = []
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        state.reject([ImportRowError(row=number + 1, error=str(e))])
+    if batch:
+        await state.write(batch)
+    for touched in state.touched_lists:
+        project.singleflight.todo_list_reads.forget(touched)
+        project.changefeed.publish(
+            "tasks.imported", user_id, touched, {"todoListId": touched}
+        )
+        await project.ranking.rebalance_if_long(touched, state.last_positions[touched])
+    timestamp = datetime.now(timezone.utc)
+    await project.background.executor.submit(
+        "audit",
+        lambda: repo.create_audit_log(
+            {
+                "action": f"Imported {state.imported_tasks} tasks into "
+                f"{len(state.touched_lists)} lists ({state.created_lists} new, "
+                f"{state.rejected_rows} rows rejected)",
+                "timestamp": timestamp,
+                "userId": user_id,
+            }
+        ),
+    )
+    return ImportTasksResponse(
+        imported_tasks=state.imported_tasks,
+        created_lists=state.created_lists,
+        rejected_rows=state.rejected_rows,
+        errors=sorted(state.errors, key=lambda error: error.row),
+        errors_truncated=state.rejected_rows > len(state.errors),
+    )
@@ -1,8 +1,8 @@
 from datetime import datetime
 
 import jwt
-import prisma
-import prisma.models
+import project.repository
+import project.shards
 from pydantic import BaseModel
 
 
@@ -62,8 +62,9 @@ async def invalidate_token(token: str) -> InvalidateTokenResponse:
         > InvalidateTokenResponse(status="Token has been successfully invalidated.")
     """
     user_id = decode_token(token)
-    await prisma.models.AuditLog.prisma().create(
-        data={
+    await project.shards.use_user(user_id)
+    await project.repository.get().create_audit_log(
+        {
             "action": "invalidate_token",
             "userId": user_id,
             "timestamp": datetime.utcnow(),
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+import prisma.models
+import project.lazy_routes
+import project.repository
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Job kind -> dotted reference to `async def handler(job: JobContext) -> None`. Handlers are resolved
+# when a job runs, so resuming jobs on startup does not import every service module.
+HANDLERS: Dict[str, str] = {
+    "delete_todo_list": "project.deleteTodoList_service.purge_todo_list",
+    "delete_user": "project.deleteUser_service.purge_user",
+}
+
+_running: Set[asyncio.Task] = set()
+
+_reclaimer: Optional[asyncio.Task] = None
+
+
+class JobContext:
+    """
+    Handle passed to a job handler. Handlers must be resumable: after a restart the same job runs
+    again from the start with `processed` restored, so each step has to be safe to repeat.
+    """
+
+    def __init__(self, job: prisma.models.Job):
+        self.id = job.id
+        self.kind = job.kind
+        self.payload: Dict[str, Any] = job.payload
+        self.processed = job.processed
+        self.total = job.total
+
+    async def set_total(self, total: int) -> None:
+        self.total = total
+        await project.repository.get().update_job(self.id, {"total": total})
+
+    async def advance(self, count: int) -> None:
+        """
+        Records `count` more processed items. Also renews the job's lease, so long-running handlers
+        should call it after every chunk.
+        """
+        self.processed += count
+        await project.repository.get().update_job(
+            self.id, {"processed": self.processed}
+        )
+
+
+async def start(kind: str, payload: Dict[str, Any], total: Optional[int] = None) -> int:
+    """
+    Records a job and starts running it in the background on this instance.
+
+    Args:
+        kind (str): One of the kinds in HANDLERS.
+        payload (Dict[str, Any]): JSON-serializable handler arguments.
+        total (Optional[int]): Expected number of items, for progress reporting.
+
+    Returns:
+        int: The job id, to be polled on `GET /jobs/{job_id}`.
+
+    Example:
+        job_id = await start("delete_todo_list", {"todo_list_id": 1}, total=100000)
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind}")
+    job = await project.repository.get().create_job(kind, payload, total)
+    _spawn(job.id)
+    return job.id
+
+
+async def resume() -> int:
+    """
+    Starts the pending jobs and the running jobs whose lease has expired, e.g. because the instance
+    running them was stopped. Called on startup, after which the same check repeats every
+    LEASE_SECONDS, so the jobs of an instance that died are taken over by the ones still running.
+
+    Returns:
+        int: The number of jobs resumed.
+    """
+    global _reclaimer
+    resumed = await _reclaim()
+    if _reclaimer is None:
+        _reclaimer = asyncio.create_task(_reclaim_periodically())
+    return resumed
+
+
+async def stop() -> None:
+    """
+    Cancels the jobs running on this instance and hands them back as pending, so the next instance
+    to start resumes them.
+    """
+    global _reclaimer
+    if _reclaimer is not None:
+        _reclaimer.cancel()
+        _reclaimer = None
+    for task in list(_running):
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+
+
+async def _reclaim() -> int:
+    jobs = await project.repository.get().claimable_jobs(_stale_before())
+    for job in jobs:
+        _spawn(job.id)
+    if jobs:
+        logger.info("Resuming %d background jobs", len(jobs))
+    return len(jobs)
+
+
+async def _reclaim_periodically() -> None:
+    while True:
+        await asyncio.sleep(LEASE_SECONDS)
+        try:
+            await _reclaim()
+        except Exception:
+            logger.exception("Error reclaiming background jobs")
+
+
+def _stale_before() -> datetime:
+    # Running jobs not advanced since then have lost their lease.
+    return datetime.now(timezone.utc) - timedelta(seconds=LEASE_SECONDS)
+
+
+def _spawn(job_id: int) -> None:
+    task = asyncio.create_task(_run(job_id))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def _run(job_id: int) -> None:
+    repo = project.repository.get()
+    if not await repo.claim_job(job_id, _stale_before()):
+        return
+    job = await repo.get_job(job_id)
+    context = JobContext(job)
+    try:
+        handler = project.lazy_routes.resolve(HANDLERS[job.kind])
+        await handler(context)
+    except asyncio.CancelledError:
+        await repo.update_job(job_id, {"status": "Pending"})
+        raise
+    except Exception as e:
+        logger.exception("Job %d (%s) failed", job_id, job.kind)
+        await repo.update_job(
+            job_id,
+            {
+                "status": "Failed",
+                "error": str(e),
+                "finishedAt": datetime.now(timezone.utc),
+            },
+        )
+        return
+    await repo.update_job(
+        job_id, {"status": "Succeeded", "finishedAt": datetime.now(timezone.utc)}
+    )
+    logger.info("Job %d (%s) finished", job_id, job.kind)
@@ -0,0 +1,57 @@
+import importlib
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi import APIRouter
+
+
+def resolve(reference: str) -> Any:
+    """
+    Imports the module part of a dotted reference and returns the named attribute.
+
+    Args:
+        reference (str): Dotted path such as "project.getTasks_service.GetTasksResponse".
+
+    Returns:
+        Any: The referenced attribute.
+
+    Example:
+        resolve("project.getTasks_service.GetTasksResponse")
+        > <class 'project.getTasks_service.GetTasksResponse'>
+    """
+    module_name, _, attribute = reference.rpartition(".")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class LazyAPIRouter(APIRouter):
+    """
+    APIRouter that only records route declarations. Service modules, their Pydantic models and the
+    FastAPI route objects are built when `materialize` is called, which the application does during
+    startup while the database connection is being opened, instead of at import time.
+
+    A `response_model` may be given as a dotted string reference, resolved on materialization.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending: List[Tuple[str, Callable[..., Any], Dict[str, Any]]] = []
+        self.materialized = False
+
+    def add_api_route(self, path: str, endpoint: Callable[..., Any], **kwargs) -> None:
+        if self.materialized:
+            super().add_api_route(path, endpoint, **kwargs)
+            return
+        self._pending.append((path, endpoint, kwargs))
+
+    def materialize(self) -> None:
+        """
+        Imports the referenced service modules and registers every recorded route. Calling it again
+        is a no-op.
+        """
+        if self.materialized:
+            return
+        for path, endpoint, kwargs in self._pending:
+            if isinstance(kwargs.get("response_model"), str):
+                kwargs["response_model"] = resolve(kwargs["response_model"])
+            super().add_api_route(path, endpoint, **kwargs)
+        self._pending.clear()
+        self.materialized = True
@@ -0,0 +1,103 @@
+"""
+Recomputes the `taskCount` and `completedCount` counters of TODO lists from their tasks, in batches
+of lists so that no transaction locks more than one batch. The write services keep the counters
+up to date; run this once after adding the columns and whenever they are suspected to have drifted.
+
+Usage:
+    python -m project.list_counters --batch-size 1000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from typing import Tuple
+
+import project.database
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("LIST_COUNTERS_BATCH_SIZE", "1000"))
+
+
+async def reconcile_batch(after_id: int, batch_size: int) -> Tuple[int, int]:
+    """
+    Recomputes the counters of the next `batch_size` lists with an id above `after_id`. The lists
+    are locked first, so task writes that adjust their counters wait and apply on top of the
+    recomputed values.
+
+    Returns:
+        Tuple[int, int]: The last list id in the batch (0 when there are none left) and the number of lists whose counters were wrong.
+    """
+    async with project.database.client().tx() as tx:
+        rows = await tx.query_raw(
+            """
+            SELECT "id" FROM "TodoList" WHERE "id" > $1
+            ORDER BY "id" LIMIT $2 FOR UPDATE
+            """,
+            after_id,
+            batch_size,
+        )
+        if not rows:
+            return 0, 0
+        last_id = rows[-1]["id"]
+        fixed = await tx.execute_raw(
+            """
+            UPDATE "TodoList" AS l SET
+                "taskCount" = c."tasks", "completedCount" = c."completed"
+            FROM (
+                SELECT l."id", count(t."id")::int AS "tasks",
+                    (count(t."id") FILTER (WHERE t."completed"))::int AS "completed"
+                FROM "TodoList" AS l LEFT JOIN "Task" AS t ON t."todoListId" = l."id"
+                WHERE l."id" > $1 AND l."id" <= $2
+                GROUP BY l."id"
+            ) AS c
+            WHERE l."id" = c."id"
+                AND (l."taskCount", l."completedCount") <> (c."tasks", c."completed")
+            """,
+            after_id,
+            last_id,
+        )
+    return last_id, fixed
+
+
+async def reconcile(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Recomputes the counters of all TODO lists on the current shard.
+
+    Returns:
+        int: The number of lists whose counters were corrected.
+    """
+    after_id = 0
+    total = 0
+    while True:
+        after_id, fixed = await reconcile_batch(after_id, batch_size)
+        if not after_id:
+            return total
+        total += fixed
+        if fixed:
+            logger.info("Corrected counters of %d lists up to id %d", fixed, after_id)
+
+
+async def run(batch_size: int) -> int:
+    await project.database.connect()
+    try:
+        total = 0
+        for index in range(len(project.database.shard_clients)):
+            project.database.use_shard(index)
+            total += await reconcile(batch_size)
+        return total
+    finally:
+        await project.database.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"corrected counters of {asyncio.run(run(args.batch_size))} lists")
+
+
+if __name__ == "__main__":
+    main()
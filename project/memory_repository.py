@@ -0,0 +1,961 @@
+import bisect
+import itertools
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import prisma.models
+import project.ranking
+import project.repository
+import project.versioning
+
+# Relevance of a query word found in a task's title and in its notes, like the A and B weights of
+# the Postgres search vector.
+TITLE_WEIGHT = 1.0
+NOTES_WEIGHT = 0.4
+
+# A sync log is compacted once it holds more superseded entries than this and than live ones.
+COMPACT_THRESHOLD = 64
+
+LIST, TASK, TOMBSTONE = "todolist", "task", "tombstone"
+
+_WORD = re.compile(r"\w+")
+
+_QUERY_TERM = re.compile(r'(-?)(?:"([^"]*)"?|([^\s"]+))')
+
+# (negated, words) terms of one conjunction; a query matches when any of its clauses does.
+Clause = List[Tuple[bool, Tuple[str, ...]]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    # Naive datetimes are UTC, as Prisma stores them; rows are compared in UTC.
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _words(text: Optional[str]) -> List[str]:
+    return _WORD.findall(text.lower()) if text else []
+
+
+def parse_query(query: str) -> List[Clause]:
+    """
+    Parses a web search style query: words, "quoted phrases", `-excluded` terms and `or` between
+    alternatives.
+
+    Example:
+        parse_query('milk -"oat milk" or eggs')
+        > [[(False, ("milk",)), (True, ("oat", "milk"))], [(False, ("eggs",))]]
+    """
+    clauses: List[Clause] = [[]]
+    for match in _QUERY_TERM.finditer(query):
+        negated, phrase, word = bool(match.group(1)), match.group(2), match.group(3)
+        if word is not None and word.lower() == "or" and not negated:
+            if clauses[-1]:
+                clauses.append([])
+            continue
+        words = tuple(_words(phrase if phrase is not None else word))
+        if words:
+            clauses[-1].append((negated, words))
+    return [clause for clause in clauses if clause]
+
+
+def _contains(words: List[str], phrase: Tuple[str, ...]) -> bool:
+    if len(phrase) == 1:
+        return phrase[0] in words
+    size = len(phrase)
+    return any(
+        tuple(words[n : n + size]) == phrase
+        for n in range(len(words) - size + 1)
+        if words[n] == phrase[0]
+    )
+
+
+class MemoryRepository(project.repository.Repository):
+    """
+    Keeps everything in process memory. Besides the rows by id it maintains the indexes the
+    services' lookups need, so that no operation scans a table: lists and audit entries by user,
+    tasks by list in position order, stored occurrences by task in time order, audit entries by
+    time, a per-user inverted index of task words for search, and per-user logs of changed rows
+    for delta sync.
+
+    Operations never await, so each one is atomic with respect to concurrent requests, as a
+    transaction would be. Nothing is persisted or shared between processes, and all shards map to
+    the same store. Search matches whole lowercase words, without the stemming and stop words of
+    Postgres' English configuration, so results and ranks differ somewhat from the Prisma backend.
+    Rows are Prisma models; they are replaced on every write rather than changed in place, so
+    callers may keep the ones they got.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, Iterator[int]] = defaultdict(lambda: itertools.count(1))
+        self.users: Dict[int, prisma.models.User] = {}
+        self._user_emails: Dict[str, int] = {}
+        self.todo_lists: Dict[int, prisma.models.TodoList] = {}
+        # user id -> ids of their lists; dicts keep ids in creation order.
+        self._user_lists: Dict[int, Dict[int, None]] = defaultdict(dict)
+        self.tasks: Dict[int, prisma.models.Task] = {}
+        # list id -> sorted (position, id) of its tasks
+        self._list_tasks: Dict[int, List[Tuple[str, int]]] = defaultdict(list)
+        self.task_occurrences: Dict[int, prisma.models.TaskOccurrence] = {}
+        # task id -> sorted (occurrence time, id) of its stored occurrences
+        self._task_occurrences: Dict[int, List[Tuple[datetime, int]]] = defaultdict(
+            list
+        )
+        self.audit_logs: Dict[int, prisma.models.AuditLog] = {}
+        self._user_logs: Dict[int, Dict[int, None]] = defaultdict(dict)
+        self._task_logs: Dict[int, Set[int]] = defaultdict(set)
+        self._list_logs: Dict[int, Set[int]] = defaultdict(set)
+        # sorted (timestamp, id) of all audit entries
+        self._log_times: List[Tuple[datetime, int]] = []
+        # user id -> word -> ids of the user's tasks containing it
+        self._postings: Dict[int, Dict[str, Set[int]]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+        # task id -> (title words, notes words)
+        self._task_words: Dict[int, Tuple[List[str], List[str]]] = {}
+        self.tombstones: Dict[int, Dict[str, Any]] = {}
+        # Sync: a write number per operation, the number that last wrote each live row, and per
+        # kind and user the (number, id) entries appended by writes, in write order.
+        self._write_number = 0
+        self._written: Dict[Tuple[str, int], int] = {}
+        self._changes: Dict[str, Dict[int, List[Tuple[int, int]]]] = {
+            kind: defaultdict(list) for kind in (LIST, TASK, TOMBSTONE)
+        }
+        self._superseded: Dict[Tuple[str, int], int] = defaultdict(int)
+        self.jobs: Dict[int, prisma.models.Job] = {}
+        self.idempotency_keys: Dict[Tuple[str, str], prisma.models.IdempotencyKey] = {}
+
+    def _next_id(self, table: str) -> int:
+        return next(self._ids[table])
+
+    # Sync bookkeeping
+
+    def _begin(self) -> int:
+        self._write_number += 1
+        return self._write_number
+
+    def _stamp(self, kind: str, user_id: int, id: int, number: int) -> None:
+        if self._written.get((kind, id)) == number:
+            return
+        if (kind, id) in self._written:
+            self._superseded[(kind, user_id)] += 1
+        self._written[(kind, id)] = number
+        log = self._changes[kind][user_id]
+        log.append((number, id))
+        superseded = self._superseded[(kind, user_id)]
+        if superseded > COMPACT_THRESHOLD and superseded * 2 > len(log):
+            log[:] = [
+                entry
+                for entry in log
+                if self._written.get((kind, entry[1])) == entry[0]
+            ]
+            self._superseded[(kind, user_id)] = 0
+
+    def _unstamp(self, kind: str, user_id: int, id: int) -> None:
+        if self._written.pop((kind, id), None) is not None:
+            self._superseded[(kind, user_id)] += 1
+
+    def _tombstone(self, entity: str, entity_id: int, todo_list_id: int, user_id: int):
+        number = self._write_number
+        id = self._next_id("Tombstone")
+        self.tombstones[id] = {
+            "id": id,
+            "entity": entity,
+            "entityId": entity_id,
+            "todoListId": todo_list_id,
+            "userId": user_id,
+            "deletedAt": _now(),
+        }
+        self._stamp(TOMBSTONE, user_id, id, number)
+
+    # Index maintenance
+
+    def _put_task(self, task: prisma.models.Task, user_id: int) -> None:
+        previous = self.tasks.get(task.id)
+        order = self._list_tasks[task.todoListId]
+        if previous is None or previous.position != task.position:
+            if previous is not None:
+                del order[bisect.bisect_left(order, (previous.position, task.id))]
+            bisect.insort(order, (task.position, task.id))
+        if (
+            previous is None
+            or previous.title != task.title
+            or previous.notes != task.notes
+        ):
+            self._index_words(task, user_id)
+        self.tasks[task.id] = task
+
+    def _index_words(self, task: prisma.models.Task, user_id: int) -> None:
+        postings = self._postings[user_id]
+        title, notes = _words(task.title), _words(task.notes)
+        old = self._task_words.get(task.id, ([], []))
+        for word in set(old[0] + old[1]) - set(title + notes):
+            postings[word].discard(task.id)
+            if not postings[word]:
+                del postings[word]
+        for word in set(title + notes):
+            postings[word].add(task.id)
+        self._task_words[task.id] = (title, notes)
+
+    def _drop_task(self, task_id: int, user_id: int) -> prisma.models.Task:
+        task = self.tasks.pop(task_id)
+        order = self._list_tasks[task.todoListId]
+        del order[bisect.bisect_left(order, (task.position, task_id))]
+        title, notes = self._task_words.pop(task_id)
+        postings = self._postings[user_id]
+        for word in set(title + notes):
+            postings[word].discard(task_id)
+            if not postings[word]:
+                del postings[word]
+        for log_id in self._task_logs.pop(task_id, ()):
+            self.audit_logs[log_id] = self.audit_logs[log_id].model_copy(
+                update={"taskId": None}
+            )
+        for _, occurrence_id in self._task_occurrences.pop(task_id, ()):
+            del self.task_occurrences[occurrence_id]
+        self._unstamp(TASK, user_id, task_id)
+        return task
+
+    def _count(self, todo_list_id: int, tasks: int, completed: int) -> None:
+        todo_list = self.todo_lists[todo_list_id]
+        self.todo_lists[todo_list_id] = todo_list.model_copy(
+            update={
+                "taskCount": todo_list.taskCount + tasks,
+                "completedCount": todo_list.completedCount + completed,
+            }
+        )
+
+    def _owner(self, task: prisma.models.Task) -> int:
+        return self.todo_lists[task.todoListId].userId
+
+    # Users
+
+    async def create_user(
+        self, email: str, password: str, role: str = "User"
+    ) -> prisma.models.User:
+        if email in self._user_emails:
+            raise ValueError(f"A user with email {email} already exists")
+        now = _now()
+        user = prisma.models.User(
+            id=self._next_id("User"),
+            email=email,
+            password=password,
+            role=role,
+            createdAt=now,
+            updatedAt=now,
+        )
+        self.users[user.id] = user
+        self._user_emails[email] = user.id
+        return user
+
+    async def get_user(self, user_id: int) -> Optional[prisma.models.User]:
+        return self.users.get(user_id)
+
+    async def find_user_by_email(self, email: str) -> Optional[prisma.models.User]:
+        user_id = self._user_emails.get(email)
+        return None if user_id is None else self.users[user_id]
+
+    async def update_user(
+        self, user_id: int, data: Dict[str, Any]
+    ) -> Optional[prisma.models.User]:
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        email = data.get("email", user.email)
+        if email != user.email and email in self._user_emails:
+            raise ValueError(f"A user with email {email} already exists")
+        updated = user.model_copy(update={**data, "updatedAt": _now()})
+        del self._user_emails[user.email]
+        self._user_emails[updated.email] = user_id
+        self.users[user_id] = updated
+        return updated
+
+    async def delete_user(self, user_id: int) -> bool:
+        if self._user_lists.get(user_id):
+            return False
+        for log_id in list(self._user_logs.get(user_id, ())):
+            self._drop_log(log_id)
+        user = self.users.pop(user_id, None)
+        if user is not None:
+            del self._user_emails[user.email]
+        self._postings.pop(user_id, None)
+        return True
+
+    async def count_user_rows(self, user_id: int) -> int:
+        lists = self._user_lists.get(user_id, {})
+        return (
+            len(self._user_logs.get(user_id, ()))
+            + sum(self.todo_lists[id].taskCount for id in lists)
+            + len(lists)
+        )
+
+    # TODO lists
+
+    async def create_todo_list(
+        self, user_id: int, name: str, description: Optional[str]
+    ) -> prisma.models.TodoList:
+        if user_id not in self.users:
+            raise ValueError(f"User with id {user_id} not found")
+        number = self._begin()
+        now = _now()
+        todo_list = prisma.models.TodoList(
+            id=self._next_id("TodoList"),
+            name=name,
+            description=description,
+            version=0,
+            taskCount=0,
+            completedCount=0,
+            createdAt=now,
+            updatedAt=now,
+            userId=user_id,
+        )
+        self.todo_lists[todo_list.id] = todo_list
+        self._user_lists[user_id][todo_list.id] = None
+        self._stamp(LIST, user_id, todo_list.id, number)
+        return todo_list
+
+    async def get_todo_list(
+        self, todo_list_id: int
+    ) -> Optional[prisma.models.TodoList]:
+        return self.todo_lists.get(todo_list_id)
+
+    async def read_todo_list(
+        self, todo_list_id: int
+    ) -> Optional[prisma.models.TodoList]:
+        todo_list = self.todo_lists.get(todo_list_id)
+        if todo_list is None:
+            return None
+        tasks = [self.tasks[id] for _, id in self._list_tasks.get(todo_list_id, ())]
+        return todo_list.model_copy(update={"tasks": tasks})
+
+    async def find_todo_lists(self, user_id: int) -> List[prisma.models.TodoList]:
+        return [self.todo_lists[id] for id in self._user_lists.get(user_id, ())]
+
+    async def first_todo_list(self, user_id: int) -> Optional[prisma.models.TodoList]:
+        for id in self._user_lists.get(user_id, ()):
+            return self.todo_lists[id]
+        return None
+
+    async def update_todo_list(
+        self,
+        todo_list_id: int,
+        name: str,
+        description: Optional[str],
+        expected_version: Optional[int] = None,
+    ) -> Optional[prisma.models.TodoList]:
+        todo_list = self.todo_lists.get(todo_list_id)
+        if todo_list is None:
+            return None
+        if expected_version is not None and todo_list.version != expected_version:
+            raise project.versioning.VersionConflictError(
+                "TodoList", todo_list_id, expected_version, todo_list.version
+            )
+        number = self._begin()
+        updated = todo_list.model_copy(
+            update={
+                "name": name,
+                "description": description,
+                "version": todo_list.version + 1,
+                "updatedAt": _now(),
+            }
+        )
+        self.todo_lists[todo_list_id] = updated
+        self._stamp(LIST, updated.userId, todo_list_id, number)
+        return updated
+
+    async def delete_todo_list(self, todo_list_id: int) -> int:
+        todo_list = self.todo_lists.get(todo_list_id)
+        if todo_list is None:
+            return 0
+        self._begin()
+        deleted = len(self._list_tasks.get(todo_list_id, ()))
+        for _, task_id in list(self._list_tasks.get(todo_list_id, ())):
+            self._drop_task(task_id, todo_list.userId)
+        self._list_tasks.pop(todo_list_id, None)
+        for log_id in self._list_logs.pop(todo_list_id, ()):
+            self.audit_logs[log_id] = self.audit_logs[log_id].model_copy(
+                update={"todoListId": None}
+            )
+        del self.todo_lists[todo_list_id]
+        del self._user_lists[todo_list.userId][todo_list_id]
+        self._unstamp(LIST, todo_list.userId, todo_list_id)
+        self._tombstone("todolist", todo_list_id, todo_list_id, todo_list.userId)
+        return deleted
+
+    async def delete_tasks_chunk(self, todo_list_id: int, limit: int) -> int:
+        todo_list = self.todo_lists.get(todo_list_id)
+        if todo_list is None:
+            return 0
+        number = self._begin()
+        ids = sorted(id for _, id in self._list_tasks.get(todo_list_id, ()))[:limit]
+        completed = sum(self._drop_task(id, todo_list.userId).completed for id in ids)
+        self._count(todo_list_id, -len(ids), -completed)
+        if ids:
+            self._stamp(LIST, todo_list.userId, todo_list_id, number)
+        return len(ids)
+
+    # Tasks
+
+    async def create_task(
+        self, todo_list_id: int, data: Dict[str, Any]
+    ) -> Optional[project.repository.OwnedTask]:
+        todo_list = self.todo_lists.get(todo_list_id)
+        if todo_list is None:
+            return None
+        number = self._begin()
+        now = _now()
+        task = prisma.models.Task(
+            **{"completed": False, **data},
+            id=self._next_id("Task"),
+            position=project.ranking.key_between(
+                self._appendable(todo_list_id, todo_list.userId, number), None
+            ),
+            version=0,
+            createdAt=now,
+            updatedAt=now,
+            todoListId=todo_list_id,
+        )
+        self._put_task(task, todo_list.userId)
+        self._count(todo_list_id, 1, int(task.completed))
+        self._stamp(LIST, todo_list.userId, todo_list_id, number)
+        self._stamp(TASK, todo_list.userId, task.id, number)
+        return project.repository.OwnedTask(task, todo_list.userId)
+
+    async def get_task(self, task_id: int) -> Optional[prisma.models.Task]:
+        return self.tasks.get(task_id)
+
+    async def update_task(
+        self,
+        task_id: int,
+        changes: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[project.repository.OwnedTask]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        if expected_version is not None and task.version != expected_version:
+            raise project.versioning.VersionConflictError(
+                "Task", task_id, expected_version, task.version
+            )
+        user_id = self._owner(task)
+        if not changes:
+            return project.repository.OwnedTask(task, user_id)
+        number = self._begin()
+        updated = task.model_copy(
+            update={**changes, "version": task.version + 1, "updatedAt": _now()}
+        )
+        self._put_task(updated, user_id)
+        if updated.completed != task.completed:
+            self._count(task.todoListId, 0, 1 if updated.completed else -1)
+            self._stamp(LIST, user_id, task.todoListId, number)
+        self._stamp(TASK, user_id, task_id, number)
+        return project.repository.OwnedTask(updated, user_id)
+
+    async def delete_task(self, task_id: int) -> Optional[project.repository.OwnedTask]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        user_id = self._owner(task)
+        number = self._begin()
+        self._drop_task(task_id, user_id)
+        self._count(task.todoListId, -1, -int(task.completed))
+        self._stamp(LIST, user_id, task.todoListId, number)
+        self._tombstone("task", task_id, task.todoListId, user_id)
+        return project.repository.OwnedTask(task, user_id)
+
+    def _neighbours(
+        self, task: prisma.models.Task, after_id: Optional[int]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        order = self._list_tasks[task.todoListId]
+        lower, index = None, 0
+        if after_id is not None:
+            after = self.tasks.get(after_id)
+            if after is None or after.todoListId != task.todoListId:
+                raise ValueError(
+                    f"Task {after_id} is not in TODO list {task.todoListId}"
+                )
+            lower = after.position
+            index = bisect.bisect_right(order, (after.position, after_id))
+        # The moved task itself is not a neighbour.
+        if index < len(order) and order[index][1] == task.id:
+            index += 1
+        return lower, order[index][0] if index < len(order) else None
+
+    async def move_task(
+        self, task_id: int, after_id: Optional[int]
+    ) -> Optional[project.repository.MovedTask]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        user_id = self._owner(task)
+        lower, upper = self._neighbours(task, after_id)
+        rebalanced = False
+        try:
+            position = project.ranking.key_between(lower, upper)
+        except ValueError:
+            self._rebalance(task.todoListId, user_id, self._begin())
+            rebalanced = True
+            task = self.tasks[task_id]
+            position = project.ranking.key_between(*self._neighbours(task, after_id))
+        number = self._begin()
+        moved = task.model_copy(
+            update={
+                "position": position,
+                "version": task.version + 1,
+                "updatedAt": _now(),
+            }
+        )
+        self._put_task(moved, user_id)
+        self._stamp(TASK, user_id, task_id, number)
+        return project.repository.MovedTask(moved, user_id, rebalanced)
+
+    def _rebalance(self, todo_list_id: int, user_id: int, number: int) -> int:
+        order = self._list_tasks[todo_list_id]
+        keys = project.ranking.spread_keys(len(order))
+        now = _now()
+        for (_, task_id), key in zip(order, keys):
+            self.tasks[task_id] = self.tasks[task_id].model_copy(
+                update={"position": key, "updatedAt": now}
+            )
+            self._stamp(TASK, user_id, task_id, number)
+        # Same order, so the index only needs the new keys.
+        order[:] = [(key, task_id) for (_, task_id), key in zip(order, keys)]
+        return len(order)
+
+    def _appendable(
+        self, todo_list_id: int, user_id: int, number: int
+    ) -> Optional[str]:
+        # The key to append after: the list's last key, unless it predates the current key format,
+        # in which case the list is rebalanced first.
+        order = self._list_tasks.get(todo_list_id)
+        if not order:
+            return None
+        if not project.ranking.is_key(order[-1][0]):
+            self._rebalance(todo_list_id, user_id, number)
+        return order[-1][0]
+
+    async def rebalance_todo_list(self, todo_list_id: int) -> Optional[Tuple[int, int]]:
+        todo_list = self.todo_lists.get(todo_list_id)
+        if todo_list is None:
+            return None
+        count = self._rebalance(todo_list_id, todo_list.userId, self._begin())
+        return todo_list.userId, count
+
+    def _rank(self, task_id: int, clause: Clause) -> Optional[float]:
+        title, notes = self._task_words[task_id]
+        rank = 0.0
+        for negated, phrase in clause:
+            weight = (
+                TITLE_WEIGHT
+                if _contains(title, phrase)
+                else NOTES_WEIGHT if _contains(notes, phrase) else 0.0
+            )
+            if bool(weight) == negated:
+                return None
+            rank += weight
+        return rank
+
+    async def find_occurrences(
+        self, task_ids: List[int], start: datetime, end: datetime
+    ) -> List[prisma.models.TaskOccurrence]:
+        occurrences = []
+        for task_id in task_ids:
+            times = self._task_occurrences.get(task_id, [])
+            for _, id in times[
+                bisect.bisect_left(times, (start,)) : bisect.bisect_left(times, (end,))
+            ]:
+                occurrences.append(self.task_occurrences[id])
+        return occurrences
+
+    async def save_occurrence(
+        self,
+        task_id: int,
+        occurrence_at: datetime,
+        changes: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[project.repository.OwnedOccurrence]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        times = self._task_occurrences[task_id]
+        index = bisect.bisect_left(times, (occurrence_at,))
+        stored = None
+        if index < len(times) and times[index][0] == occurrence_at:
+            stored = self.task_occurrences[times[index][1]]
+        version = stored.version if stored else 0
+        if expected_version is not None and version != expected_version:
+            raise project.versioning.VersionConflictError(
+                "Task occurrence", task_id, expected_version, version
+            )
+        now = _now()
+        if stored is None:
+            occurrence = prisma.models.TaskOccurrence(
+                **{"completed": False, **changes},
+                id=self._next_id("TaskOccurrence"),
+                occurrenceAt=occurrence_at,
+                version=1,
+                createdAt=now,
+                updatedAt=now,
+                taskId=task_id,
+            )
+            times.insert(index, (occurrence_at, occurrence.id))
+        else:
+            occurrence = stored.model_copy(
+                update={**changes, "version": stored.version + 1, "updatedAt": now}
+            )
+        self.task_occurrences[occurrence.id] = occurrence
+        return project.repository.OwnedOccurrence(occurrence, self._owner(task))
+
+    async def search_tasks(
+        self, user_id: int, query: str, limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        postings = self._postings.get(user_id, {})
+        ranks: Dict[int, float] = {}
+        for clause in parse_query(query):
+            words = {
+                word for negated, phrase in clause if not negated for word in phrase
+            }
+            if words:
+                # Smallest posting set first, so the intersection stays small.
+                sets = sorted((postings.get(word, set()) for word in words), key=len)
+                candidates = set(sets[0]).intersection(*sets[1:])
+            else:
+                candidates = {
+                    id
+                    for todo_list_id in self._user_lists.get(user_id, ())
+                    for _, id in self._list_tasks.get(todo_list_id, ())
+                }
+            for task_id in candidates:
+                rank = self._rank(task_id, clause)
+                if rank is not None and rank >= ranks.get(task_id, 0.0):
+                    ranks[task_id] = rank
+        ordered = sorted(ranks.items(), key=lambda item: (-item[1], item[0]))
+        rows = []
+        for task_id, rank in ordered[offset : offset + limit]:
+            task = self.tasks[task_id]
+            rows.append(
+                {
+                    "id": task.id,
+                    "title": task.title,
+                    "notes": task.notes,
+                    "completed": task.completed,
+                    "dueDate": task.dueDate,
+                    "todoListId": task.todoListId,
+                    "rank": rank,
+                }
+            )
+        return rows
+
+    async def import_tasks(
+        self,
+        user_id: int,
+        tasks: List[Dict[str, Any]],
+        list_ids: Dict[str, int],
+        last_positions: Dict[int, Optional[str]],
+    ) -> project.repository.ImportedBatch:
+        for task in tasks:
+            if task.get("list") is None and task["todoListId"] not in self.todo_lists:
+                raise ValueError(
+                    f"TODO list with ID {task['todoListId']} does not exist"
+                )
+        list_ids = dict(list_ids)
+        names = {task["list"] for task in tasks if task.get("list") is not None}
+        missing = sorted(name for name in names if name not in list_ids)
+        if missing:
+            for id in self._user_lists.get(user_id, ()):
+                list_ids.setdefault(self.todo_lists[id].name, id)
+        new = [name for name in missing if name not in list_ids]
+        for name in new:
+            list_ids[name] = (await self.create_todo_list(user_id, name, None)).id
+        data = [
+            {
+                "title": task["title"],
+                "dueDate": task.get("dueDate"),
+                "priority": task.get("priority"),
+                "notes": task.get("notes"),
+                "completed": task.get("completed", False),
+                "todoListId": (
+                    task["todoListId"]
+                    if task.get("list") is None
+                    else list_ids[task["list"]]
+                ),
+            }
+            for task in tasks
+        ]
+        number = self._begin()
+        known = {
+            task["todoListId"]: (
+                last_positions[task["todoListId"]]
+                if project.ranking.is_key(last_positions.get(task["todoListId"]) or "")
+                else self._appendable(task["todoListId"], user_id, number)
+            )
+            for task in data
+        }
+        new_last = project.repository.assign_positions(data, known)
+        now = _now()
+        for fields in data:
+            task = prisma.models.Task(
+                **fields,
+                id=self._next_id("Task"),
+                version=0,
+                createdAt=now,
+                updatedAt=now,
+            )
+            self._put_task(task, user_id)
+            self._count(task.todoListId, 1, int(task.completed))
+            self._stamp(TASK, user_id, task.id, number)
+        for todo_list_id in new_last:
+            self._stamp(LIST, user_id, todo_list_id, number)
+        return project.repository.ImportedBatch(list_ids, len(new), new_last)
+
+    # Delta sync
+
+    async def sync_horizon(self) -> int:
+        # Every operation completes before the next starts, so all writes so far are visible.
+        return self._write_number + 1
+
+    def _sync(
+        self,
+        kind: str,
+        user_id: int,
+        after: Tuple[int, int],
+        horizon: int,
+        limit: int,
+    ) -> List[Tuple[int, int]]:
+        log = self._changes[kind].get(user_id, [])
+        entries = []
+        for n in range(bisect.bisect_right(log, after), len(log)):
+            number, id = log[n]
+            if number >= horizon or len(entries) == limit:
+                break
+            if self._written.get((kind, id)) == number:
+                entries.append((number, id))
+        return entries
+
+    async def sync_todo_lists(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        rows = []
+        for number, id in self._sync(LIST, user_id, after, horizon, limit):
+            todo_list = self.todo_lists[id]
+            rows.append(
+                {
+                    "id": id,
+                    "key": id,
+                    "name": todo_list.name,
+                    "description": todo_list.description,
+                    "version": todo_list.version,
+                    "taskCount": todo_list.taskCount,
+                    "completedCount": todo_list.completedCount,
+                    "updatedAt": todo_list.updatedAt,
+                    "xid": number,
+                }
+            )
+        return rows
+
+    async def sync_tasks(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        rows = []
+        for number, id in self._sync(TASK, user_id, after, horizon, limit):
+            task = self.tasks[id]
+            rows.append(
+                {
+                    "id": id,
+                    "key": id,
+                    "todoListId": task.todoListId,
+                    "title": task.title,
+                    "dueDate": task.dueDate,
+                    "priority": task.priority,
+                    "notes": task.notes,
+                    "completed": task.completed,
+                    "recurrence": task.recurrence,
+                    "position": task.position,
+                    "version": task.version,
+                    "updatedAt": task.updatedAt,
+                    "xid": number,
+                }
+            )
+        return rows
+
+    async def sync_tombstones(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        rows = []
+        for number, id in self._sync(TOMBSTONE, user_id, after, horizon, limit):
+            tombstone = self.tombstones[id]
+            rows.append(
+                {
+                    "entity": tombstone["entity"],
+                    "id": tombstone["entityId"],
+                    "key": id,
+                    "todoListId": tombstone["todoListId"],
+                    "deletedAt": tombstone["deletedAt"],
+                    "xid": number,
+                }
+            )
+        return rows
+
+    async def purge_tombstones(self, before: datetime) -> int:
+        expired = [
+            tombstone
+            for tombstone in self.tombstones.values()
+            if tombstone["deletedAt"] < _aware(before)
+        ]
+        for tombstone in expired:
+            del self.tombstones[tombstone["id"]]
+            self._unstamp(TOMBSTONE, tombstone["userId"], tombstone["id"])
+        return len(expired)
+
+    # Audit logs
+
+    async def create_audit_log(self, data: Dict[str, Any]) -> prisma.models.AuditLog:
+        if data["userId"] not in self.users:
+            raise ValueError(f"User with id {data['userId']} not found")
+        log = prisma.models.AuditLog(
+            **{
+                "todoListId": None,
+                "taskId": None,
+                **data,
+                "id": self._next_id("AuditLog"),
+                "timestamp": _aware(data.get("timestamp") or _now()),
+            }
+        )
+        self.audit_logs[log.id] = log
+        self._user_logs[log.userId][log.id] = None
+        if log.taskId is not None:
+            self._task_logs[log.taskId].add(log.id)
+        if log.todoListId is not None:
+            self._list_logs[log.todoListId].add(log.id)
+        bisect.insort(self._log_times, (log.timestamp, log.id))
+        return log
+
+    def _drop_log(self, log_id: int) -> None:
+        log = self.audit_logs.pop(log_id)
+        del self._user_logs[log.userId][log_id]
+        self._task_logs.get(log.taskId, set()).discard(log_id)
+        self._list_logs.get(log.todoListId, set()).discard(log_id)
+        del self._log_times[
+            bisect.bisect_left(self._log_times, (log.timestamp, log_id))
+        ]
+
+    async def get_audit_log(self, log_id: int) -> Optional[prisma.models.AuditLog]:
+        return self.audit_logs.get(log_id)
+
+    async def find_audit_logs(self, user_id: int) -> List[prisma.models.AuditLog]:
+        return [self.audit_logs[id] for id in self._user_logs.get(user_id, ())]
+
+    async def recent_audit_logs(
+        self, before: Optional[Tuple[datetime, int]], limit: int
+    ) -> List[prisma.models.AuditLog]:
+        end = len(self._log_times)
+        if before is not None:
+            end = bisect.bisect_left(self._log_times, (_aware(before[0]), before[1]))
+        return [
+            self.audit_logs[id]
+            for _, id in reversed(self._log_times[max(end - limit, 0) : end])
+        ]
+
+    async def delete_audit_log(self, log_id: int) -> bool:
+        if log_id not in self.audit_logs:
+            return False
+        self._drop_log(log_id)
+        return True
+
+    async def delete_audit_logs_chunk(self, user_id: int, limit: int) -> int:
+        ids = list(itertools.islice(self._user_logs.get(user_id, ()), limit))
+        for log_id in ids:
+            self._drop_log(log_id)
+        return len(ids)
+
+    # Jobs and idempotency keys
+
+    async def create_job(
+        self, kind: str, payload: Dict[str, Any], total: Optional[int]
+    ) -> prisma.models.Job:
+        now = _now()
+        job = prisma.models.Job(
+            id=self._next_id("Job"),
+            kind=kind,
+            status="Pending",
+            payload=payload,
+            processed=0,
+            total=total,
+            createdAt=now,
+            updatedAt=now,
+        )
+        self.jobs[job.id] = job
+        return job
+
+    async def get_job(self, job_id: int) -> Optional[prisma.models.Job]:
+        return self.jobs.get(job_id)
+
+    def _claimable(self, job: prisma.models.Job, stale_before: datetime) -> bool:
+        return job.status == "Pending" or (
+            job.status == "Running" and job.updatedAt < stale_before
+        )
+
+    async def claimable_jobs(self, stale_before: datetime) -> List[prisma.models.Job]:
+        return [job for job in self.jobs.values() if self._claimable(job, stale_before)]
+
+    async def claim_job(self, job_id: int, stale_before: datetime) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or not self._claimable(job, stale_before):
+            return False
+        await self.update_job(job_id, {"status": "Running"})
+        return True
+
+    async def update_job(self, job_id: int, data: Dict[str, Any]) -> None:
+        job = self.jobs[job_id]
+        self.jobs[job_id] = job.model_copy(update={**data, "updatedAt": _now()})
+
+    async def claim_idempotency_key(
+        self, route: str, key: str, fingerprint: str, expires_at: datetime
+    ) -> bool:
+        if (route, key) in self.idempotency_keys:
+            return False
+        self.idempotency_keys[(route, key)] = prisma.models.IdempotencyKey(
+            route=route,
+            key=key,
+            fingerprint=fingerprint,
+            response=None,
+            createdAt=_now(),
+            expiresAt=_aware(expires_at),
+        )
+        return True
+
+    async def get_idempotency_key(
+        self, route: str, key: str
+    ) -> Optional[prisma.models.IdempotencyKey]:
+        return self.idempotency_keys.get((route, key))
+
+    async def store_idempotency_response(
+        self, route: str, key: str, response: Dict[str, Any], expires_at: datetime
+    ) -> None:
+        stored = self.idempotency_keys[(route, key)]
+        self.idempotency_keys[(route, key)] = stored.model_copy(
+            update={"response": response, "expiresAt": _aware(expires_at)}
+        )
+
+    async def delete_idempotency_key(
+        self, route: str, key: str, expired_at: Optional[datetime] = None
+    ) -> None:
+        stored = self.idempotency_keys.get((route, key))
+        if stored is not None and (
+            expired_at is None or stored.expiresAt <= _aware(expired_at)
+        ):
+            del self.idempotency_keys[(route, key)]
+
+    async def purge_idempotency_keys(self, expired_at: datetime) -> int:
+        expired = [
+            route_key
+            for route_key, stored in self.idempotency_keys.items()
+            if stored.expiresAt <= _aware(expired_at)
+        ]
+        for route_key in expired:
+            del self.idempotency_keys[route_key]
+        return len(expired)
@@ -0,0 +1,307 @@
+import bisect
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import project.database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """
+    Monotonically increasing counter, optionally split by label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {value}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down. A gauge built with `function` is read at scrape time instead.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        function: Optional[Callable[[], Optional[float]]] = None,
+    ):
+        super().__init__(name, documentation, labels)
+        self._function = function
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values: str, value: float) -> None:
+        self._values[label_values] = value
+
+    def samples(self) -> List[str]:
+        if self._function is None:
+            return super().samples()
+        value = self._function()
+        return [] if value is None else [f"{self.name} {value}"]
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed durations in seconds, split by label values.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, *label_values: str, value: float) -> None:
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+            self._sums[label_values] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {self._sums[key]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(
+    Counter(
+        "http_requests_total",
+        "Total HTTP requests by route template, method and status code.",
+        ("route", "method", "status"),
+    )
+)
+
+http_request_duration_seconds = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template and method.",
+        ("route", "method"),
+    )
+)
+
+http_requests_in_flight = registry.register(
+    Gauge(
+        "http_requests_in_flight",
+        "HTTP requests currently being served, by method.",
+        ("method",),
+    )
+)
+
+db_query_duration_seconds = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Prisma operation latency by model and action, e.g. Task.find_unique.",
+        ("model", "action"),
+    )
+)
+
+db_replica_lag_seconds = registry.register(
+    Gauge(
+        "db_replica_lag_seconds",
+        "Last observed replication lag of the read replica.",
+        function=lambda: project.database.replica_status.lag,
+    )
+)
+
+singleflight_coalesced_calls_total = registry.register(
+    Counter(
+        "singleflight_coalesced_calls_total",
+        "Read calls served by an identical in-flight call instead of their own query, by group.",
+        ("group",),
+    )
+)
+
+background_jobs_total = registry.register(
+    Counter(
+        "background_jobs_total",
+        "Background job attempts by job name and outcome (succeeded, retried, failed, inline).",
+        ("name", "outcome"),
+    )
+)
+
+background_job_duration_seconds = registry.register(
+    Histogram(
+        "background_job_duration_seconds",
+        "Duration of each background job attempt by job name.",
+        ("name",),
+    )
+)
+
+background_queue_depth = registry.register(
+    Gauge(
+        "background_queue_depth",
+        "Jobs waiting in the background executor's queue.",
+    )
+)
+
+changefeed_subscribers = registry.register(
+    Gauge(
+        "changefeed_subscribers",
+        "Clients connected to the change feed on this worker.",
+    )
+)
+
+changefeed_events_total = registry.register(
+    Counter(
+        "changefeed_events_total",
+        "Change events published, by event type.",
+        ("type",),
+    )
+)
+
+changefeed_resyncs_total = registry.register(
+    Counter(
+        "changefeed_resyncs_total",
+        "Times a change feed client fell too far behind and was told to resync.",
+    )
+)
+
+
+def _observe_query(model: str, action: str, elapsed: float) -> None:
+    db_query_duration_seconds.observe(model, action, value=elapsed)
+
+
+project.database.add_query_observer(_observe_query)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts, latency and in-flight requests. Routes are labelled
+    by their path template (e.g. `/tasks/{taskId}`) so that label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec(method)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_requests_total.inc(path, method, status)
+            http_request_duration_seconds.observe(path, method, value=elapsed)
+
+
+async def render() -> str:
+    """
+    Renders all application metrics followed by the Prisma engine's own metrics (connection pool
+    gauges and query counters) in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics payload for the `/metrics` endpoint.
+    """
+    output = registry.render()
+    try:
+        output += await project.database.db_client.get_metrics(format="prometheus")
+    except Exception:
+        logger.exception("Error collecting Prisma engine metrics")
+    return output
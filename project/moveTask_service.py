@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+import project.background
+import project.changefeed
+import project.ranking
+import project.repository
+import project.shards
+import project.singleflight
+from pydantic import BaseModel
+
+
+class MoveTaskResponse(BaseModel):
+    """
+    The moved task's new position in its TODO list.
+    """
+
+    id: int
+    todoListId: int
+    position: str
+    version: int
+
+
+async def moveTask(taskId: int, after_id: Optional[int]) -> MoveTaskResponse:
+    """
+    Moves a task within its TODO list, right after the task `after_id`, or to the top of the list when `after_id` is omitted. Only the moved task is written: it gets a position key between those of its new neighbours. Lists whose keys have grown long are rebalanced in the background, and a list whose neighbouring tasks share a key (e.g. tasks created before positions existed) is rebalanced first.
+
+    Args:
+        taskId (int): The ID of the task to move.
+        after_id (Optional[int]): The ID of the task in the same list to place it after, or None for the top.
+
+    Returns:
+        MoveTaskResponse: The task's new position.
+
+    Example:
+        await moveTask(7, after_id=3)
+        > MoveTaskResponse(id=7, todoListId=1, position="ai", version=4)
+    """
+    await project.shards.use_task(taskId)
+    if after_id == taskId:
+        raise ValueError("A task cannot be moved after itself")
+    repo = project.repository.get()
+    moved = await repo.move_task(taskId, after_id)
+    if moved is None:
+        raise ValueError("Task not found")
+    task = moved.task
+    project.singleflight.todo_list_reads.forget(task.todoListId)
+    if moved.rebalanced:
+        project.changefeed.publish(
+            "todolist.reordered",
+            moved.user_id,
+            task.todoListId,
+            {"id": task.todoListId},
+        )
+    else:
+        project.changefeed.publish(
+            "task.moved",
+            moved.user_id,
+            task.todoListId,
+            {
+                "id": task.id,
+                "todoListId": task.todoListId,
+                "position": task.position,
+                "version": task.version,
+            },
+        )
+    await project.ranking.rebalance_if_long(task.todoListId, task.position)
+    timestamp = datetime.now(timezone.utc)
+    await project.background.executor.submit(
+        "audit",
+        lambda: repo.create_audit_log(
+            {
+                "action": "moveTask",
+                "timestamp": timestamp,
+                "userId": moved.user_id,
+                "taskId": taskId,
+            }
+        ),
+    )
+    return MoveTaskResponse(
+        id=task.id,
+        todoListId=task.todoListId,
+        position=task.position,
+        version=task.version,
+    )
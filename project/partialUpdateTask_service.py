@@ -0,0 +1,148 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import project.background
+import project.changefeed
+import project.recurrence
+import project.repository
+import project.shards
+import project.singleflight
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+
+class PatchTaskResponse(BaseModel):
+    """
+    The task as stored after the partial update.
+    """
+
+    id: int
+    title: str
+    dueDate: Optional[datetime] = None
+    priority: Optional[int] = None
+    notes: Optional[str] = None
+    completed: bool
+    recurrence: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+    todoListId: int
+    version: int
+
+
+class TaskPatch(BaseModel):
+    """
+    JSON Merge Patch (RFC 7396) document for a task. Only the fields present in the document are changed; `null` clears a nullable field.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    title: Optional[str] = None
+    dueDate: Optional[datetime] = None
+    priority: Optional[int] = None
+    notes: Optional[str] = None
+    completed: Optional[bool] = None
+    recurrence: Optional[str] = None
+
+
+class InvalidPatchError(ValueError):
+    pass
+
+
+NOT_NULLABLE = {"title", "completed"}
+
+
+def parse_patch(patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validates a merge patch document and returns the supplied fields with their parsed values.
+
+    Args:
+        patch (Dict[str, Any]): The request body.
+
+    Returns:
+        Dict[str, Any]: The fields to change, e.g. {"completed": True, "notes": None}.
+
+    Raises:
+        InvalidPatchError: The document has unknown fields, values of the wrong type, clears a required field or sets an invalid recurrence rule.
+
+    Example:
+        parse_patch({"completed": True, "notes": None})
+        > {"completed": True, "notes": None}
+    """
+    try:
+        parsed = TaskPatch.model_validate(patch)
+    except ValidationError as e:
+        raise InvalidPatchError(str(e))
+    changes = {field: getattr(parsed, field) for field in parsed.model_fields_set}
+    cleared = sorted(
+        field for field in NOT_NULLABLE if field in changes and changes[field] is None
+    )
+    if cleared:
+        raise InvalidPatchError(f"Fields cannot be null: {', '.join(cleared)}")
+    if "recurrence" in changes:
+        try:
+            changes["recurrence"] = project.recurrence.validate(changes["recurrence"])
+        except project.recurrence.InvalidRecurrenceError as e:
+            raise InvalidPatchError(str(e))
+    return changes
+
+
+async def partialUpdateTask(
+    taskId: int, patch: Dict[str, Any], expected_version: Optional[int] = None
+) -> PatchTaskResponse:
+    """
+    This endpoint allows users to partially update fields of an existing task without providing the complete task details. Users need to provide the task ID as a URL parameter and the fields to update in the request body. Upon success, the response includes the updated task details. Interaction with AuditLogModule is required to log this change.
+
+    The body is a JSON Merge Patch: only the supplied fields are written, in one write that also checks that the task exists, keeps the list's completed counter in step and returns the new row. The audit entry is written in the background.
+
+    Args:
+        taskId (int): The ID of the task to update.
+        patch (Dict[str, Any]): The merge patch document, e.g. {"completed": true} or {"recurrence": "FREQ=WEEKLY"}.
+        expected_version (Optional[int]): When given, the patch only applies if the task is still at this version.
+
+    Returns:
+        PatchTaskResponse: The updated task.
+
+    Example:
+        await partialUpdateTask(1, {"completed": True})
+        > PatchTaskResponse(id=1, title='Buy milk', completed=True, ...)
+    """
+    await project.shards.use_task(taskId)
+    changes = parse_patch(patch)
+    updated = await project.repository.get().update_task(
+        taskId, changes, expected_version
+    )
+    if updated is None:
+        raise ValueError("Task not found")
+    task = updated.task
+    if changes:
+        project.singleflight.todo_list_reads.forget(task.todoListId)
+        project.changefeed.publish(
+            "task.updated",
+            updated.user_id,
+            task.todoListId,
+            project.changefeed.task_data(task),
+        )
+        timestamp = datetime.now(timezone.utc)
+        await project.background.executor.submit(
+            "audit",
+            lambda: project.repository.get().create_audit_log(
+                {
+                    "action": "partialUpdateTask",
+                    "timestamp": timestamp,
+                    "userId": updated.user_id,
+                    "taskId": taskId,
+                }
+            ),
+        )
+    return PatchTaskResponse(
+        id=task.id,
+        title=task.title,
+        dueDate=task.dueDate,
+        priority=task.priority,
+        notes=task.notes,
+        completed=task.completed,
+        recurrence=task.recurrence,
+        createdAt=task.createdAt,
+        updatedAt=task.updatedAt,
+        todoListId=task.todoListId,
+        version=task.version,
+    )
@@ -0,0 +1,904 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import prisma
+import prisma.errors
+import prisma.models
+import project.database
+import project.ranking
+import project.repository
+import project.versioning
+
+# Writable task field -> SQL assignment template, {} being the parameter placeholder.
+TASK_COLUMNS = {
+    "title": '"title" = {}',
+    "dueDate": '"dueDate" = {}::timestamp(3)',
+    "priority": '"priority" = {}',
+    "notes": '"notes" = {}',
+    "completed": '"completed" = {}',
+    "recurrence": '"recurrence" = {}',
+}
+
+# Columns of the TodoList and Task models. Raw queries name them instead of selecting `*`: Prisma
+# cannot decode the Unsupported "searchVector" and "syncXid" columns.
+TODO_LIST_FIELDS = [
+    "id",
+    "name",
+    "description",
+    "version",
+    "taskCount",
+    "completedCount",
+    "createdAt",
+    "updatedAt",
+    "userId",
+]
+
+TASK_FIELDS = [
+    "id",
+    "title",
+    "dueDate",
+    "priority",
+    "notes",
+    "completed",
+    "recurrence",
+    "position",
+    "version",
+    "createdAt",
+    "updatedAt",
+    "todoListId",
+]
+
+WARMUP_POOL_CONNECTIONS = int(os.getenv("WARMUP_POOL_CONNECTIONS", "4"))
+
+WARMUP_MODELS = [
+    prisma.models.User,
+    prisma.models.TodoList,
+    prisma.models.Task,
+    prisma.models.AuditLog,
+]
+
+
+def _select(fields: List[str], alias: str) -> str:
+    return ", ".join(f'{alias}."{field}"' for field in fields)
+
+
+def _owned(row: Optional[Dict[str, Any]]) -> Optional[project.repository.OwnedTask]:
+    if not row:
+        return None
+    return project.repository.OwnedTask(
+        prisma.models.Task.model_validate(row), row["userId"]
+    )
+
+
+async def _neighbours(
+    client: prisma.Prisma, todo_list_id: int, task_id: int, after_id: Optional[int]
+) -> Optional[dict]:
+    if after_id is None:
+        row = await client.query_first(
+            """
+            SELECT "position" AS "upper" FROM "Task"
+            WHERE "todoListId" = $1 AND "id" <> $2
+            ORDER BY "position", "id" LIMIT 1
+            """,
+            todo_list_id,
+            task_id,
+        )
+        return {"lower": None, "upper": row["upper"] if row else None}
+    return await client.query_first(
+        """
+        SELECT a."position" AS "lower", (
+            SELECT n."position" FROM "Task" AS n
+            WHERE n."todoListId" = a."todoListId" AND n."id" <> $2
+                AND (n."position", n."id") > (a."position", a."id")
+            ORDER BY n."position", n."id" LIMIT 1
+        ) AS "upper"
+        FROM "Task" AS a
+        WHERE a."id" = $3 AND a."todoListId" = $1
+        """,
+        todo_list_id,
+        task_id,
+        after_id,
+    )
+
+
+async def _rebalance(client: prisma.Prisma, todo_list_id: int) -> int:
+    # Must run inside a transaction that has locked the list row `FOR UPDATE`, so no move
+    # interleaves with it.
+    rows = await client.query_raw(
+        """
+        SELECT "id" FROM "Task" WHERE "todoListId" = $1 ORDER BY "position", "id"
+        """,
+        todo_list_id,
+    )
+    ids = [row["id"] for row in rows]
+    if ids:
+        await client.execute_raw(
+            """
+            UPDATE "Task" AS t SET "position" = v."position", "updatedAt" = now()
+            FROM unnest($1::int[], $2::text[]) AS v("id", "position")
+            WHERE t."id" = v."id"
+            """,
+            ids,
+            project.ranking.spread_keys(len(ids)),
+        )
+    return len(ids)
+
+
+async def _appendable(
+    client: prisma.Prisma, todo_list_id: int, last: Optional[str]
+) -> Optional[str]:
+    # The key to append after: the list's last key, unless it predates the current key format, in
+    # which case the list is rebalanced first.
+    if last is None or project.ranking.is_key(last):
+        return last
+    await client.execute_raw(
+        'SELECT 1 FROM "TodoList" WHERE "id" = $1 FOR UPDATE', todo_list_id
+    )
+    count = await _rebalance(client, todo_list_id)
+    return project.ranking.spread_keys(count)[-1]
+
+
+class PrismaRepository(project.repository.Repository):
+    """
+    Stores everything in Postgres through Prisma. Writes run on the shard selected for the request
+    (`project.database.client()`), reads on `read_client()`, and jobs and idempotency keys on the
+    first shard. Multi-row writes are single statements where possible, so they hold row locks
+    only for one round trip.
+    """
+
+    async def connect(self) -> None:
+        await project.database.connect()
+
+    async def disconnect(self) -> None:
+        await project.database.disconnect()
+
+    def is_connected(self) -> bool:
+        return project.database.db_client.is_connected()
+
+    async def warm_up(self) -> None:
+        # Pre-opens pool connections on every shard (and the replica, when connected) with
+        # overlapping queries, then runs one cheap query per model so the engine has planned them.
+        clients = list(project.database.shard_clients)
+        replica = project.database.replica_client
+        if replica is not None and replica.is_connected():
+            clients.append(replica)
+        for client in clients:
+            await asyncio.gather(
+                *(
+                    client.query_raw("SELECT pg_sleep(0.05)")
+                    for _ in range(WARMUP_POOL_CONNECTIONS)
+                )
+            )
+            for model in WARMUP_MODELS:
+                await model.prisma(client).find_first()
+
+    # Users
+
+    async def create_user(
+        self, email: str, password: str, role: str = "User"
+    ) -> prisma.models.User:
+        return await prisma.models.User.prisma(project.database.db_client).create(
+            data={"email": email, "password": password, "role": role}
+        )
+
+    async def get_user(self, user_id: int) -> Optional[prisma.models.User]:
+        return await prisma.models.User.prisma(project.database.client()).find_unique(
+            where={"id": user_id}
+        )
+
+    async def find_user_by_email(self, email: str) -> Optional[prisma.models.User]:
+        return await prisma.models.User.prisma(project.database.client()).find_unique(
+            where={"email": email}
+        )
+
+    async def update_user(
+        self, user_id: int, data: Dict[str, Any]
+    ) -> Optional[prisma.models.User]:
+        return await prisma.models.User.prisma(project.database.client()).update(
+            where={"id": user_id}, data=data
+        )
+
+    async def delete_user(self, user_id: int) -> bool:
+        try:
+            async with project.database.client().tx() as tx:
+                # Entries written since the last chunk was deleted, e.g. by requests with a
+                # still valid token.
+                await tx.execute_raw(
+                    'DELETE FROM "AuditLog" WHERE "userId" = $1', user_id
+                )
+                await prisma.models.User.prisma(tx).delete_many(where={"id": user_id})
+        except prisma.errors.ForeignKeyViolationError:
+            return False
+        return True
+
+    async def count_user_rows(self, user_id: int) -> int:
+        client = project.database.client()
+        return (
+            await prisma.models.AuditLog.prisma(client).count(where={"userId": user_id})
+            + await prisma.models.Task.prisma(client).count(
+                where={"todoList": {"is": {"userId": user_id}}}
+            )
+            + await prisma.models.TodoList.prisma(client).count(
+                where={"userId": user_id}
+            )
+        )
+
+    # TODO lists
+
+    async def create_todo_list(
+        self, user_id: int, name: str, description: Optional[str]
+    ) -> prisma.models.TodoList:
+        return await prisma.models.TodoList.prisma(project.database.client()).create(
+            data={"name": name, "description": description, "userId": user_id}
+        )
+
+    async def get_todo_list(
+        self, todo_list_id: int
+    ) -> Optional[prisma.models.TodoList]:
+        return await prisma.models.TodoList.prisma(
+            project.database.client()
+        ).find_unique(where={"id": todo_list_id})
+
+    async def read_todo_list(
+        self, todo_list_id: int
+    ) -> Optional[prisma.models.TodoList]:
+        return await prisma.models.TodoList.prisma(
+            project.database.read_client()
+        ).find_unique(
+            where={"id": todo_list_id},
+            include={"tasks": {"order_by": project.ranking.TASK_ORDER}},
+        )
+
+    async def find_todo_lists(self, user_id: int) -> List[prisma.models.TodoList]:
+        return await prisma.models.TodoList.prisma(
+            project.database.read_client()
+        ).find_many(where={"userId": user_id}, order={"id": "asc"})
+
+    async def first_todo_list(self, user_id: int) -> Optional[prisma.models.TodoList]:
+        return await prisma.models.TodoList.prisma(
+            project.database.client()
+        ).find_first(where={"userId": user_id}, order={"id": "asc"})
+
+    async def update_todo_list(
+        self,
+        todo_list_id: int,
+        name: str,
+        description: Optional[str],
+        expected_version: Optional[int] = None,
+    ) -> Optional[prisma.models.TodoList]:
+        client = project.database.client()
+        todo_list = await client.query_first(
+            f"""
+            UPDATE "TodoList" AS l SET
+                "name" = $2,
+                "description" = $3,
+                "version" = l."version" + 1,
+                "updatedAt" = now()
+            WHERE l."id" = $1 AND ($4::int IS NULL OR l."version" = $4)
+            RETURNING {_select(TODO_LIST_FIELDS, "l")}
+            """,
+            todo_list_id,
+            name,
+            description,
+            expected_version,
+            model=prisma.models.TodoList,
+        )
+        if todo_list is None:
+            await project.versioning.raise_for_conflict(
+                client, "TodoList", todo_list_id, expected_version
+            )
+        return todo_list
+
+    async def delete_todo_list(self, todo_list_id: int) -> int:
+        # Audit entries that reference the list or its tasks are detached by the foreign keys'
+        # ON DELETE SET NULL.
+        async with project.database.client().tx() as tx:
+            deleted = await tx.execute_raw(
+                'DELETE FROM "Task" WHERE "todoListId" = $1', todo_list_id
+            )
+            await tx.execute_raw(
+                """
+                WITH deleted AS (
+                    DELETE FROM "TodoList" WHERE id = $1 RETURNING "id", "userId"
+                )
+                INSERT INTO "Tombstone" ("entity", "entityId", "todoListId", "userId")
+                SELECT 'todolist', "id", "id", "userId" FROM deleted
+                """,
+                todo_list_id,
+            )
+        return deleted
+
+    async def delete_tasks_chunk(self, todo_list_id: int, limit: int) -> int:
+        # The delete and the list's counters are one statement; audit entries that reference the
+        # tasks are detached by the foreign key's ON DELETE SET NULL.
+        row = await project.database.client().query_first(
+            """
+            WITH deleted AS (
+                DELETE FROM "Task"
+                WHERE id IN (
+                    SELECT id FROM "Task" WHERE "todoListId" = $1 ORDER BY id LIMIT $2
+                )
+                RETURNING "completed"
+            ), counted AS (
+                UPDATE "TodoList" SET
+                    "taskCount" = "taskCount" - (SELECT count(*) FROM deleted),
+                    "completedCount" = "completedCount"
+                        - (SELECT count(*) FROM deleted WHERE "completed")
+                WHERE id = $1
+            )
+            SELECT count(*)::int AS "deleted" FROM deleted
+            """,
+            todo_list_id,
+            limit,
+        )
+        return row["deleted"]
+
+    # Tasks
+
+    async def create_task(
+        self, todo_list_id: int, data: Dict[str, Any]
+    ) -> Optional[project.repository.OwnedTask]:
+        async with project.database.client().tx() as tx:
+            # Counts the task on its list and reads the list's last position in one statement.
+            # Concurrent appends may get the same position; they are ordered by id.
+            todo_list = await tx.query_first(
+                """
+                UPDATE "TodoList" AS l SET "taskCount" = l."taskCount" + 1
+                WHERE l."id" = $1
+                RETURNING l."userId", (
+                    SELECT t."position" FROM "Task" AS t WHERE t."todoListId" = l."id"
+                    ORDER BY t."position" DESC, t."id" DESC LIMIT 1
+                ) AS "lastPosition"
+                """,
+                todo_list_id,
+            )
+            if not todo_list:
+                return None
+            last = await _appendable(tx, todo_list_id, todo_list["lastPosition"])
+            task = await prisma.models.Task.prisma(tx).create(
+                data={
+                    **data,
+                    "position": project.ranking.key_between(last, None),
+                    "todoListId": todo_list_id,
+                }
+            )
+        return project.repository.OwnedTask(task, todo_list["userId"])
+
+    async def get_task(self, task_id: int) -> Optional[prisma.models.Task]:
+        return await prisma.models.Task.prisma(project.database.client()).find_unique(
+            where={"id": task_id}
+        )
+
+    async def update_task(
+        self,
+        task_id: int,
+        changes: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[project.repository.OwnedTask]:
+        args: List[Any] = [task_id]
+        assignments = []
+        for field, assignment in TASK_COLUMNS.items():
+            if field not in changes:
+                continue
+            args.append(changes[field])
+            assignments.append(assignment.format(f"${len(args)}"))
+        args.append(expected_version)
+        version_check = f'(${len(args)}::int IS NULL OR t."version" = ${len(args)})'
+        client = project.database.client()
+        if assignments:
+            # One statement checks that the task exists, applies the changes, adjusts the list's
+            # completed counter if `completed` flipped and returns the row with its owner.
+            row = await client.query_first(
+                f"""
+                WITH previous AS (
+                    SELECT "id", "completed" FROM "Task" WHERE "id" = $1 FOR UPDATE
+                ), updated AS (
+                    UPDATE "Task" AS t SET {", ".join(assignments)},
+                        "version" = t."version" + 1, "updatedAt" = now()
+                    FROM "TodoList" AS l, previous AS p
+                    WHERE t."id" = p."id" AND l."id" = t."todoListId" AND {version_check}
+                    RETURNING {_select(TASK_FIELDS, "t")}, l."userId",
+                        p."completed" AS "wasCompleted"
+                ), counted AS (
+                    UPDATE "TodoList" AS l
+                    SET "completedCount" = l."completedCount"
+                        + CASE WHEN u."completed" THEN 1 ELSE -1 END
+                    FROM updated AS u
+                    WHERE l."id" = u."todoListId" AND u."completed" <> u."wasCompleted"
+                )
+                SELECT * FROM updated
+                """,
+                *args,
+            )
+        else:
+            row = await client.query_first(
+                f"""
+                SELECT {_select(TASK_FIELDS, "t")}, l."userId" FROM "Task" AS t
+                JOIN "TodoList" AS l ON l."id" = t."todoListId"
+                WHERE t."id" = $1 AND {version_check}
+                """,
+                *args,
+            )
+        if not row:
+            await project.versioning.raise_for_conflict(
+                client, "Task", task_id, expected_version
+            )
+        return _owned(row)
+
+    async def delete_task(self, task_id: int) -> Optional[project.repository.OwnedTask]:
+        # The existence check, the owner lookup, the delete, the list's counters and the
+        # tombstone for `GET /sync` are one statement. Audit entries that reference the task are
+        # detached by the foreign key's ON DELETE SET NULL.
+        row = await project.database.client().query_first(
+            f"""
+            WITH deleted AS (
+                DELETE FROM "Task" AS t USING "TodoList" AS l
+                WHERE t."id" = $1 AND l."id" = t."todoListId"
+                RETURNING {_select(TASK_FIELDS, "t")}, l."userId"
+            ), counted AS (
+                UPDATE "TodoList" AS l
+                SET "taskCount" = l."taskCount" - 1,
+                    "completedCount" = l."completedCount" - d."completed"::int
+                FROM deleted AS d WHERE l."id" = d."todoListId"
+            ), tombstone AS (
+                INSERT INTO "Tombstone" ("entity", "entityId", "todoListId", "userId")
+                SELECT 'task', $1, "todoListId", "userId" FROM deleted
+            )
+            SELECT * FROM deleted
+            """,
+            task_id,
+        )
+        return _owned(row)
+
+    async def move_task(
+        self, task_id: int, after_id: Optional[int]
+    ) -> Optional[project.repository.MovedTask]:
+        async with project.database.client().tx() as tx:
+            # Shares the list row with other moves, but waits for a running rebalance.
+            task = await tx.query_first(
+                """
+                SELECT t."todoListId", l."userId" FROM "Task" AS t
+                JOIN "TodoList" AS l ON l."id" = t."todoListId"
+                WHERE t."id" = $1
+                FOR SHARE OF l
+                """,
+                task_id,
+            )
+            if not task:
+                return None
+            todo_list_id = task["todoListId"]
+            neighbours = await _neighbours(tx, todo_list_id, task_id, after_id)
+            if neighbours is None:
+                raise ValueError(f"Task {after_id} is not in TODO list {todo_list_id}")
+            rebalanced = False
+            try:
+                position = project.ranking.key_between(
+                    neighbours["lower"], neighbours["upper"]
+                )
+            except ValueError:
+                await tx.execute_raw(
+                    'SELECT 1 FROM "TodoList" WHERE "id" = $1 FOR UPDATE', todo_list_id
+                )
+                await _rebalance(tx, todo_list_id)
+                rebalanced = True
+                neighbours = await _neighbours(tx, todo_list_id, task_id, after_id)
+                position = project.ranking.key_between(
+                    neighbours["lower"], neighbours["upper"]
+                )
+            moved = await tx.query_first(
+                f"""
+                UPDATE "Task" AS t SET "position" = $2, "version" = t."version" + 1,
+                    "updatedAt" = now()
+                WHERE t."id" = $1
+                RETURNING {_select(TASK_FIELDS, "t")}
+                """,
+                task_id,
+                position,
+                model=prisma.models.Task,
+            )
+        return project.repository.MovedTask(moved, task["userId"], rebalanced)
+
+    async def rebalance_todo_list(self, todo_list_id: int) -> Optional[Tuple[int, int]]:
+        async with project.database.client().tx() as tx:
+            todo_list = await tx.query_first(
+                'SELECT "userId" FROM "TodoList" WHERE "id" = $1 FOR UPDATE',
+                todo_list_id,
+            )
+            if not todo_list:
+                return None
+            count = await _rebalance(tx, todo_list_id)
+        return todo_list["userId"], count
+
+    async def find_occurrences(
+        self, task_ids: List[int], start: datetime, end: datetime
+    ) -> List[prisma.models.TaskOccurrence]:
+        return await prisma.models.TaskOccurrence.prisma(
+            project.database.read_client()
+        ).find_many(
+            where={
+                "taskId": {"in": task_ids},
+                "occurrenceAt": {"gte": start, "lt": end},
+            }
+        )
+
+    async def save_occurrence(
+        self,
+        task_id: int,
+        occurrence_at: datetime,
+        changes: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[project.repository.OwnedOccurrence]:
+        async with project.database.client().tx() as tx:
+            # Locking the task serializes the writes to its occurrences, so that the first two
+            # cannot both create the row.
+            task = await tx.query_first(
+                """
+                SELECT l."userId" FROM "Task" AS t
+                JOIN "TodoList" AS l ON l."id" = t."todoListId"
+                WHERE t."id" = $1 FOR UPDATE OF t
+                """,
+                task_id,
+            )
+            if not task:
+                return None
+            where = {
+                "taskId_occurrenceAt": {
+                    "taskId": task_id,
+                    "occurrenceAt": occurrence_at,
+                }
+            }
+            stored = await prisma.models.TaskOccurrence.prisma(tx).find_unique(
+                where=where
+            )
+            version = stored.version if stored else 0
+            if expected_version is not None and version != expected_version:
+                raise project.versioning.VersionConflictError(
+                    "Task occurrence", task_id, expected_version, version
+                )
+            if stored is None:
+                occurrence = await prisma.models.TaskOccurrence.prisma(tx).create(
+                    data={
+                        **changes,
+                        "taskId": task_id,
+                        "occurrenceAt": occurrence_at,
+                        "version": 1,
+                    }
+                )
+            else:
+                occurrence = await prisma.models.TaskOccurrence.prisma(tx).update(
+                    where=where, data={**changes, "version": {"increment": 1}}
+                )
+        return project.repository.OwnedOccurrence(occurrence, task["userId"])
+
+    async def search_tasks(
+        self, user_id: int, query: str, limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        # Matching uses the GIN index on the tasks' search vector, so the tasks are not loaded to
+        # be filtered. Title matches rank above notes matches through the vector's weights.
+        return await project.database.read_client().query_raw(
+            """
+            SELECT t."id", t."title", t."notes", t."completed", t."dueDate", t."todoListId",
+                ts_rank(t."searchVector", q.query) AS "rank"
+            FROM websearch_to_tsquery('english', $2) AS q(query), "Task" AS t
+            JOIN "TodoList" AS l ON l."id" = t."todoListId"
+            WHERE l."userId" = $1 AND t."searchVector" @@ q.query
+            ORDER BY "rank" DESC, t."id"
+            LIMIT $3 OFFSET $4
+            """,
+            user_id,
+            query,
+            limit,
+            offset,
+        )
+
+    async def import_tasks(
+        self,
+        user_id: int,
+        tasks: List[Dict[str, Any]],
+        list_ids: Dict[str, int],
+        last_positions: Dict[int, Optional[str]],
+    ) -> project.repository.ImportedBatch:
+        list_ids = dict(list_ids)
+        async with project.database.client().tx() as tx:
+            missing = sorted(
+                {
+                    task["list"]
+                    for task in tasks
+                    if task.get("list") is not None and task["list"] not in list_ids
+                }
+            )
+            created = 0
+            if missing:
+                existing = await prisma.models.TodoList.prisma(tx).find_many(
+                    where={"userId": user_id, "name": {"in": missing}},
+                    order={"id": "asc"},
+                )
+                found = {todo_list.name for todo_list in existing}
+                new = [name for name in missing if name not in found]
+                if new:
+                    await prisma.models.TodoList.prisma(tx).create_many(
+                        data=[{"name": name, "userId": user_id} for name in new]
+                    )
+                    existing += await prisma.models.TodoList.prisma(tx).find_many(
+                        where={"userId": user_id, "name": {"in": new}},
+                        order={"id": "asc"},
+                    )
+                    created = len(new)
+                for todo_list in existing:
+                    list_ids.setdefault(todo_list.name, todo_list.id)
+            data = [
+                {
+                    "title": task["title"],
+                    "dueDate": task.get("dueDate"),
+                    "priority": task.get("priority"),
+                    "notes": task.get("notes"),
+                    "completed": task.get("completed", False),
+                    "todoListId": (
+                        task["todoListId"]
+                        if task.get("list") is None
+                        else list_ids[task["list"]]
+                    ),
+                }
+                for task in tasks
+            ]
+            counts: Dict[int, List[int]] = {}
+            for task in data:
+                count = counts.setdefault(task["todoListId"], [0, 0])
+                count[0] += 1
+                count[1] += task["completed"]
+            known = {
+                todo_list_id: last_positions[todo_list_id]
+                for todo_list_id in counts
+                if todo_list_id in last_positions
+            }
+            unknown = [
+                todo_list_id for todo_list_id in counts if todo_list_id not in known
+            ]
+            if unknown:
+                rows = await tx.query_raw(
+                    """
+                    SELECT DISTINCT ON ("todoListId") "todoListId", "position" FROM "Task"
+                    WHERE "todoListId" = ANY($1::int[])
+                    ORDER BY "todoListId", "position" DESC, "id" DESC
+                    """,
+                    unknown,
+                )
+                known.update({todo_list_id: None for todo_list_id in unknown})
+                known.update({row["todoListId"]: row["position"] for row in rows})
+            for todo_list_id, position in known.items():
+                known[todo_list_id] = await _appendable(tx, todo_list_id, position)
+            new_last = project.repository.assign_positions(data, known)
+            await prisma.models.Task.prisma(tx).create_many(data=data)
+            await tx.execute_raw(
+                """
+                UPDATE "TodoList" AS l SET
+                    "taskCount" = l."taskCount" + c."tasks",
+                    "completedCount" = l."completedCount" + c."completed"
+                FROM unnest($1::int[], $2::int[], $3::int[]) AS c("id", "tasks", "completed")
+                WHERE l."id" = c."id"
+                """,
+                list(counts),
+                [count[0] for count in counts.values()],
+                [count[1] for count in counts.values()],
+            )
+        return project.repository.ImportedBatch(list_ids, created, new_last)
+
+    # Delta sync
+
+    async def sync_horizon(self) -> int:
+        # Every transaction with a lower id has committed or aborted, so its changes are all
+        # visible.
+        row = await project.database.client().query_first(
+            'SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS "horizon"'
+        )
+        return int(row["horizon"])
+
+    async def _sync(
+        self,
+        query: str,
+        user_id: int,
+        after: Tuple[int, int],
+        horizon: int,
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        return await project.database.client().query_raw(
+            query, user_id, str(after[0]), after[1], str(horizon), limit
+        )
+
+    async def sync_todo_lists(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        return await self._sync(
+            """
+            SELECT "id", "id" AS "key", "name", "description", "version", "taskCount",
+                "completedCount", "updatedAt", "syncXid"::text AS "xid"
+            FROM "TodoList"
+            WHERE "userId" = $1 AND ("syncXid", "id") > ($2::xid8, $3) AND "syncXid" < $4::xid8
+            ORDER BY "syncXid", "id" LIMIT $5
+            """,
+            user_id,
+            after,
+            horizon,
+            limit,
+        )
+
+    async def sync_tasks(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        return await self._sync(
+            """
+            SELECT t."id", t."id" AS "key", t."todoListId", t."title", t."dueDate", t."priority",
+                t."notes", t."completed", t."recurrence", t."position", t."version",
+                t."updatedAt", t."syncXid"::text AS "xid"
+            FROM "Task" AS t JOIN "TodoList" AS l ON l."id" = t."todoListId"
+            WHERE l."userId" = $1 AND (t."syncXid", t."id") > ($2::xid8, $3)
+                AND t."syncXid" < $4::xid8
+            ORDER BY t."syncXid", t."id" LIMIT $5
+            """,
+            user_id,
+            after,
+            horizon,
+            limit,
+        )
+
+    async def sync_tombstones(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        return await self._sync(
+            """
+            SELECT "entity", "entityId" AS "id", "id" AS "key", "todoListId", "deletedAt",
+                "syncXid"::text AS "xid"
+            FROM "Tombstone"
+            WHERE "userId" = $1 AND ("syncXid", "id") > ($2::xid8, $3)
+                AND "syncXid" < $4::xid8
+            ORDER BY "syncXid", "id" LIMIT $5
+            """,
+            user_id,
+            after,
+            horizon,
+            limit,
+        )
+
+    async def purge_tombstones(self, before: datetime) -> int:
+        return await prisma.models.Tombstone.prisma(
+            project.database.client()
+        ).delete_many(where={"deletedAt": {"lt": before}})
+
+    # Audit logs
+
+    async def create_audit_log(self, data: Dict[str, Any]) -> prisma.models.AuditLog:
+        return await prisma.models.AuditLog.prisma(project.database.client()).create(
+            data=data
+        )
+
+    async def get_audit_log(self, log_id: int) -> Optional[prisma.models.AuditLog]:
+        return await prisma.models.AuditLog.prisma(
+            project.database.read_client()
+        ).find_unique(where={"id": log_id})
+
+    async def find_audit_logs(self, user_id: int) -> List[prisma.models.AuditLog]:
+        return await prisma.models.AuditLog.prisma(
+            project.database.read_client()
+        ).find_many(where={"userId": user_id}, order={"id": "asc"})
+
+    async def recent_audit_logs(
+        self, before: Optional[Tuple[datetime, int]], limit: int
+    ) -> List[prisma.models.AuditLog]:
+        where = {}
+        if before is not None:
+            where = {
+                "OR": [
+                    {"timestamp": {"lt": before[0]}},
+                    {"timestamp": before[0], "id": {"lt": before[1]}},
+                ]
+            }
+        return await prisma.models.AuditLog.prisma(
+            project.database.read_client()
+        ).find_many(
+            where=where, order=[{"timestamp": "desc"}, {"id": "desc"}], take=limit
+        )
+
+    async def delete_audit_log(self, log_id: int) -> bool:
+        return bool(
+            await prisma.models.AuditLog.prisma(project.database.client()).delete_many(
+                where={"id": log_id}
+            )
+        )
+
+    async def delete_audit_logs_chunk(self, user_id: int, limit: int) -> int:
+        return await project.database.client().execute_raw(
+            """
+            DELETE FROM "AuditLog"
+            WHERE id IN (SELECT id FROM "AuditLog" WHERE "userId" = $1 LIMIT $2)
+            """,
+            user_id,
+            limit,
+        )
+
+    # Jobs and idempotency keys
+
+    async def create_job(
+        self, kind: str, payload: Dict[str, Any], total: Optional[int]
+    ) -> prisma.models.Job:
+        return await prisma.models.Job.prisma(project.database.db_client).create(
+            data={"kind": kind, "payload": prisma.Json(payload), "total": total}
+        )
+
+    async def get_job(self, job_id: int) -> Optional[prisma.models.Job]:
+        return await prisma.models.Job.prisma(project.database.db_client).find_unique(
+            where={"id": job_id}
+        )
+
+    def _claimable(self, stale_before: datetime) -> List[Dict[str, Any]]:
+        return [
+            {"status": "Pending"},
+            {"status": "Running", "updatedAt": {"lt": stale_before}},
+        ]
+
+    async def claimable_jobs(self, stale_before: datetime) -> List[prisma.models.Job]:
+        return await prisma.models.Job.prisma(project.database.db_client).find_many(
+            where={"OR": self._claimable(stale_before)}, order={"id": "asc"}
+        )
+
+    async def claim_job(self, job_id: int, stale_before: datetime) -> bool:
+        return bool(
+            await prisma.models.Job.prisma(project.database.db_client).update_many(
+                where={"id": job_id, "OR": self._claimable(stale_before)},
+                data={"status": "Running"},
+            )
+        )
+
+    async def update_job(self, job_id: int, data: Dict[str, Any]) -> None:
+        await prisma.models.Job.prisma(project.database.db_client).update(
+            where={"id": job_id}, data=data
+        )
+
+    async def claim_idempotency_key(
+        self, route: str, key: str, fingerprint: str, expires_at: datetime
+    ) -> bool:
+        try:
+            await prisma.models.IdempotencyKey.prisma(
+                project.database.db_client
+            ).create(
+                data={
+                    "route": route,
+                    "key": key,
+                    "fingerprint": fingerprint,
+                    "expiresAt": expires_at,
+                }
+            )
+        except prisma.errors.UniqueViolationError:
+            return False
+        return True
+
+    async def get_idempotency_key(
+        self, route: str, key: str
+    ) -> Optional[prisma.models.IdempotencyKey]:
+        return await prisma.models.IdempotencyKey.prisma(
+            project.database.db_client
+        ).find_unique(where={"route_key": {"route": route, "key": key}})
+
+    async def store_idempotency_response(
+        self, route: str, key: str, response: Dict[str, Any], expires_at: datetime
+    ) -> None:
+        await prisma.models.IdempotencyKey.prisma(project.database.db_client).update(
+            where={"route_key": {"route": route, "key": key}},
+            data={"response": prisma.Json(response), "expiresAt": expires_at},
+        )
+
+    async def delete_idempotency_key(
+        self, route: str, key: str, expired_at: Optional[datetime] = None
+    ) -> None:
+        where: Dict[str, Any] = {"route": route, "key": key}
+        if expired_at is not None:
+            where["expiresAt"] = {"lte": expired_at}
+        await prisma.models.IdempotencyKey.prisma(
+            project.database.db_client
+        ).delete_many(where=where)
+
+    async def purge_idempotency_keys(self, expired_at: datetime) -> int:
+        return await prisma.models.IdempotencyKey.prisma(
+            project.database.db_client
+        ).delete_many(where={"expiresAt": {"lte": expired_at}})
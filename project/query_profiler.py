@@ -0,0 +1,140 @@
+import contextvars
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+import project.database
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("QUERY_PROFILING", "").lower() in ("1", "true", "yes")
+
+REPEATED_QUERY_THRESHOLD = int(os.getenv("QUERY_PROFILING_REPEAT_THRESHOLD", "3"))
+
+
+@dataclass
+class QueryProfile:
+    """
+    Prisma operations issued within a profiling scope, as (model, action, elapsed seconds) tuples
+    in the order they completed.
+    """
+
+    queries: List[Tuple[str, str, float]] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_time(self) -> float:
+        return sum(elapsed for _, _, elapsed in self.queries)
+
+    def repeated(
+        self, threshold: int = REPEATED_QUERY_THRESHOLD
+    ) -> List[Tuple[str, int]]:
+        """
+        Returns the operations issued at least `threshold` times, which usually point at an N+1
+        access pattern.
+        """
+        counts = Counter(f"{model}.{action}" for model, action, _ in self.queries)
+        return [(name, n) for name, n in counts.most_common() if n >= threshold]
+
+    def describe(self) -> str:
+        operations = ", ".join(
+            f"{model}.{action} {elapsed * 1000:.1f}ms"
+            for model, action, elapsed in self.queries
+        )
+        return f"{self.count} queries in {self.total_time * 1000:.1f}ms [{operations}]"
+
+
+_current_profile: contextvars.ContextVar[Optional[QueryProfile]] = (
+    contextvars.ContextVar("query_profile", default=None)
+)
+
+
+def _record_query(model: str, action: str, elapsed: float) -> None:
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.queries.append((model, action, elapsed))
+
+
+project.database.add_query_observer(_record_query)
+
+
+@contextmanager
+def profile_queries() -> Iterator[QueryProfile]:
+    """
+    Records every Prisma operation awaited within the block, including those issued by tasks it
+    spawns.
+
+    Example:
+        with profile_queries() as profile:
+            await deleteTask(123)
+        print(profile.describe())
+    """
+    profile = QueryProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryProfile]:
+    """
+    Fails with an AssertionError listing the issued operations when the block performs more than
+    `limit` Prisma operations.
+
+    Example:
+        with assert_max_queries(2):
+            await updateTodoList(1, "Groceries", None)
+    """
+    with profile_queries() as profile:
+        yield profile
+    if profile.count > limit:
+        raise AssertionError(
+            f"Expected at most {limit} queries, got {profile.describe()}"
+        )
+
+
+class QueryProfilerMiddleware:
+    """
+    Debug ASGI middleware counting and timing the Prisma operations issued by each request. The
+    totals are returned in the `X-Query-Count` and `X-Query-Time-Ms` response headers and logged
+    along with the per-operation breakdown; operations repeated within a request are flagged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with profile_queries() as profile:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(profile.count).encode()),
+                        (
+                            b"x-query-time-ms",
+                            f"{profile.total_time * 1000:.2f}".encode(),
+                        ),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+        logger.info("%s %s: %s", scope["method"], scope["path"], profile.describe())
+        repeated = profile.repeated()
+        if repeated:
+            logger.warning(
+                "%s %s repeated queries (possible N+1): %s",
+                scope["method"],
+                scope["path"],
+                ", ".join(f"{name} x{n}" for name, n in repeated),
+            )
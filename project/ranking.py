@@ -0,0 +1,204 @@
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import project.background
+import project.changefeed
+import project.repository
+import project.singleflight
+
+logger = logging.getLogger(__name__)
+
+# Keys whose length exceeds this trigger a rebalance of their list in the background.
+MAX_KEY_LENGTH = int(os.getenv("TASK_POSITION_MAX_LENGTH", "32"))
+
+# Digits and lowercase letters sort the same under byte order and the usual Postgres collations,
+# so the keys order identically in Python and in the `(todoListId, position)` index.
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+# Order of the tasks in a list; ties (tasks created before positions existed) fall back to age.
+TASK_ORDER = [{"position": "asc"}, {"id": "asc"}]
+
+
+# A key is an integer part followed by an optional fraction, as in the usual fractional indexing
+# scheme. The integer part is a head digit telling how many digits follow ("i" one, "j" two, ...
+# "z" eighteen, and for the integers below zero "h" one, "g" two, ... "0" eighteen) and those
+# digits. Appending or prepending steps the integer, so keys only grow by one character every time
+# the integer's digit count does; inserting between consecutive integers extends the fraction.
+# Keys in the earlier format (bare fractions) do not parse: writes meeting one rebalance the list.
+INTEGER_ZERO = "i0"
+SMALLEST_INTEGER = DIGITS[0] * 19
+
+
+def _integer_length(head: str) -> int:
+    # Characters in an integer part starting with `head`, the head included.
+    index, zero = DIGITS.index(head), DIGITS.index(INTEGER_ZERO[0])
+    return 2 + (index - zero if index >= zero else zero - 1 - index)
+
+
+def _split(key: str) -> Tuple[str, str]:
+    # (integer part, fraction) of a valid key.
+    if key and set(key) <= set(DIGITS) and key != SMALLEST_INTEGER:
+        length = _integer_length(key[0])
+        if len(key) >= length and not key[length:].endswith(DIGITS[0]):
+            return key[:length], key[length:]
+    raise ValueError(f"invalid position key {key!r}")
+
+
+def is_key(key: str) -> bool:
+    """
+    Tells whether `key` is a position key in the current format.
+    """
+    try:
+        _split(key)
+    except ValueError:
+        return False
+    return True
+
+
+def _step(integer: str, up: bool) -> Optional[str]:
+    # The next (up) or previous integer, or None past the largest or smallest one.
+    first, last = (DIGITS[0], DIGITS[-1]) if up else (DIGITS[-1], DIGITS[0])
+    head, digits = integer[0], list(integer[1:])
+    for n in reversed(range(len(digits))):
+        if digits[n] != last:
+            digits[n] = DIGITS[DIGITS.index(digits[n]) + (1 if up else -1)]
+            return head + "".join(digits)
+        digits[n] = first
+    if head == last:
+        return None
+    # Every digit wrapped around: the integer moves to the next head, which has one digit more or
+    # less.
+    head = DIGITS[DIGITS.index(head) + (1 if up else -1)]
+    return head + first * (_integer_length(head) - 1)
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    # a < b, b None meaning the end of the key space; neither may end in the zero digit.
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    low = DIGITS.index(a[0]) if a else 0
+    high = DIGITS.index(b[0]) if b is not None else BASE
+    if high - low > 1:
+        return DIGITS[(low + high) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[low] + _midpoint(a[1:], None)
+
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """
+    Returns a key that sorts strictly between `a` and `b`. None stands for the start or the end of the list.
+
+    Args:
+        a (Optional[str]): The key of the preceding task, if any.
+        b (Optional[str]): The key of the following task, if any.
+
+    Returns:
+        str: The new key.
+
+    Raises:
+        ValueError: `a` does not sort before `b`, e.g. because two tasks share a key, or a key is not in the current format; rebalance the list first.
+
+    Example:
+        key_between("i5", None)
+        > "i6"
+        key_between("i5", "i6")
+        > "i5i"
+    """
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"{a!r} does not sort before {b!r}")
+    if a is None and b is None:
+        return INTEGER_ZERO
+    if a is None:
+        integer, fraction = _split(b)
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint("", fraction)
+        if integer < b:
+            return integer
+        previous = _step(integer, up=False)
+        if previous == SMALLEST_INTEGER:
+            # The smallest integer is only valid with a fraction, so the key has one.
+            return previous + _midpoint("", None)
+        return previous
+    integer, fraction = _split(a)
+    if b is not None:
+        b_integer, b_fraction = _split(b)
+        if integer == b_integer:
+            return integer + _midpoint(fraction, b_fraction)
+    following = _step(integer, up=True)
+    if following is not None and (b is None or following < b):
+        return following
+    return integer + _midpoint(fraction, None)
+
+
+def spread_keys(count: int) -> List[str]:
+    """
+    Returns `count` ascending keys of equal, minimal length with room between them, as assigned by a rebalance.
+
+    Example:
+        spread_keys(3)
+        > ["i9", "ii", "ir"]
+    """
+    digits = 1
+    while BASE**digits <= 2 * count:
+        digits += 1
+    head = DIGITS[DIGITS.index(INTEGER_ZERO[0]) + digits - 1]
+    step = BASE**digits // (count + 1)
+    keys = []
+    for n in range(1, count + 1):
+        value, encoded = n * step, ""
+        for _ in range(digits):
+            value, digit = divmod(value, BASE)
+            encoded = DIGITS[digit] + encoded
+        keys.append(head + encoded)
+    return keys
+
+
+def keys_after(a: Optional[str], count: int) -> List[str]:
+    """
+    Returns `count` ascending keys after `a`, for appending a batch of tasks to a list.
+
+    Example:
+        keys_after("i5", 2)
+        > ["i6", "i7"]
+    """
+    keys = []
+    for _ in range(count):
+        a = key_between(a, None)
+        keys.append(a)
+    return keys
+
+
+async def rebalance_list(todo_list_id: int) -> None:
+    """
+    Background job rebalancing a list whose keys have grown past MAX_KEY_LENGTH.
+    """
+    rebalanced = await project.repository.get().rebalance_todo_list(todo_list_id)
+    if rebalanced is None:
+        return
+    user_id, count = rebalanced
+    project.singleflight.todo_list_reads.forget(todo_list_id)
+    # Every position changed; clients reload the list rather than receive each task.
+    project.changefeed.publish(
+        "todolist.reordered",
+        user_id,
+        todo_list_id,
+        {"id": todo_list_id},
+    )
+    logger.info("Rebalanced positions of %d tasks in list %d", count, todo_list_id)
+
+
+async def rebalance_if_long(todo_list_id: int, key: str) -> None:
+    """
+    Schedules a background rebalance of the list when a key just written to it is too long.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        await project.background.executor.submit(
+            "rebalance", lambda: rebalance_list(todo_list_id)
+        )
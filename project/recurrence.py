@@ -0,0 +1,366 @@
+"""
+Repeating tasks. A task with a `recurrence` rule stands for a series of occurrences; the first is
+the task's due date, or its creation time when it has none, and the others keep its time of day.
+Rules are a subset of the iCalendar RRULE (RFC 5545):
+
+    FREQ=DAILY|WEEKLY|MONTHLY|YEARLY   required
+    INTERVAL=n                         every n days, weeks, months or years; 1 by default
+    BYDAY=MO,WE,FR                     weekly rules only: the weekdays to repeat on
+    COUNT=n                            at most n occurrences
+    UNTIL=20261231T235959Z             no occurrences after this time
+
+Monthly and yearly rules starting on a day some months lack (the 31st, 29 February) fall on the
+last day of those months rather than skipping them. Times without a timezone are UTC.
+
+Occurrences are never stored up front: reads expand them for the window they ask for, and only an
+occurrence that was completed or edited gets a `TaskOccurrence` row, holding the fields it
+overrides. `occurrences` jumps straight to the first occurrence in the window, so expanding costs
+the occurrences returned, however far the window is from the first one, and a response expands at
+most MAX_OCCURRENCES of them.
+"""
+
+import calendar
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import prisma.models
+import project.repository
+
+MAX_OCCURRENCES = int(os.getenv("RECURRENCE_MAX_OCCURRENCES", "1000"))
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+PARTS = ("FREQ", "INTERVAL", "BYDAY", "COUNT", "UNTIL")
+
+# Fields an occurrence can override; None in a `TaskOccurrence` row keeps the task's value.
+OVERRIDES = ("title", "dueDate", "priority", "notes")
+
+
+class InvalidRecurrenceError(ValueError):
+    pass
+
+
+class InvalidWindowError(ValueError):
+    pass
+
+
+class Rule(NamedTuple):
+    freq: str
+    interval: int = 1
+    # Weekday numbers, Monday being 0, in order.
+    weekdays: Tuple[int, ...] = ()
+    count: Optional[int] = None
+    until: Optional[datetime] = None
+
+
+class Expansion(NamedTuple):
+    """
+    The tasks of a list as seen in a window: each task without a rule as it is, and each
+    occurrence of a repeating task in the window as a copy of the task carrying the occurrence's
+    due date, completion, overridden fields and version, paired with the occurrence's time.
+    `truncated` tells that MAX_OCCURRENCES cut the expansion short.
+    """
+
+    tasks: List[Tuple[prisma.models.Task, Optional[datetime]]]
+    truncated: bool
+
+
+def utc(value: datetime) -> datetime:
+    """
+    Returns the time as an aware UTC datetime at millisecond precision, as Postgres stores it, so
+    that occurrence times computed from any input compare equal.
+    """
+    value = (
+        value.replace(tzinfo=timezone.utc)
+        if value.tzinfo is None
+        else value.astimezone(timezone.utc)
+    )
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def _positive(parts: Dict[str, str], name: str) -> Optional[int]:
+    if name not in parts:
+        return None
+    try:
+        value = int(parts[name])
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise InvalidRecurrenceError(f"{name} must be a positive integer")
+    return value
+
+
+def parse(text: str) -> Rule:
+    """
+    Parses a recurrence rule.
+
+    Args:
+        text (str): The rule, e.g. "FREQ=WEEKLY;BYDAY=MO,TH", optionally prefixed with "RRULE:".
+
+    Returns:
+        Rule: The parsed rule.
+
+    Raises:
+        InvalidRecurrenceError: The rule is malformed or uses parts outside the supported subset.
+
+    Example:
+        parse("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;COUNT=10")
+        > Rule(freq='WEEKLY', interval=2, weekdays=(0, 3), count=10, until=None)
+    """
+    body = text.strip()
+    if body.upper().startswith("RRULE:"):
+        body = body[len("RRULE:") :]
+    parts: Dict[str, str] = {}
+    for part in filter(None, body.split(";")):
+        name, _, value = part.partition("=")
+        name, value = name.strip().upper(), value.strip()
+        if name not in PARTS:
+            raise InvalidRecurrenceError(
+                f"Unsupported recurrence rule part {name!r}; use {', '.join(PARTS)}"
+            )
+        if not value or name in parts:
+            raise InvalidRecurrenceError(f"{name} must be given once, with a value")
+        parts[name] = value
+    freq = parts.get("FREQ", "").upper()
+    if freq not in FREQUENCIES:
+        raise InvalidRecurrenceError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise InvalidRecurrenceError("COUNT and UNTIL cannot be combined")
+    weekdays: Tuple[int, ...] = ()
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise InvalidRecurrenceError("BYDAY is only supported with FREQ=WEEKLY")
+        days = [day.strip().upper() for day in parts["BYDAY"].split(",")]
+        if not set(days) <= set(WEEKDAYS):
+            raise InvalidRecurrenceError(
+                f"BYDAY must list weekdays among {', '.join(WEEKDAYS)}"
+            )
+        weekdays = tuple(sorted({WEEKDAYS.index(day) for day in days}))
+    until = None
+    if "UNTIL" in parts:
+        try:
+            until = utc(datetime.fromisoformat(parts["UNTIL"]))
+        except ValueError:
+            raise InvalidRecurrenceError(
+                "UNTIL must be a date or time such as 20261231T235959Z"
+            )
+    return Rule(
+        freq,
+        _positive(parts, "INTERVAL") or 1,
+        weekdays,
+        _positive(parts, "COUNT"),
+        until,
+    )
+
+
+def validate(text: Optional[str]) -> Optional[str]:
+    """
+    Checks a rule given by a client and returns it without surrounding whitespace; None and ""
+    mean that the task does not repeat.
+
+    Raises:
+        InvalidRecurrenceError: The rule cannot be parsed.
+    """
+    if text is None or not text.strip():
+        return None
+    parse(text)
+    return text.strip()
+
+
+def windowed(start: Optional[datetime], end: Optional[datetime]) -> bool:
+    """
+    Tells whether a read asked for the occurrences in a window, which it does by giving both ends.
+
+    Raises:
+        InvalidWindowError: Only one end is given, or the window ends before it starts.
+    """
+    if start is None and end is None:
+        return False
+    if start is None or end is None:
+        raise InvalidWindowError("start and end must be given together")
+    if utc(end) <= utc(start):
+        raise InvalidWindowError("end must be after start")
+    return True
+
+
+def _add_months(start: datetime, months: int) -> datetime:
+    month = start.month - 1 + months
+    year, month = start.year + month // 12, month % 12 + 1
+    return start.replace(
+        year=year, month=month, day=min(start.day, calendar.monthrange(year, month)[1])
+    )
+
+
+def _candidates(
+    rule: Rule, start: datetime, window_start: datetime
+) -> Iterator[Tuple[int, datetime]]:
+    # (index in the series, time) of the occurrences from about `window_start` on; the first
+    # few may still precede it. The skipped ones are counted, not generated.
+    if rule.freq in ("MONTHLY", "YEARLY"):
+        months = rule.interval * (12 if rule.freq == "YEARLY" else 1)
+        elapsed = (window_start.year - start.year) * 12 + window_start.month
+        n = max(0, (elapsed - start.month) // months)
+        while True:
+            yield n, _add_months(start, n * months)
+            n += 1
+    if not rule.weekdays:
+        step = timedelta(days=rule.interval * (7 if rule.freq == "WEEKLY" else 1))
+        n = max(0, -((start - window_start) // step))
+        while True:
+            yield n, start + n * step
+            n += 1
+    # Weekly on given days: period p is the week `p * interval` weeks after the first one.
+    first_week = start - timedelta(days=start.weekday())
+    period = timedelta(weeks=rule.interval)
+    before_start = sum(1 for day in rule.weekdays if day < start.weekday())
+    p = max(0, (window_start - first_week) // period)
+    while True:
+        for i, day in enumerate(rule.weekdays):
+            at = first_week + p * period + timedelta(days=day)
+            if at >= start:
+                yield p * len(rule.weekdays) + i - before_start, at
+        p += 1
+
+
+def occurrences(
+    rule: Rule,
+    start: datetime,
+    window_start: datetime,
+    window_end: datetime,
+    limit: int,
+) -> List[datetime]:
+    """
+    Returns the times of a series' occurrences in a window, in order.
+
+    Args:
+        rule (Rule): The series' rule.
+        start (datetime): The first occurrence.
+        window_start (datetime): The earliest time to return.
+        window_end (datetime): The end of the window, excluded.
+        limit (int): The most occurrences to return.
+
+    Returns:
+        List[datetime]: The occurrence times, in UTC.
+
+    Example:
+        occurrences(parse("FREQ=DAILY;INTERVAL=2"), datetime(2026, 1, 1, 9), datetime(2026, 3, 1), datetime(2026, 3, 6), 10)
+        > [datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc), datetime(2026, 3, 4, 9, 0, tzinfo=timezone.utc)]
+    """
+    start, window_start, window_end = utc(start), utc(window_start), utc(window_end)
+    found: List[datetime] = []
+    if limit < 1:
+        return found
+    for n, at in _candidates(rule, start, window_start):
+        if (
+            at >= window_end
+            or (rule.count is not None and n >= rule.count)
+            or (rule.until is not None and at > rule.until)
+        ):
+            break
+        if at >= window_start:
+            found.append(at)
+            if len(found) == limit:
+                break
+    return found
+
+
+def first_occurrence(task: Any) -> datetime:
+    return utc(task.dueDate or task.createdAt)
+
+
+def is_occurrence(task: Any, at: datetime) -> bool:
+    """
+    Tells whether `at` is the time of one of a repeating task's occurrences.
+    """
+    if not task.recurrence:
+        return False
+    at = utc(at)
+    return occurrences(
+        parse(task.recurrence),
+        first_occurrence(task),
+        at,
+        at + timedelta(milliseconds=1),
+        1,
+    ) == [at]
+
+
+def merge(
+    task: prisma.models.Task,
+    at: datetime,
+    stored: Optional[prisma.models.TaskOccurrence],
+) -> prisma.models.Task:
+    """
+    Returns a repeating task as its occurrence at `at`: due then, not completed and at version 0,
+    unless the occurrence's stored row says otherwise.
+    """
+    changes: Dict[str, Any] = {"dueDate": at, "completed": False, "version": 0}
+    if stored is not None:
+        changes.update(
+            {
+                field: getattr(stored, field)
+                for field in OVERRIDES
+                if getattr(stored, field) is not None
+            }
+        )
+        changes.update(
+            completed=stored.completed,
+            version=stored.version,
+            updatedAt=stored.updatedAt,
+        )
+    return task.model_copy(update=changes)
+
+
+async def expand(
+    tasks: List[prisma.models.Task], window_start: datetime, window_end: datetime
+) -> Expansion:
+    """
+    Expands the repeating tasks of a list over a window, merging in the stored occurrences. Tasks
+    keep their order; a repeating task is replaced by its occurrences in the window, in time order,
+    and left out when it has none. Runs on the shard the caller selected.
+
+    Args:
+        tasks (List[prisma.models.Task]): The list's tasks, in position order.
+        window_start (datetime): The earliest occurrence time to include.
+        window_end (datetime): The end of the window, excluded.
+
+    Returns:
+        Expansion: The tasks and occurrences, and whether MAX_OCCURRENCES was reached.
+
+    Example:
+        await expand(todo_list.tasks, datetime(2026, 3, 1), datetime(2026, 3, 8))
+        > Expansion(tasks=[(Task(id=1, ...), None), (Task(id=2, dueDate=datetime(2026, 3, 2, 9, ...)), datetime(2026, 3, 2, 9, ...)), ...], truncated=False)
+    """
+    series: Dict[int, List[datetime]] = {}
+    budget, truncated = MAX_OCCURRENCES, False
+    for task in tasks:
+        if task.recurrence:
+            # One more than the budget tells a cut-off expansion from one that just fits.
+            times = occurrences(
+                parse(task.recurrence),
+                first_occurrence(task),
+                window_start,
+                window_end,
+                budget + 1,
+            )
+            truncated = truncated or len(times) > budget
+            series[task.id] = times[:budget]
+            budget -= len(series[task.id])
+    stored: Dict[Tuple[int, datetime], prisma.models.TaskOccurrence] = {}
+    if any(series.values()):
+        for occurrence in await project.repository.get().find_occurrences(
+            [id for id, times in series.items() if times],
+            utc(window_start),
+            utc(window_end),
+        ):
+            stored[(occurrence.taskId, utc(occurrence.occurrenceAt))] = occurrence
+    expanded: List[Tuple[prisma.models.Task, Optional[datetime]]] = []
+    for task in tasks:
+        if task.id not in series:
+            expanded.append((task, None))
+            continue
+        for at in series[task.id]:
+            expanded.append((merge(task, at, stored.get((task.id, at))), at))
+    return Expansion(expanded, truncated)
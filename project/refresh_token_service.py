@@ -2,6 +2,7 @@ import datetime
 from typing import Any, Dict
 
 import jwt
+import project.repository
 from pydantic import BaseModel
 
 
@@ -86,6 +87,9 @@ async def refresh_token(refresh_token: str) -> TokenResponse:
     user_id = payload.get("user_id")
     if not user_id:
         raise ValueError("Invalid token payload")
+    user = await project.repository.get().get_user(int(user_id))
+    if not user or user.disabledAt is not None:
+        raise ValueError("This account has been disabled")
     expires_delta = datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     new_token = create_access_token({"user_id": user_id}, expires_delta)
     return TokenResponse(
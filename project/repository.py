@@ -0,0 +1,466 @@
+"""
+Storage behind the services. Services read and write users, TODO lists, tasks, audit logs, jobs
+and idempotency keys only through the `Repository` returned by `get()`, never through Prisma
+directly, so the same API can run against either backend selected by STORAGE_BACKEND:
+
+    prisma   Postgres through Prisma (project.prisma_repository), the default
+    memory   in-process dictionaries and indexes (project.memory_repository), for tests and for
+             profiling the API's Python overhead without database time
+
+Both backends return `prisma.models` instances, so both need the generated Prisma client
+(`prisma generate`); this module only imports the models for type checking.
+
+Shard routing stays with the services: they call `project.shards.use_*` first, and the Prisma
+repository then runs on the shard's client. Methods documented as reads may be served by the read
+replica, see `project.database.read_client`.
+"""
+
+from __future__ import annotations
+
+import abc
+import os
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
+
+import project.lazy_routes
+import project.ranking
+
+if TYPE_CHECKING:
+    import prisma.models
+
+BACKEND = os.getenv("STORAGE_BACKEND", "prisma")
+
+BACKENDS = {
+    "prisma": "project.prisma_repository.PrismaRepository",
+    "memory": "project.memory_repository.MemoryRepository",
+}
+
+
+class OwnedTask(NamedTuple):
+    """
+    A task as stored after a write, with the id of the user owning its list.
+    """
+
+    task: prisma.models.Task
+    user_id: int
+
+
+class OwnedOccurrence(NamedTuple):
+    """
+    An occurrence of a repeating task as stored after a write, with the id of the user owning the
+    task's list.
+    """
+
+    occurrence: prisma.models.TaskOccurrence
+    user_id: int
+
+
+class MovedTask(NamedTuple):
+    """
+    A task after `move_task`. `rebalanced` tells that the whole list got new positions.
+    """
+
+    task: prisma.models.Task
+    user_id: int
+    rebalanced: bool
+
+
+class ImportedBatch(NamedTuple):
+    """
+    Outcome of `import_tasks`: the ids of the lists the batch named, how many of them were created
+    and the new last position of each list the batch appended to.
+    """
+
+    list_ids: Dict[str, int]
+    created_lists: int
+    last_positions: Dict[int, str]
+
+
+class Repository(abc.ABC):
+    """
+    Operations the services need from storage. Each method is one transaction: a write and the
+    list counters, positions and sync tombstones it implies are applied together or not at all.
+    Rows are returned as Prisma models whichever the backend.
+
+    Conditional writes taking `expected_version` raise project.versioning.VersionConflictError
+    when the row is at another version, and return None when it does not exist.
+    """
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def warm_up(self) -> None:
+        """
+        Prepares the backend for the first requests; see project.warmup.
+        """
+
+    # Users
+
+    @abc.abstractmethod
+    async def create_user(
+        self, email: str, password: str, role: str = "User"
+    ) -> prisma.models.User: ...
+
+    @abc.abstractmethod
+    async def get_user(self, user_id: int) -> Optional[prisma.models.User]: ...
+
+    @abc.abstractmethod
+    async def find_user_by_email(self, email: str) -> Optional[prisma.models.User]: ...
+
+    @abc.abstractmethod
+    async def update_user(
+        self, user_id: int, data: Dict[str, Any]
+    ) -> Optional[prisma.models.User]: ...
+
+    @abc.abstractmethod
+    async def delete_user(self, user_id: int) -> bool:
+        """
+        Deletes a user along with their remaining audit entries, unless they still own a TODO list
+        (e.g. one created while their data was being deleted).
+
+        Returns:
+            bool: False when the user still owns a list and was kept.
+        """
+
+    @abc.abstractmethod
+    async def count_user_rows(self, user_id: int) -> int:
+        """
+        Returns how many TODO lists, tasks and audit entries the user has.
+        """
+
+    # TODO lists
+
+    @abc.abstractmethod
+    async def create_todo_list(
+        self, user_id: int, name: str, description: Optional[str]
+    ) -> prisma.models.TodoList: ...
+
+    @abc.abstractmethod
+    async def get_todo_list(
+        self, todo_list_id: int
+    ) -> Optional[prisma.models.TodoList]: ...
+
+    @abc.abstractmethod
+    async def read_todo_list(
+        self, todo_list_id: int
+    ) -> Optional[prisma.models.TodoList]:
+        """
+        Read: the list with its tasks in position order (project.ranking.TASK_ORDER).
+        """
+
+    @abc.abstractmethod
+    async def find_todo_lists(self, user_id: int) -> List[prisma.models.TodoList]:
+        """
+        Read: the user's lists, oldest first.
+        """
+
+    @abc.abstractmethod
+    async def first_todo_list(
+        self, user_id: int
+    ) -> Optional[prisma.models.TodoList]: ...
+
+    @abc.abstractmethod
+    async def update_todo_list(
+        self,
+        todo_list_id: int,
+        name: str,
+        description: Optional[str],
+        expected_version: Optional[int] = None,
+    ) -> Optional[prisma.models.TodoList]: ...
+
+    @abc.abstractmethod
+    async def delete_todo_list(self, todo_list_id: int) -> int:
+        """
+        Deletes a list with its remaining tasks and leaves a tombstone for it. Audit entries that
+        reference them are kept and detached.
+
+        Returns:
+            int: The number of tasks deleted along with the list.
+        """
+
+    @abc.abstractmethod
+    async def delete_tasks_chunk(self, todo_list_id: int, limit: int) -> int:
+        """
+        Deletes up to `limit` tasks of a list, oldest first, and takes them off its counters.
+
+        Returns:
+            int: The number of tasks deleted.
+        """
+
+    # Tasks
+
+    @abc.abstractmethod
+    async def create_task(
+        self, todo_list_id: int, data: Dict[str, Any]
+    ) -> Optional[OwnedTask]:
+        """
+        Appends a task with the fields in `data` at the end of a list and counts it on the list.
+        Returns None when the list does not exist.
+        """
+
+    @abc.abstractmethod
+    async def get_task(self, task_id: int) -> Optional[prisma.models.Task]: ...
+
+    @abc.abstractmethod
+    async def update_task(
+        self,
+        task_id: int,
+        changes: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[OwnedTask]:
+        """
+        Sets the fields in `changes` (None clears a nullable field), bumps the version and keeps
+        the list's completed counter in step. With no changes the task is returned as it is.
+        """
+
+    @abc.abstractmethod
+    async def delete_task(self, task_id: int) -> Optional[OwnedTask]:
+        """
+        Deletes a task, takes it off its list's counters and leaves a tombstone for it. Returns the
+        deleted task, or None when it did not exist.
+        """
+
+    @abc.abstractmethod
+    async def move_task(
+        self, task_id: int, after_id: Optional[int]
+    ) -> Optional[MovedTask]:
+        """
+        Gives a task a position right after the task `after_id` of its list, or at the top when
+        `after_id` is None, rebalancing the list first when its neighbours share a key. Returns
+        None when the task does not exist.
+
+        Raises:
+            ValueError: `after_id` is not a task of the same list.
+        """
+
+    @abc.abstractmethod
+    async def rebalance_todo_list(self, todo_list_id: int) -> Optional[Tuple[int, int]]:
+        """
+        Gives all tasks of a list evenly spread short position keys, keeping their order.
+
+        Returns:
+            Optional[Tuple[int, int]]: The id of the list's owner and its number of tasks, or None
+            when the list does not exist.
+        """
+
+    @abc.abstractmethod
+    async def find_occurrences(
+        self, task_ids: List[int], start: datetime, end: datetime
+    ) -> List[prisma.models.TaskOccurrence]:
+        """
+        Read: the stored occurrences of the given repeating tasks from `start` until before `end`.
+        """
+
+    @abc.abstractmethod
+    async def save_occurrence(
+        self,
+        task_id: int,
+        occurrence_at: datetime,
+        changes: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[OwnedOccurrence]:
+        """
+        Stores the fields in `changes` for one occurrence of a repeating task and bumps its
+        version. An occurrence without a row is at version 0, so the first write creates the row
+        at version 1. Returns None when the task does not exist.
+        """
+
+    @abc.abstractmethod
+    async def search_tasks(
+        self, user_id: int, query: str, limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Read: the user's tasks matching a web search style query, most relevant first, as rows
+        with the fields of project.searchTasks_service.TaskSearchResult.
+        """
+
+    @abc.abstractmethod
+    async def import_tasks(
+        self,
+        user_id: int,
+        tasks: List[Dict[str, Any]],
+        list_ids: Dict[str, int],
+        last_positions: Dict[int, Optional[str]],
+    ) -> ImportedBatch:
+        """
+        Appends a batch of tasks to the user's lists in their order. A task names its list by id
+        in "todoListId" or by name in "list"; lists named but not in `list_ids` are looked up and
+        created if missing. `last_positions` holds lists' known last positions, saving a lookup.
+        """
+
+    # Delta sync. Every write stamps the rows it touches with a number that grows with the
+    # order writes commit in (the Postgres transaction id); sync reads the changes between a
+    # position and the horizon below which all writes have finished, by (number, id).
+
+    @abc.abstractmethod
+    async def sync_horizon(self) -> int: ...
+
+    @abc.abstractmethod
+    async def sync_todo_lists(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the user's lists written after `after` (a (number, id) pair) and before the
+        horizon, as rows with the fields of SyncTodoList, their sort id in "key" and their number
+        in "xid".
+        """
+
+    @abc.abstractmethod
+    async def sync_tasks(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]: ...
+
+    @abc.abstractmethod
+    async def sync_tombstones(
+        self, user_id: int, after: Tuple[int, int], horizon: int, limit: int
+    ) -> List[Dict[str, Any]]: ...
+
+    @abc.abstractmethod
+    async def purge_tombstones(self, before: datetime) -> int: ...
+
+    # Audit logs
+
+    @abc.abstractmethod
+    async def create_audit_log(
+        self, data: Dict[str, Any]
+    ) -> prisma.models.AuditLog: ...
+
+    @abc.abstractmethod
+    async def get_audit_log(self, log_id: int) -> Optional[prisma.models.AuditLog]:
+        """
+        Read.
+        """
+
+    @abc.abstractmethod
+    async def find_audit_logs(self, user_id: int) -> List[prisma.models.AuditLog]:
+        """
+        Read: the user's audit entries, oldest first.
+        """
+
+    @abc.abstractmethod
+    async def recent_audit_logs(
+        self, before: Optional[Tuple[datetime, int]], limit: int
+    ) -> List[prisma.models.AuditLog]:
+        """
+        Read: the newest `limit` audit entries of all users (on the current shard) that come
+        before the (timestamp, id) pair `before`, newest first.
+        """
+
+    @abc.abstractmethod
+    async def delete_audit_log(self, log_id: int) -> bool: ...
+
+    @abc.abstractmethod
+    async def delete_audit_logs_chunk(self, user_id: int, limit: int) -> int: ...
+
+    # Jobs (project.jobs) and idempotency keys (project.idempotency), shared by all shards.
+
+    @abc.abstractmethod
+    async def create_job(
+        self, kind: str, payload: Dict[str, Any], total: Optional[int]
+    ) -> prisma.models.Job: ...
+
+    @abc.abstractmethod
+    async def get_job(self, job_id: int) -> Optional[prisma.models.Job]: ...
+
+    @abc.abstractmethod
+    async def claimable_jobs(self, stale_before: datetime) -> List[prisma.models.Job]:
+        """
+        Returns the pending jobs and the running jobs not updated since `stale_before`, oldest
+        first.
+        """
+
+    @abc.abstractmethod
+    async def claim_job(self, job_id: int, stale_before: datetime) -> bool:
+        """
+        Marks a claimable job as running. Returns False when it is not claimable (any more).
+        """
+
+    @abc.abstractmethod
+    async def update_job(self, job_id: int, data: Dict[str, Any]) -> None: ...
+
+    @abc.abstractmethod
+    async def claim_idempotency_key(
+        self, route: str, key: str, fingerprint: str, expires_at: datetime
+    ) -> bool:
+        """
+        Records a key without a response. Returns False when the key is already recorded.
+        """
+
+    @abc.abstractmethod
+    async def get_idempotency_key(
+        self, route: str, key: str
+    ) -> Optional[prisma.models.IdempotencyKey]: ...
+
+    @abc.abstractmethod
+    async def store_idempotency_response(
+        self, route: str, key: str, response: Dict[str, Any], expires_at: datetime
+    ) -> None: ...
+
+    @abc.abstractmethod
+    async def delete_idempotency_key(
+        self, route: str, key: str, expired_at: Optional[datetime] = None
+    ) -> None:
+        """
+        Deletes a key, or only if it expired by `expired_at` when given.
+        """
+
+    @abc.abstractmethod
+    async def purge_idempotency_keys(self, expired_at: datetime) -> int: ...
+
+
+def assign_positions(
+    tasks: List[Dict[str, Any]], last_positions: Dict[int, Optional[str]]
+) -> Dict[int, str]:
+    """
+    Sets "position" on a batch of new tasks so that they follow `last_positions` (list id -> last
+    position, None for an empty list) in batch order. Returns the new last position per list.
+
+    Example:
+        assign_positions([{"todoListId": 1}, {"todoListId": 1}], {1: "i5"})
+        > {1: "i7"}
+    """
+    counts: Dict[int, int] = {}
+    for task in tasks:
+        counts[task["todoListId"]] = counts.get(task["todoListId"], 0) + 1
+    keys = {
+        todo_list_id: iter(
+            project.ranking.keys_after(last_positions[todo_list_id], count)
+        )
+        for todo_list_id, count in counts.items()
+    }
+    new_last: Dict[int, str] = {}
+    for task in tasks:
+        task["position"] = new_last[task["todoListId"]] = next(keys[task["todoListId"]])
+    return new_last
+
+
+_repository: Optional[Repository] = None
+
+
+def get() -> Repository:
+    """
+    Returns the repository the services use, creating the STORAGE_BACKEND one on first use.
+
+    Example:
+        task = await project.repository.get().get_task(1)
+    """
+    global _repository
+    if _repository is None:
+        if BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown STORAGE_BACKEND {BACKEND}")
+        _repository = project.lazy_routes.resolve(BACKENDS[BACKEND])()
+    return _repository
+
+
+def use(repository: Repository) -> None:
+    """
+    Makes the services use `repository`, e.g. a fresh MemoryRepository per test.
+    """
+    global _repository
+    _repository = repository
@@ -0,0 +1,19 @@
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+class ModelResponse(Response):
+    """
+    JSON response rendered directly from a Pydantic model. Returning it from a route bypasses
+    FastAPI's response_model handling, which would otherwise dump the model to a dict, validate it
+    again and serialize the result. Use it for models the service has just validated while building
+    them from database rows; `response_model` on the route still documents the schema.
+
+    Example:
+        return ModelResponse(await getTasks(todo_list_id))
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.__pydantic_serializer__.to_json(content)
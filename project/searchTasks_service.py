@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import List, Optional
+
+import project.repository
+import project.shards
+from pydantic import BaseModel
+
+MAX_LIMIT = 100
+
+
+class TaskSearchResult(BaseModel):
+    """
+    A task matching the search, with its relevance.
+    """
+
+    id: int
+    title: str
+    notes: Optional[str] = None
+    completed: bool
+    dueDate: Optional[datetime] = None
+    todoListId: int
+    rank: float
+
+
+class SearchTasksResponse(BaseModel):
+    """
+    One page of search results, most relevant first. `next_offset` is the offset of the next page, or None on the last page.
+    """
+
+    results: List[TaskSearchResult]
+    next_offset: Optional[int] = None
+
+
+async def searchTasks(
+    user_id: int, query: str, limit: int = 20, offset: int = 0
+) -> SearchTasksResponse:
+    """
+    Searches the titles and notes of the tasks in the user's TODO lists. The query uses web search syntax ("quoted phrases", `or`, `-excluded`) and, on Postgres, English stemming; title matches rank above notes matches. Matching uses an index of the tasks' words (the GIN index on their search vector on Postgres), so the tasks are not loaded to be filtered.
+
+    Args:
+        user_id (int): The ID of the user whose lists are searched.
+        query (str): The search terms.
+        limit (int): The page size, at most MAX_LIMIT.
+        offset (int): The number of results to skip.
+
+    Returns:
+        SearchTasksResponse: The matching tasks ordered by relevance.
+
+    Example:
+        await searchTasks(1, "milk -oat")
+        > SearchTasksResponse(results=[TaskSearchResult(id=4, title="Buy milk", ..., rank=0.61)], next_offset=None)
+    """
+    await project.shards.use_user(user_id)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    if not query.strip():
+        return SearchTasksResponse(results=[])
+    # One row more than the page tells whether there is a next page without counting matches.
+    rows = await project.repository.get().search_tasks(
+        user_id, query, limit + 1, offset
+    )
+    results = [TaskSearchResult(**row) for row in rows[:limit]]
+    return SearchTasksResponse(
+        results=results, next_offset=offset + limit if len(rows) > limit else None
+    )
@@ -1,48 +1,119 @@
+from __future__ import annotations
+
+import asyncio
 import logging
+import math
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
-
-import project.create_log_service
-import project.createTask_service
-import project.createTodoList_service
-import project.delete_log_service
-import project.deleteTask_service
-import project.deleteTodoList_service
-import project.deleteUser_service
-import project.generate_token_service
-import project.get_all_logs_service
-import project.get_log_by_id_service
-import project.get_logs_by_user_service
-import project.getAllTodoLists_service
-import project.getTaskById_service
-import project.getTasks_service
-import project.getTodoList_service
-import project.getUserProfile_service
-import project.invalidate_token_service
-import project.loginUser_service
-import project.partialUpdateTask_service
-import project.refresh_token_service
-import project.registerUser_service
-import project.updateTask_service
-import project.updateTodoList_service
-import project.updateUserProfile_service
-import project.validate_token_service
-from fastapi import FastAPI
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import project.background
+import project.changefeed
+import project.compression
+import project.database
+import project.idempotency
+import project.jobs
+import project.lazy_routes
+import project.metrics
+import project.query_profiler
+import project.recurrence
+import project.repository
+import project.responses
+import project.versioning
+import project.warmup
+from fastapi import Body, FastAPI, Header, Query, Request
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import Response
-from prisma import Prisma
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+
+if TYPE_CHECKING:
+    import project.create_log_service
+    import project.createTask_service
+    import project.createTodoList_service
+    import project.delete_log_service
+    import project.deleteTask_service
+    import project.deleteTodoList_service
+    import project.deleteUser_service
+    import project.generate_token_service
+    import project.get_all_logs_service
+    import project.get_log_by_id_service
+    import project.get_logs_by_user_service
+    import project.getAllTodoLists_service
+    import project.getJob_service
+    import project.getTaskById_service
+    import project.getTasks_service
+    import project.getTodoList_service
+    import project.getUserProfile_service
+    import project.importTasks_service
+    import project.invalidate_token_service
+    import project.loginUser_service
+    import project.moveTask_service
+    import project.partialUpdateTask_service
+    import project.refresh_token_service
+    import project.registerUser_service
+    import project.searchTasks_service
+    import project.shards
+    import project.syncChanges_service
+    import project.updateOccurrence_service
+    import project.updateTask_service
+    import project.updateTodoList_service
+    import project.updateUserProfile_service
+    import project.validate_token_service
 
 logger = logging.getLogger(__name__)
 
-db_client = Prisma(auto_register=True)
+router = project.lazy_routes.LazyAPIRouter()
+
+startup_timings: Dict[str, float] = {}
+
+
+def register_routes(app: FastAPI) -> None:
+    """
+    Imports the service modules and registers their routes on the application. Runs once, off the
+    event loop, while `lifespan` waits for the database connection.
+    """
+    if router.materialized:
+        return
+    router.materialize()
+    app.include_router(router)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await db_client.connect()
+    start = time.perf_counter()
+
+    async def connect_database():
+        await project.repository.get().connect()
+        startup_timings["db_connect"] = time.perf_counter() - start
+
+    def register():
+        register_routes(app)
+        startup_timings["register_routes"] = time.perf_counter() - start
+
+    await asyncio.gather(connect_database(), asyncio.to_thread(register))
+    startup_timings["lifespan"] = time.perf_counter() - start
+    logger.info(
+        "Startup finished in %.3fs (database %.3fs, routes %.3fs)",
+        startup_timings["lifespan"],
+        startup_timings["db_connect"],
+        startup_timings["register_routes"],
+    )
+    await project.background.executor.start()
+    warmup_task = await project.warmup.start()
+    await project.jobs.resume()
     yield
-    await db_client.disconnect()
+    project.warmup.state.ready = False
+    if warmup_task is not None:
+        warmup_task.cancel()
+    project.changefeed.broker.close()
+    await project.jobs.stop()
+    await project.background.executor.stop()
+    await project.repository.get().disconnect()
 
 
 app = FastAPI(
@@ -51,10 +122,87 @@ app = FastAPI(
     description="This should be an API that receives peoples TODO lists and store them for the users, they should be able to retreive them from the database",
 )
 
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """
+    Routes reads to the primary when the caller's last write (echoed back in `X-Last-Write-At`) may
+    not have reached the read replica yet, and stamps successful writes with that header.
+    """
+    try:
+        last_write_at = float(request.headers["x-last-write-at"])
+    except (KeyError, ValueError):
+        last_write_at = None
+    token = project.database.set_read_consistency(last_write_at)
+    try:
+        response = await call_next(request)
+    finally:
+        project.database.reset_read_consistency(token)
+    if request.method in WRITE_METHODS and response.status_code < 400:
+        response.headers["X-Last-Write-At"] = f"{time.time():.6f}"
+    return response
+
+
+app.add_middleware(project.compression.CompressionMiddleware)
 
-@app.get(
+app.add_middleware(project.metrics.MetricsMiddleware)
+
+if project.query_profiler.ENABLED:
+    app.add_middleware(project.query_profiler.QueryProfilerMiddleware)
+
+
+def version_conflict(error: project.versioning.VersionConflictError) -> JSONResponse:
+    return JSONResponse(
+        {"error": str(error), "current_version": error.current_version},
+        status_code=409,
+    )
+
+
+def shard_moving(error: project.shards.ShardMovingError) -> JSONResponse:
+    # Only the services that route through project.shards raise this, and they import it.
+    # Instances re-read the shard directory every SHARD_DIRECTORY_TTL_SECONDS, so retrying
+    # sooner would only find the move still in progress.
+    return JSONResponse(
+        {"error": str(error)},
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(project.shards.DIRECTORY_TTL_SECONDS))},
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def api_get_metrics() -> PlainTextResponse:
+    """
+    Exposes per-route request counts, latency histograms and in-flight gauges, per-Prisma-operation timings and the Prisma connection pool metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        await project.metrics.render(), media_type=project.metrics.CONTENT_TYPE
+    )
+
+
+@app.get("/health/live", include_in_schema=False)
+async def api_get_health_live() -> Dict[str, str]:
+    """
+    Liveness probe. Answers as soon as the server accepts connections, independently of the database and warm-up.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", include_in_schema=False)
+async def api_get_health_ready() -> JSONResponse:
+    """
+    Readiness probe. Returns 503 until the database is connected and warm-up has finished, and again once shutdown starts, so the load balancer only routes traffic to warm instances.
+    """
+    state = project.warmup.state
+    if state.ready and project.repository.get().is_connected():
+        return JSONResponse({"status": "ready", "warmup_seconds": state.duration})
+    return JSONResponse({"status": "warming_up", "error": state.error}, status_code=503)
+
+
+@router.get(
     "/api/token/validate",
-    response_model=project.validate_token_service.TokenValidationResponse,
+    response_model="project.validate_token_service.TokenValidationResponse",
 )
 async def api_get_validate_token(
     token: str,
@@ -76,9 +224,9 @@ async def api_get_validate_token(
         )
 
 
-@app.post(
+@router.post(
     "/api/users/register",
-    response_model=project.registerUser_service.RegisterUserOutput,
+    response_model="project.registerUser_service.RegisterUserOutput",
 )
 async def api_post_registerUser(
     username: str, password: str, email: str
@@ -100,8 +248,8 @@ async def api_post_registerUser(
         )
 
 
-@app.delete(
-    "/api/users/delete", response_model=project.deleteUser_service.DeleteUserResponse
+@router.delete(
+    "/api/users/delete", response_model="project.deleteUser_service.DeleteUserResponse"
 )
 async def api_delete_deleteUser(
     auth_token: str,
@@ -112,6 +260,8 @@ async def api_delete_deleteUser(
     try:
         res = await project.deleteUser_service.deleteUser(auth_token)
         return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -123,9 +273,9 @@ async def api_delete_deleteUser(
         )
 
 
-@app.delete(
+@router.delete(
     "/api/token/invalidate",
-    response_model=project.invalidate_token_service.InvalidateTokenResponse,
+    response_model="project.invalidate_token_service.InvalidateTokenResponse",
 )
 async def api_delete_invalidate_token(
     token: str,
@@ -136,6 +286,8 @@ async def api_delete_invalidate_token(
     try:
         res = await project.invalidate_token_service.invalidate_token(token)
         return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -147,16 +299,22 @@ async def api_delete_invalidate_token(
         )
 
 
-@app.get("/audit/logs", response_model=project.get_all_logs_service.AuditLogsResponse)
+@router.get(
+    "/audit/logs", response_model="project.get_all_logs_service.AuditLogsResponse"
+)
 async def api_get_get_all_logs(
     request: project.get_all_logs_service.GetAuditLogsRequest,
 ) -> project.get_all_logs_service.AuditLogsResponse | Response:
     """
-    Fetches all audit logs. The expected response is an array of log objects, containing details such as timestamp, user ID, action performed, and associated TODO list or task ID. This endpoint allows administrators to review all changes made in the system.
+    Fetches all audit logs. The expected response is an array of log objects, containing details such as timestamp, user ID, action performed, and associated TODO list or task ID. This endpoint allows administrators to review all changes made in the system. Entries are gathered from every database shard, newest first, and paginated with `before` and `before_id`.
     """
     try:
-        res = project.get_all_logs_service.get_all_logs(request)
+        res = await project.get_all_logs_service.get_all_logs(request)
         return res
+    except project.get_all_logs_service.NotAdminError as e:
+        return JSONResponse({"error": str(e)}, status_code=403)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -168,8 +326,8 @@ async def api_get_get_all_logs(
         )
 
 
-@app.post(
-    "/api/token/refresh", response_model=project.refresh_token_service.TokenResponse
+@router.post(
+    "/api/token/refresh", response_model="project.refresh_token_service.TokenResponse"
 )
 async def api_post_refresh_token(
     refresh_token: str,
@@ -191,7 +349,7 @@ async def api_post_refresh_token(
         )
 
 
-@app.post("/tasks", response_model=project.createTask_service.CreateTaskResponse)
+@router.post("/tasks", response_model="project.createTask_service.CreateTaskResponse")
 async def api_post_createTask(
     todo_list_id: int,
     title: str,
@@ -199,15 +357,72 @@ async def api_post_createTask(
     due_date: Optional[datetime],
     priority: Optional[int],
     notes: Optional[str],
+    recurrence: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ) -> project.createTask_service.CreateTaskResponse | Response:
     """
-    This endpoint allows users to create a new task within a specific TODO list. The user needs to provide the TODO list ID and the task details (e.g., title, description, due date). Upon successful creation, the response will include the new task's ID and details. This operation will interact with TodoListModule to ensure the TODO list exists and with AuditLogModule to log the task creation event.
+    This endpoint allows users to create a new task within a specific TODO list. The user needs to provide the TODO list ID and the task details (e.g., title, description, due date). Upon successful creation, the response will include the new task's ID and details. This operation will interact with TodoListModule to ensure the TODO list exists and with AuditLogModule to log the task creation event. A `recurrence` rule (e.g. `FREQ=WEEKLY;BYDAY=MO`) makes the task repeat from its due date; an invalid rule is rejected with 422. A retry carrying the same `Idempotency-Key` header returns the original response without creating another task.
     """
     try:
-        res = await project.createTask_service.createTask(
-            todo_list_id, title, description, due_date, priority, notes
+        if idempotency_key is None:
+            return await project.createTask_service.createTask(
+                todo_list_id, title, description, due_date, priority, notes, recurrence
+            )
+        return await project.idempotency.store.run(
+            "createTask",
+            idempotency_key,
+            {
+                "todo_list_id": todo_list_id,
+                "title": title,
+                "description": description,
+                "due_date": due_date,
+                "priority": priority,
+                "notes": notes,
+                "recurrence": recurrence,
+            },
+            lambda: project.createTask_service.createTask(
+                todo_list_id, title, description, due_date, priority, notes, recurrence
+            ),
+            project.createTask_service.CreateTaskResponse,
+        )
+    except project.idempotency.IdempotencyError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    except project.recurrence.InvalidRecurrenceError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
+    except Exception as e:
+        logger.exception("Error processing request")
+        res = dict()
+        res["error"] = str(e)
+        return Response(
+            content=jsonable_encoder(res),
+            status_code=500,
+            media_type="application/json",
+        )
+
+
+@router.post(
+    "/import", response_model="project.importTasks_service.ImportTasksResponse"
+)
+async def api_post_importTasks(
+    request: Request, user_id: int, todo_list_id: Optional[int] = None
+) -> project.importTasks_service.ImportTasksResponse | Response:
+    """
+    Imports TODO lists and tasks in bulk from the request body: CSV with a header row (`text/csv`), a JSON array (`application/json`) or newline-delimited JSON (`application/x-ndjson`) of rows with `list`, `title`, `dueDate`, `priority`, `notes` and `completed`. The body is parsed as it is received and inserted in batches; invalid rows are reported in the response without aborting the import. Rows without `list` go into the existing list `todo_list_id`.
+    """
+    try:
+        format = project.importTasks_service.detect_format(
+            request.headers.get("content-type")
+        )
+        res = await project.importTasks_service.importTasks(
+            user_id, request.stream(), format, todo_list_id
         )
         return res
+    except project.importTasks_service.ImportFormatError as e:
+        return JSONResponse({"error": str(e)}, status_code=415)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -219,26 +434,79 @@ async def api_post_createTask(
         )
 
 
-@app.patch(
+@router.patch(
     "/tasks/{taskId}",
-    response_model=project.partialUpdateTask_service.PatchTaskResponse,
+    response_model="project.partialUpdateTask_service.PatchTaskResponse",
 )
 async def api_patch_partialUpdateTask(
     taskId: int,
-    title: Optional[str],
-    dueDate: Optional[datetime],
-    priority: Optional[int],
-    notes: Optional[str],
-    completed: Optional[bool],
+    patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None, alias="If-Match"),
 ) -> project.partialUpdateTask_service.PatchTaskResponse | Response:
     """
-    This endpoint allows users to partially update fields of an existing task without providing the complete task details. Users need to provide the task ID as a URL parameter and the fields to update in the request body. Upon success, the response includes the updated task details. Interaction with AuditLogModule is required to log this change.
+    This endpoint allows users to partially update fields of an existing task without providing the complete task details. Users need to provide the task ID as a URL parameter and the fields to update in the request body, as a JSON Merge Patch document (e.g. `{"completed": true}` or `{"recurrence": "FREQ=DAILY"}`; `null` clears a field), optionally conditioned on `expected_version` or an `If-Match` header (409 on conflict). Upon success, the response includes the updated task details. Interaction with AuditLogModule is required to log this change.
+    """
+    try:
+        res = await project.partialUpdateTask_service.partialUpdateTask(
+            taskId,
+            patch,
+            project.versioning.expected_version(if_match, expected_version),
+        )
+        return res
+    except project.versioning.VersionConflictError as e:
+        return version_conflict(e)
+    except (
+        project.partialUpdateTask_service.InvalidPatchError,
+        project.versioning.InvalidVersionError,
+    ) as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
+    except Exception as e:
+        logger.exception("Error processing request")
+        res = dict()
+        res["error"] = str(e)
+        return Response(
+            content=jsonable_encoder(res),
+            status_code=500,
+            media_type="application/json",
+        )
+
+
+@router.patch(
+    "/tasks/{taskId}/occurrences/{occurrence_at}",
+    response_model="project.updateOccurrence_service.OccurrenceResponse",
+)
+async def api_patch_updateOccurrence(
+    taskId: int,
+    occurrence_at: datetime,
+    patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None, alias="If-Match"),
+) -> project.updateOccurrence_service.OccurrenceResponse | Response:
+    """
+    Completes or edits one occurrence of a repeating task, identified by the time the task's rule schedules it at (the `occurrence_at` of `GET /tasks` with a window). The body is a JSON Merge Patch of `title`, `dueDate`, `priority`, `notes` and `completed` (e.g. `{"completed": true}`; `null` makes a field follow the task again), optionally conditioned on `expected_version` or an `If-Match` header (409 on conflict). Responds 404 when the task has no occurrence at that time.
     """
     try:
-        res = project.partialUpdateTask_service.partialUpdateTask(
-            taskId, title, dueDate, priority, notes, completed
+        res = await project.updateOccurrence_service.updateOccurrence(
+            taskId,
+            occurrence_at,
+            patch,
+            project.versioning.expected_version(if_match, expected_version),
         )
         return res
+    except project.versioning.VersionConflictError as e:
+        return version_conflict(e)
+    except project.updateOccurrence_service.OccurrenceNotFoundError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    except (
+        project.partialUpdateTask_service.InvalidPatchError,
+        project.versioning.InvalidVersionError,
+    ) as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -250,8 +518,33 @@ async def api_patch_partialUpdateTask(
         )
 
 
-@app.get(
-    "/todolists", response_model=project.getAllTodoLists_service.GetTodoListsResponse
+@router.post(
+    "/tasks/{taskId}/move", response_model="project.moveTask_service.MoveTaskResponse"
+)
+async def api_post_moveTask(
+    taskId: int, after_id: Optional[int] = None
+) -> project.moveTask_service.MoveTaskResponse | Response:
+    """
+    Moves a task within its TODO list to just after the task `after_id`, or to the top of the list when `after_id` is omitted. Only the moved task's position is updated.
+    """
+    try:
+        res = await project.moveTask_service.moveTask(taskId, after_id)
+        return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
+    except Exception as e:
+        logger.exception("Error processing request")
+        res = dict()
+        res["error"] = str(e)
+        return Response(
+            content=jsonable_encoder(res),
+            status_code=500,
+            media_type="application/json",
+        )
+
+
+@router.get(
+    "/todolists", response_model="project.getAllTodoLists_service.GetTodoListsResponse"
 )
 async def api_get_getAllTodoLists(
     request: project.getAllTodoLists_service.GetTodoListsRequest,
@@ -261,7 +554,9 @@ async def api_get_getAllTodoLists(
     """
     try:
         res = await project.getAllTodoLists_service.getAllTodoLists(request)
-        return res
+        return project.responses.ModelResponse(res)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -273,8 +568,8 @@ async def api_get_getAllTodoLists(
         )
 
 
-@app.post(
-    "/api/users/login", response_model=project.loginUser_service.UserLoginResponse
+@router.post(
+    "/api/users/login", response_model="project.loginUser_service.UserLoginResponse"
 )
 async def api_post_loginUser(
     username: str, password: str
@@ -296,9 +591,9 @@ async def api_post_loginUser(
         )
 
 
-@app.get(
+@router.get(
     "/audit/logs/user/{user_id}",
-    response_model=project.get_logs_by_user_service.GetUserAuditLogsResponse,
+    response_model="project.get_logs_by_user_service.GetUserAuditLogsResponse",
 )
 async def api_get_get_logs_by_user(
     user_id: int,
@@ -308,7 +603,9 @@ async def api_get_get_logs_by_user(
     """
     try:
         res = await project.get_logs_by_user_service.get_logs_by_user(user_id)
-        return res
+        return project.responses.ModelResponse(res)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -320,8 +617,9 @@ async def api_get_get_logs_by_user(
         )
 
 
-@app.delete(
-    "/tasks/{taskId}", response_model=project.deleteTask_service.DeleteTaskResponseModel
+@router.delete(
+    "/tasks/{taskId}",
+    response_model="project.deleteTask_service.DeleteTaskResponseModel",
 )
 async def api_delete_deleteTask(
     taskId: int,
@@ -332,6 +630,8 @@ async def api_delete_deleteTask(
     try:
         res = await project.deleteTask_service.deleteTask(taskId)
         return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -343,20 +643,36 @@ async def api_delete_deleteTask(
         )
 
 
-@app.post(
-    "/todolists", response_model=project.createTodoList_service.CreateTodoListResponse
+@router.post(
+    "/todolists", response_model="project.createTodoList_service.CreateTodoListResponse"
 )
 async def api_post_createTodoList(
-    title: str, description: Optional[str], userId: int
+    title: str,
+    description: Optional[str],
+    userId: int,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ) -> project.createTodoList_service.CreateTodoListResponse | Response:
     """
-    Creates a new TODO list for the user. The request should contain the title of the TODO list and, optionally, a description. The response will return the created TODO list with its unique identifier.
+    Creates a new TODO list for the user. The request should contain the title of the TODO list and, optionally, a description. The response will return the created TODO list with its unique identifier. A retry carrying the same `Idempotency-Key` header returns the original response without creating another list.
     """
     try:
-        res = await project.createTodoList_service.createTodoList(
-            title, description, userId
+        if idempotency_key is None:
+            return await project.createTodoList_service.createTodoList(
+                title, description, userId
+            )
+        return await project.idempotency.store.run(
+            "createTodoList",
+            idempotency_key,
+            {"title": title, "description": description, "userId": userId},
+            lambda: project.createTodoList_service.createTodoList(
+                title, description, userId
+            ),
+            project.createTodoList_service.CreateTodoListResponse,
         )
-        return res
+    except project.idempotency.IdempotencyError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -368,9 +684,9 @@ async def api_post_createTodoList(
         )
 
 
-@app.delete(
+@router.delete(
     "/todolists/{id}",
-    response_model=project.deleteTodoList_service.DeleteTodoListResponse,
+    response_model="project.deleteTodoList_service.DeleteTodoListResponse",
 )
 async def api_delete_deleteTodoList(
     id: int,
@@ -381,6 +697,8 @@ async def api_delete_deleteTodoList(
     try:
         res = await project.deleteTodoList_service.deleteTodoList(id)
         return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -392,7 +710,9 @@ async def api_delete_deleteTodoList(
         )
 
 
-@app.post("/audit/logs", response_model=project.create_log_service.AuditLogResponse)
+@router.post(
+    "/audit/logs", response_model="project.create_log_service.AuditLogResponse"
+)
 async def api_post_create_log(
     user_id: int, action: str, todo_list_id: Optional[int], task_id: Optional[int]
 ) -> project.create_log_service.AuditLogResponse | Response:
@@ -404,6 +724,8 @@ async def api_post_create_log(
             user_id, action, todo_list_id, task_id
         )
         return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -415,8 +737,8 @@ async def api_post_create_log(
         )
 
 
-@app.post(
-    "/api/token", response_model=project.generate_token_service.TokenResponseModel
+@router.post(
+    "/api/token", response_model="project.generate_token_service.TokenResponseModel"
 )
 async def api_post_generate_token(
     username: str, password: str
@@ -438,8 +760,37 @@ async def api_post_generate_token(
         )
 
 
-@app.get(
-    "/tasks/{taskId}", response_model=project.getTaskById_service.GetTaskResponseModel
+# Registered before `/tasks/{taskId}`, which would otherwise match this path.
+@router.get(
+    "/tasks/search", response_model="project.searchTasks_service.SearchTasksResponse"
+)
+async def api_get_searchTasks(
+    user_id: int,
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+) -> project.searchTasks_service.SearchTasksResponse | Response:
+    """
+    Full-text search over the titles and notes of the tasks in the user's TODO lists. `q` accepts web search syntax ("quoted phrases", `or`, `-excluded`). Results are ranked by relevance and paginated with `limit` and `offset`; the response carries the `next_offset` while more results remain.
+    """
+    try:
+        res = await project.searchTasks_service.searchTasks(user_id, q, limit, offset)
+        return project.responses.ModelResponse(res)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
+    except Exception as e:
+        logger.exception("Error processing request")
+        res = dict()
+        res["error"] = str(e)
+        return Response(
+            content=jsonable_encoder(res),
+            status_code=500,
+            media_type="application/json",
+        )
+
+
+@router.get(
+    "/tasks/{taskId}", response_model="project.getTaskById_service.GetTaskResponseModel"
 )
 async def api_get_getTaskById(
     taskId: int,
@@ -449,7 +800,9 @@ async def api_get_getTaskById(
     """
     try:
         res = await project.getTaskById_service.getTaskById(taskId)
-        return res
+        return project.responses.ModelResponse(res)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -461,16 +814,22 @@ async def api_get_getTaskById(
         )
 
 
-@app.get("/tasks", response_model=project.getTasks_service.GetTasksResponse)
+@router.get("/tasks", response_model="project.getTasks_service.GetTasksResponse")
 async def api_get_getTasks(
     todo_list_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
 ) -> project.getTasks_service.GetTasksResponse | Response:
     """
-    This endpoint fetches all tasks associated with a specific TODO list. Users need to provide the TODO list ID. The response will include a list of all tasks with their details (e.g., task ID, title, description, status, due date). This is primarily used to display tasks belonging to a TODO list, leveraging interaction with the TodoListModule.
+    This endpoint fetches all tasks associated with a specific TODO list. Users need to provide the TODO list ID. The response will include a list of all tasks with their details (e.g., task ID, title, description, status, due date). This is primarily used to display tasks belonging to a TODO list, leveraging interaction with the TodoListModule. With `start` and `end`, repeating tasks are listed as their occurrences in that window, each with its `occurrence_at`.
     """
     try:
-        res = await project.getTasks_service.getTasks(todo_list_id)
-        return res
+        res = await project.getTasks_service.getTasks(todo_list_id, start, end)
+        return project.responses.ModelResponse(res)
+    except project.recurrence.InvalidWindowError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -482,18 +841,24 @@ async def api_get_getTasks(
         )
 
 
-@app.get(
-    "/todolists/{id}", response_model=project.getTodoList_service.GetTodoListResponse
+@router.get(
+    "/todolists/{id}", response_model="project.getTodoList_service.GetTodoListResponse"
 )
 async def api_get_getTodoList(
     id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
 ) -> project.getTodoList_service.GetTodoListResponse | Response:
     """
-    Fetches a specific TODO list by its unique identifier. The response will include all the details of the TODO list such as title, description, creation date, and associated tasks.
+    Fetches a specific TODO list by its unique identifier. The response will include all the details of the TODO list such as title, description, creation date, and associated tasks. With `start` and `end`, repeating tasks are listed as their occurrences in that window, each with its `occurrenceAt`.
     """
     try:
-        res = await project.getTodoList_service.getTodoList(id)
-        return res
+        res = await project.getTodoList_service.getTodoList(id, start, end)
+        return project.responses.ModelResponse(res)
+    except project.recurrence.InvalidWindowError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -505,9 +870,9 @@ async def api_get_getTodoList(
         )
 
 
-@app.get(
+@router.get(
     "/api/users/profile",
-    response_model=project.getUserProfile_service.UserProfileResponse,
+    response_model="project.getUserProfile_service.UserProfileResponse",
 )
 async def api_get_getUserProfile(
     Authorization: str,
@@ -529,9 +894,9 @@ async def api_get_getUserProfile(
         )
 
 
-@app.put(
+@router.put(
     "/api/users/profile",
-    response_model=project.updateUserProfile_service.UpdateUserProfileResponse,
+    response_model="project.updateUserProfile_service.UpdateUserProfileResponse",
 )
 async def api_put_updateUserProfile(
     email: Optional[str], password: Optional[str], role: Optional[str]
@@ -555,9 +920,9 @@ async def api_put_updateUserProfile(
         )
 
 
-@app.get(
+@router.get(
     "/audit/logs/{log_id}",
-    response_model=project.get_log_by_id_service.AuditLogResponse,
+    response_model="project.get_log_by_id_service.AuditLogResponse",
 )
 async def api_get_get_log_by_id(
     log_id: int,
@@ -568,6 +933,8 @@ async def api_get_get_log_by_id(
     try:
         res = await project.get_log_by_id_service.get_log_by_id(log_id)
         return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -579,9 +946,9 @@ async def api_get_get_log_by_id(
         )
 
 
-@app.delete(
+@router.delete(
     "/audit/logs/{log_id}",
-    response_model=project.delete_log_service.DeleteAuditLogResponse,
+    response_model="project.delete_log_service.DeleteAuditLogResponse",
 )
 async def api_delete_delete_log(
     log_id: int,
@@ -592,6 +959,8 @@ async def api_delete_delete_log(
     try:
         res = await project.delete_log_service.delete_log(log_id)
         return res
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -603,21 +972,34 @@ async def api_delete_delete_log(
         )
 
 
-@app.put(
+@router.put(
     "/todolists/{id}",
-    response_model=project.updateTodoList_service.TodoListOutputObject,
+    response_model="project.updateTodoList_service.TodoListOutputObject",
 )
 async def api_put_updateTodoList(
-    id: int, title: str, description: Optional[str]
+    id: int,
+    title: str,
+    description: Optional[str],
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None, alias="If-Match"),
 ) -> project.updateTodoList_service.TodoListOutputObject | Response:
     """
-    Updates the details of an existing TODO list identified by its unique identifier. The request should provide the updated title and description. The response will return the updated TODO list.
+    Updates the details of an existing TODO list identified by its unique identifier. The request should provide the updated title and description. The response will return the updated TODO list. With `expected_version` or an `If-Match` header the update only applies if the list is still at that version, otherwise it returns 409.
     """
     try:
         res = await project.updateTodoList_service.updateTodoList(
-            id, title, description
+            id,
+            title,
+            description,
+            project.versioning.expected_version(if_match, expected_version),
         )
         return res
+    except project.versioning.VersionConflictError as e:
+        return version_conflict(e)
+    except project.versioning.InvalidVersionError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
     except Exception as e:
         logger.exception("Error processing request")
         res = dict()
@@ -629,8 +1011,8 @@ async def api_put_updateTodoList(
         )
 
 
-@app.put(
-    "/tasks/{taskId}", response_model=project.updateTask_service.UpdateTaskResponse
+@router.put(
+    "/tasks/{taskId}", response_model="project.updateTask_service.UpdateTaskResponse"
 )
 async def api_put_updateTask(
     taskId: int,
@@ -639,14 +1021,90 @@ async def api_put_updateTask(
     priority: Optional[int],
     notes: Optional[str],
     completed: Optional[bool],
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None, alias="If-Match"),
 ) -> project.updateTask_service.UpdateTaskResponse | Response:
     """
-    This endpoint allows users to update the details of an existing task. Users must provide the task ID as a URL parameter and the updated task details in the request body. On successful update, a confirmation message along with the updated task details is returned. This route ensures the task belongs to the user's TODO list before updating and logs the operation via AuditLogModule.
+    This endpoint allows users to update the details of an existing task. Users must provide the task ID as a URL parameter and the updated task details in the request body. On successful update, a confirmation message along with the updated task details is returned. This route ensures the task belongs to the user's TODO list before updating and logs the operation via AuditLogModule. With `expected_version` or an `If-Match` header the update only applies if the task is still at that version, otherwise it returns 409.
     """
     try:
         res = await project.updateTask_service.updateTask(
-            taskId, title, dueDate, priority, notes, completed
+            taskId,
+            title,
+            dueDate,
+            priority,
+            notes,
+            completed,
+            project.versioning.expected_version(if_match, expected_version),
+        )
+        return res
+    except project.versioning.VersionConflictError as e:
+        return version_conflict(e)
+    except project.versioning.InvalidVersionError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
+    except Exception as e:
+        logger.exception("Error processing request")
+        res = dict()
+        res["error"] = str(e)
+        return Response(
+            content=jsonable_encoder(res),
+            status_code=500,
+            media_type="application/json",
         )
+
+
+@router.get("/sync", response_model="project.syncChanges_service.SyncResponse")
+async def api_get_syncChanges(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+) -> project.syncChanges_service.SyncResponse | Response:
+    """
+    Delta sync for offline-capable clients: returns the user's TODO lists and tasks created or updated since `cursor`, plus tombstones for the ones deleted since, and the cursor to pass next time. Call again while `has_more` is true. Without a cursor, or with an expired one (`reset` is then true), it returns everything as a full resync.
+    """
+    try:
+        res = await project.syncChanges_service.syncChanges(user_id, cursor, limit)
+        return project.responses.ModelResponse(res)
+    except project.syncChanges_service.InvalidCursorError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except project.shards.ShardMovingError as e:
+        return shard_moving(e)
+    except Exception as e:
+        logger.exception("Error processing request")
+        res = dict()
+        res["error"] = str(e)
+        return Response(
+            content=jsonable_encoder(res),
+            status_code=500,
+            media_type="application/json",
+        )
+
+
+@router.get("/changes", response_class=StreamingResponse)
+async def api_get_changes(
+    user_id: int, todo_list_id: Optional[List[int]] = Query(None)
+) -> StreamingResponse:
+    """
+    Server-Sent Events stream of the changes to the user's TODO lists and their tasks (`task.created`, `task.updated`, `task.moved`, `task.deleted`, `tasks.imported`, `todolist.created`, `todolist.updated`, `todolist.reordered`, `todolist.deleted`), optionally narrowed to the given `todo_list_id`s. Each event's data is the changed fields as JSON. A `resync` event means the client fell behind and should reload. Replaces polling `GET /tasks` and `GET /todolists/{id}`.
+    """
+    return StreamingResponse(
+        project.changefeed.stream(user_id, todo_list_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/jobs/{job_id}", response_model="project.getJob_service.JobStatusResponse")
+async def api_get_getJob(
+    job_id: int,
+) -> project.getJob_service.JobStatusResponse | Response:
+    """
+    Fetches the status and progress of a background job started by an endpoint that returned a `job_id`, such as the deletion of a large TODO list.
+    """
+    try:
+        res = await project.getJob_service.getJob(job_id)
         return res
     except Exception as e:
         logger.exception("Error processing request")
@@ -0,0 +1,529 @@
+"""
+Routes each user's TODO lists, tasks, task occurrences, audit logs and tombstones to one of the
+databases in project.database.shard_clients. A user lives on the shard picked by a jump consistent
+hash of their id, unless the `UserShard` directory on the first shard says otherwise. The first
+shard also holds the tables shared by all users (`User`, `Job`, `IdempotencyKey`, `UserShard`);
+other shards keep a copy of the `User` rows of the users they host, for the foreign keys.
+
+Services call `use_user`, `use_todo_list`, `use_task` or `use_audit_log` before their first query;
+afterwards `project.database.client()`, `read_client()` and `prisma.models.*.prisma()` go to that
+shard for the rest of the request. With a single database all of them return at once.
+
+Operations:
+    python -m project.shards init              # interleave id sequences, once per shard count
+    python -m project.shards pin               # before changing DATABASE_SHARD_URLS
+    python -m project.shards rebalance         # after changing it
+    python -m project.shards move USER SHARD   # move one user and keep them there
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+import prisma
+import prisma.models
+import project.database
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_TTL_SECONDS = float(os.getenv("SHARD_DIRECTORY_TTL_SECONDS", "30"))
+
+CACHE_SIZE = int(os.getenv("SHARD_CACHE_SIZE", "100000"))
+
+MOVE_BATCH_SIZE = int(os.getenv("SHARD_MOVE_BATCH_SIZE", "1000"))
+
+# Tables holding per-user data, in the order rows can be inserted.
+SHARDED_TABLES = ["TodoList", "Task", "TaskOccurrence", "AuditLog", "Tombstone"]
+
+OWNER_QUERIES = {
+    "todo_list": 'SELECT "userId" FROM "TodoList" WHERE "id" = $1',
+    "task": """
+        SELECT l."userId" FROM "Task" AS t JOIN "TodoList" AS l ON l."id" = t."todoListId"
+        WHERE t."id" = $1
+    """,
+    "audit_log": 'SELECT "userId" FROM "AuditLog" WHERE "id" = $1',
+}
+
+T = TypeVar("T")
+
+
+class ShardMovingError(Exception):
+    """
+    The user's data is being moved to another shard; the request can be retried shortly.
+    """
+
+
+def count() -> int:
+    return len(project.database.shard_clients)
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping and Veach): maps `key` to one of `buckets` buckets such that
+    adding a bucket only remaps 1/buckets of the keys, all of them to the new bucket.
+
+    Example:
+        jump_hash(42, 4)
+        > 2
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def home_shard(user_id: int) -> int:
+    return jump_hash(user_id, count())
+
+
+class _LRU(OrderedDict):
+    def __init__(self, size: int = CACHE_SIZE):
+        super().__init__()
+        self.size = size
+
+    def remember(self, key, value) -> None:
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.size:
+            self.popitem(last=False)
+
+
+# user id -> (directory entry or None, time it was read)
+_directory = _LRU()
+
+# (kind, entity id) -> owning user id; owners never change, so entries never go stale.
+_owners = _LRU()
+
+# (shard, user id) -> time the user's `User` row was last copied to the shard.
+_copied_users = _LRU()
+
+
+async def _directory_entry(user_id: int) -> Optional[prisma.models.UserShard]:
+    cached = _directory.get(user_id)
+    if cached is not None and time.monotonic() - cached[1] < DIRECTORY_TTL_SECONDS:
+        return cached[0]
+    entry = await prisma.models.UserShard.prisma(
+        project.database.db_client
+    ).find_unique(where={"userId": user_id})
+    _directory.remember(user_id, (entry, time.monotonic()))
+    return entry
+
+
+async def shard_for_user(user_id: int) -> int:
+    """
+    Returns the index of the shard holding the user's data.
+
+    Raises:
+        ShardMovingError: The user is being moved between shards.
+    """
+    if count() == 1:
+        return 0
+    entry = await _directory_entry(user_id)
+    if entry is None:
+        return home_shard(user_id)
+    if entry.movingSince is not None:
+        raise ShardMovingError(f"User {user_id} is being moved, retry shortly")
+    return entry.shard
+
+
+async def _copy_user(index: int, user_id: int) -> None:
+    copied = _copied_users.get((index, user_id))
+    if copied is not None and time.monotonic() - copied < DIRECTORY_TTL_SECONDS:
+        return
+    user = await prisma.models.User.prisma(project.database.db_client).find_unique(
+        where={"id": user_id}
+    )
+    if user is None:
+        return
+    await project.database.shard_clients[index].execute_raw(
+        """
+        INSERT INTO "User" ("id", "email", "password", "role", "createdAt", "updatedAt",
+            "disabledAt")
+        VALUES ($1, $2, $3, $4::"Role", $5, $6, $7)
+        ON CONFLICT ("id") DO UPDATE SET
+            "email" = EXCLUDED."email",
+            "password" = EXCLUDED."password",
+            "role" = EXCLUDED."role",
+            "createdAt" = EXCLUDED."createdAt",
+            "updatedAt" = EXCLUDED."updatedAt",
+            "disabledAt" = EXCLUDED."disabledAt"
+        WHERE ("User"."email", "User"."password", "User"."role", "User"."updatedAt",
+            "User"."disabledAt") IS DISTINCT FROM (EXCLUDED."email", EXCLUDED."password",
+            EXCLUDED."role", EXCLUDED."updatedAt", EXCLUDED."disabledAt")
+        """,
+        user.id,
+        user.email,
+        user.password,
+        user.role,
+        user.createdAt,
+        user.updatedAt,
+        user.disabledAt,
+    )
+    _copied_users.remember((index, user_id), time.monotonic())
+
+
+async def use_user(user_id: int) -> int:
+    """
+    Routes the rest of the request to the shard of `user_id`, copying the user's row there first if
+    needed.
+
+    Returns:
+        int: The shard index.
+
+    Example:
+        await use_user(7)
+        > 2
+    """
+    index = await shard_for_user(user_id)
+    project.database.use_shard(index)
+    if index:
+        await _copy_user(index, user_id)
+    return index
+
+
+async def owner(kind: str, id: int) -> Optional[int]:
+    """
+    Returns the id of the user owning a TODO list, task or audit log entry ("todo_list", "task",
+    "audit_log"), or None if it does not exist. Ids are interleaved between shards (see
+    `init_sequences`), so the shard that created the row is asked first and the others only if the
+    row was moved.
+    """
+    cached = _owners.get((kind, id))
+    if cached is not None:
+        return cached
+    clients = project.database.shard_clients
+    hint = id % len(clients)
+
+    async def lookup(client: prisma.Prisma) -> Optional[int]:
+        row = await client.query_first(OWNER_QUERIES[kind], id)
+        return row["userId"] if row else None
+
+    user_id = await lookup(clients[hint])
+    if user_id is None:
+        others = [client for index, client in enumerate(clients) if index != hint]
+        user_id = next(
+            (found for found in await asyncio.gather(*map(lookup, others)) if found),
+            None,
+        )
+    if user_id is not None:
+        _owners.remember((kind, id), user_id)
+    return user_id
+
+
+async def _use_owner(kind: str, id: int) -> None:
+    if count() == 1:
+        return
+    user_id = await owner(kind, id)
+    # Unknown ids stay on the first shard, where the service reports them as not found.
+    if user_id is not None:
+        await use_user(user_id)
+
+
+async def use_todo_list(todo_list_id: int) -> None:
+    await _use_owner("todo_list", todo_list_id)
+
+
+async def use_task(task_id: int) -> None:
+    await _use_owner("task", task_id)
+
+
+async def use_audit_log(log_id: int) -> None:
+    await _use_owner("audit_log", log_id)
+
+
+async def gather(fn: Callable[[], Awaitable[T]]) -> List[T]:
+    """
+    Runs `fn` once per shard concurrently, each run routed to its shard, and returns the results in
+    shard order. For cross-user queries only; rows of a user being moved can briefly show up on two
+    shards.
+    """
+
+    async def on(index: int) -> T:
+        project.database.use_shard(index)
+        return await fn()
+
+    return await asyncio.gather(*map(on, range(count())))
+
+
+async def forget(user_id: int) -> None:
+    """
+    Removes a deleted user from the shard directory and the caches.
+    """
+    if count() == 1:
+        return
+    await prisma.models.UserShard.prisma(project.database.db_client).delete_many(
+        where={"userId": user_id}
+    )
+    _directory.pop(user_id, None)
+    for index in range(count()):
+        _copied_users.pop((index, user_id), None)
+
+
+async def init_sequences() -> None:
+    """
+    Makes the id sequences of the sharded tables hand out disjoint ids: shard i only creates ids
+    equal to i modulo the number of shards, above every id in use. Run it whenever the number of
+    shards changes, before serving traffic.
+    """
+    clients = project.database.shard_clients
+    for table in SHARDED_TABLES:
+        highest = max(
+            row["max"] or 0
+            for row in await gather(
+                lambda: project.database.client().query_first(
+                    f'SELECT max("id") AS "max" FROM "{table}"'
+                )
+            )
+        )
+        base = highest - highest % len(clients) + len(clients)
+        for index, client in enumerate(clients):
+            await client.execute_raw(
+                f'ALTER SEQUENCE "{table}_id_seq" INCREMENT BY {len(clients)} '
+                f"RESTART WITH {base + index}"
+            )
+        logger.info("Interleaved %s ids from %d", table, base)
+
+
+async def _users_on(client: prisma.Prisma) -> List[int]:
+    rows = await client.query_raw(
+        """
+        SELECT "userId" FROM "TodoList" UNION SELECT "userId" FROM "AuditLog"
+        ORDER BY "userId"
+        """
+    )
+    return [row["userId"] for row in rows]
+
+
+async def pin() -> int:
+    """
+    Records the current shard of every user with data in the directory, so that changing the list
+    of shards does not change where anyone's data is looked up. `rebalance` then moves the users
+    whose shard is no longer their home shard.
+
+    Returns:
+        int: The number of users pinned.
+    """
+    pinned = 0
+    for index, client in enumerate(project.database.shard_clients):
+        for user_id in await _users_on(client):
+            await prisma.models.UserShard.prisma(project.database.db_client).upsert(
+                where={"userId": user_id},
+                data={
+                    "create": {"userId": user_id, "shard": index},
+                    "update": {},
+                },
+            )
+            pinned += 1
+    return pinned
+
+
+# Per-user rows of each sharded table, and the columns copied when moving them. The search and
+# sync columns are left to the triggers on the target shard.
+USER_ROWS = {
+    "TodoList": 'r."userId" = $1',
+    "Task": 'r."todoListId" IN (SELECT "id" FROM "TodoList" WHERE "userId" = $1)',
+    "TaskOccurrence": """
+        r."taskId" IN (
+            SELECT t."id" FROM "Task" AS t JOIN "TodoList" AS l ON l."id" = t."todoListId"
+            WHERE l."userId" = $1
+        )
+    """,
+    "AuditLog": 'r."userId" = $1',
+    "Tombstone": 'r."userId" = $1',
+}
+
+COLUMNS = {
+    "TodoList": [
+        "id",
+        "name",
+        "description",
+        "version",
+        "taskCount",
+        "completedCount",
+        "createdAt",
+        "updatedAt",
+        "userId",
+    ],
+    "Task": [
+        "id",
+        "title",
+        "dueDate",
+        "priority",
+        "notes",
+        "completed",
+        "recurrence",
+        "position",
+        "version",
+        "createdAt",
+        "updatedAt",
+        "todoListId",
+    ],
+    "TaskOccurrence": [
+        "id",
+        "occurrenceAt",
+        "title",
+        "dueDate",
+        "priority",
+        "notes",
+        "completed",
+        "version",
+        "createdAt",
+        "updatedAt",
+        "taskId",
+    ],
+    "AuditLog": ["id", "action", "timestamp", "userId", "todoListId", "taskId"],
+    "Tombstone": ["id", "entity", "entityId", "todoListId", "userId", "deletedAt"],
+}
+
+
+async def _copy_rows(
+    source: prisma.Prisma, target: prisma.Prisma, table: str, user_id: int
+) -> None:
+    columns = ", ".join(f'"{column}"' for column in COLUMNS[table])
+    last_id = 0
+    while True:
+        rows = await source.query_raw(
+            f"""
+            SELECT {columns} FROM "{table}" AS r
+            WHERE {USER_ROWS[table]} AND r."id" > $2
+            ORDER BY r."id" LIMIT $3
+            """,
+            user_id,
+            last_id,
+            MOVE_BATCH_SIZE,
+        )
+        if not rows:
+            return
+        # One statement per batch: the rows travel as a JSON array and are expanded back into rows.
+        await target.execute_raw(
+            f"""
+            INSERT INTO "{table}" ({columns})
+            SELECT {columns} FROM json_populate_recordset(NULL::"{table}", $1::json)
+            """,
+            json.dumps(rows, default=str),
+        )
+        last_id = rows[-1]["id"]
+
+
+async def _delete_user_rows(client: prisma.Prisma, user_id: int) -> None:
+    async with client.tx() as tx:
+        for table in reversed(SHARDED_TABLES):
+            await tx.execute_raw(
+                f'DELETE FROM "{table}" AS r WHERE {USER_ROWS[table]}', user_id
+            )
+
+
+async def move_user(user_id: int, target: int, pinned: bool = False) -> None:
+    """
+    Moves a user's data to shard `target`. Requests for the user fail with ShardMovingError while
+    the data is copied, which takes two SHARD_DIRECTORY_TTL_SECONDS waits for every instance to
+    see the directory change plus the copy itself. Safe to run again after an interruption.
+
+    Args:
+        user_id (int): The user to move.
+        target (int): The index of the destination shard.
+        pinned (bool): Keep the user on `target` even when it is not their home shard, so that
+            `rebalance` leaves them there.
+    """
+    directory = prisma.models.UserShard.prisma(project.database.db_client)
+    entry = await directory.find_unique(where={"userId": user_id})
+    source = entry.shard if entry else home_shard(user_id)
+    if source != target:
+        await directory.upsert(
+            where={"userId": user_id},
+            data={
+                "create": {
+                    "userId": user_id,
+                    "shard": source,
+                    "movingSince": datetime.now(timezone.utc),
+                },
+                "update": {"movingSince": datetime.now(timezone.utc)},
+            },
+        )
+        await asyncio.sleep(DIRECTORY_TTL_SECONDS + 1)
+        clients = project.database.shard_clients
+        await _delete_user_rows(clients[target], user_id)
+        await _copy_user(target, user_id)
+        for table in SHARDED_TABLES:
+            await _copy_rows(clients[source], clients[target], table, user_id)
+    if pinned or target != home_shard(user_id):
+        await directory.upsert(
+            where={"userId": user_id},
+            data={
+                "create": {"userId": user_id, "shard": target, "pinned": pinned},
+                "update": {"shard": target, "pinned": pinned, "movingSince": None},
+            },
+        )
+    else:
+        await directory.delete_many(where={"userId": user_id})
+    if source != target:
+        # Instances that cached the old entry keep reading the source until it expires.
+        await asyncio.sleep(DIRECTORY_TTL_SECONDS + 1)
+        await _delete_user_rows(clients[source], user_id)
+        if source:
+            await prisma.models.User.prisma(clients[source]).delete_many(
+                where={"id": user_id}
+            )
+    logger.info("User %d is on shard %d", user_id, target)
+
+
+async def rebalance(limit: Optional[int] = None) -> int:
+    """
+    Moves the users recorded by `pin` (and not pinned by `move`) to their home shard under the
+    current list of shards, one at a time, and drops their directory entries.
+
+    Returns:
+        int: The number of users processed.
+    """
+    entries = await prisma.models.UserShard.prisma(
+        project.database.db_client
+    ).find_many(where={"pinned": False}, order={"userId": "asc"}, take=limit)
+    for entry in entries:
+        await move_user(entry.userId, home_shard(entry.userId))
+    return len(entries)
+
+
+async def run(args: argparse.Namespace) -> None:
+    await project.database.connect()
+    try:
+        if args.command == "init":
+            await init_sequences()
+        elif args.command == "pin":
+            print(f"pinned {await pin()} users")
+        elif args.command == "rebalance":
+            print(f"rebalanced {await rebalance(args.limit)} users")
+        elif args.command == "move":
+            if not 0 <= args.shard < count():
+                raise SystemExit(f"shard must be between 0 and {count() - 1}")
+            await move_user(args.user_id, args.shard, pinned=True)
+    finally:
+        await project.database.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shard maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init", help="interleave the id sequences of all shards")
+    commands.add_parser("pin", help="record every user's current shard")
+    rebalance_parser = commands.add_parser(
+        "rebalance", help="move recorded users to their home shard"
+    )
+    rebalance_parser.add_argument("--limit", type=int)
+    move_parser = commands.add_parser("move", help="move a user and pin them there")
+    move_parser.add_argument("user_id", type=int)
+    move_parser.add_argument("shard", type=int)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+import project.metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight, further calls for
+    the same key await its result instead of issuing their own query. Nothing is cached once the
+    call completes. The shared call runs in its own task, so a caller that disconnects does not
+    cancel it for the others.
+
+    Calls are grouped by `key` (e.g. a TODO list id) and `scope` (e.g. which database client and
+    which read), so that `forget(key)` can drop every in-flight call touching a resource after it
+    is written to; calls started afterwards query the database again.
+
+    Example:
+        todo_list_reads = SingleFlight("todo_list")
+        await todo_list_reads.do(1, lambda: fetch(1), scope="getTasks")
+        todo_list_reads.forget(1)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Dict[Hashable, asyncio.Task]] = {}
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[T]], scope: Hashable = None
+    ) -> T:
+        """
+        Runs `fn` unless an identical call is already in flight, and returns its result.
+
+        Args:
+            key (Hashable): Resource the call reads; `forget(key)` invalidates it.
+            fn (Callable[[], Awaitable[T]]): Performs the call when no identical call is in flight.
+            scope (Hashable): Distinguishes calls on the same key that must not share a result.
+
+        Returns:
+            T: The result of the shared call. Exceptions are raised to every caller.
+        """
+        calls = self._calls.setdefault(key, {})
+        task = calls.get(scope)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            calls[scope] = task
+            task.add_done_callback(lambda _: self._discard(key, scope, task))
+        else:
+            project.metrics.singleflight_coalesced_calls_total.inc(self.name)
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Detaches the in-flight calls for `key` so that later calls start a fresh query. Callers
+        already waiting still receive the detached result.
+        """
+        self._calls.pop(key, None)
+
+    def _discard(self, key: Hashable, scope: Hashable, task: asyncio.Task) -> None:
+        calls = self._calls.get(key)
+        if calls is not None and calls.get(scope) is task:
+            del calls[scope]
+            if not calls:
+                del self._calls[key]
+        if not task.cancelled():
+            # Retrieve the exception so an error with no waiters left is not logged as unhandled.
+            task.exception()
+
+
+# In-flight reads of a TODO list and its tasks, keyed by the list id. Every write to a list or its
+# tasks calls `todo_list_reads.forget(todo_list_id)`.
+todo_list_reads = SingleFlight("todo_list")
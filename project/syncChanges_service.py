@@ -0,0 +1,180 @@
+import base64
+import binascii
+import json
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import project.repository
+import project.shards
+import project.tombstones
+from pydantic import BaseModel
+
+MAX_LIMIT = 1000
+
+# Changes of one transaction are ordered lists first, then tasks, then tombstones, each by id.
+LIST, TASK, TOMBSTONE = 0, 1, 2
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class SyncTodoList(BaseModel):
+    """
+    A TODO list created or updated since the cursor.
+    """
+
+    id: int
+    name: str
+    description: Optional[str] = None
+    version: int
+    taskCount: int
+    completedCount: int
+    updatedAt: datetime
+
+
+class SyncTask(BaseModel):
+    """
+    A task created or updated since the cursor.
+    """
+
+    id: int
+    todoListId: int
+    title: str
+    dueDate: Optional[datetime] = None
+    priority: Optional[int] = None
+    notes: Optional[str] = None
+    completed: bool
+    recurrence: Optional[str] = None
+    position: str
+    version: int
+    updatedAt: datetime
+
+
+class SyncTombstone(BaseModel):
+    """
+    A task or TODO list deleted since the cursor. `entity` is "task" or "todolist"; a deleted list's tasks are implied.
+    """
+
+    entity: str
+    id: int
+    todoListId: int
+    deletedAt: datetime
+
+
+class SyncResponse(BaseModel):
+    """
+    One page of changes. Pass `cursor` to the next call; `has_more` tells whether changes remain after this page. With `reset` the client's cursor had expired and the page starts a full resync, so local data not in it must be dropped.
+    """
+
+    todo_lists: List[SyncTodoList]
+    tasks: List[SyncTask]
+    deleted: List[SyncTombstone]
+    cursor: str
+    has_more: bool
+    reset: bool = False
+
+
+class Position(NamedTuple):
+    xid: int
+    kind: int
+    id: int
+
+
+START = Position(0, -1, 0)
+
+
+def encode_cursor(position: Position, shard: int = 0) -> str:
+    payload = json.dumps([*position, int(time.time()), shard], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Position, float, int]:
+    """
+    Returns the position encoded in a cursor, the time it was issued and the shard it was issued on.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        xid, kind, id, issued, *shard = json.loads(payload)
+        return Position(int(xid), int(kind), int(id)), float(issued), int(*shard or [0])
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise InvalidCursorError("Invalid sync cursor")
+
+
+def _after(position: Position, kind: int) -> Tuple[int, int]:
+    # The (number, id) bound for one kind of row to come after `position` in (xid, kind, id) order.
+    if kind > position.kind:
+        return position.xid, 0
+    if kind == position.kind:
+        return position.xid, position.id
+    return position.xid, 2**31 - 1
+
+
+async def _fetch(
+    fetch: Callable[..., Awaitable[List[Dict[str, Any]]]],
+    kind: int,
+    user_id: int,
+    position: Position,
+    horizon: int,
+    limit: int,
+) -> List[Tuple[Position, Dict[str, Any]]]:
+    rows = await fetch(user_id, _after(position, kind), horizon, limit + 1)
+    return [(Position(int(row.pop("xid")), kind, row["key"]), row) for row in rows]
+
+
+async def syncChanges(
+    user_id: int, cursor: Optional[str] = None, limit: int = 500
+) -> SyncResponse:
+    """
+    Returns the user's TODO lists and tasks created or updated since `cursor`, and tombstones for those deleted since, so offline clients can catch up without downloading whole lists. Without a cursor (or with one older than SYNC_TOMBSTONE_RETENTION_DAYS, or issued before the user was moved to another shard) it returns every list and task, starting a full resync. Changes are ordered by the write (on Postgres, the transaction) that made them with the row id as tie-breaker, and only transactions that had finished when the page was read are included, so a page never skips a change that commits later; changes still in flight are returned by the next call.
+
+    Args:
+        user_id (int): The ID of the user whose lists are synced.
+        cursor (Optional[str]): The cursor returned by the previous call, or None for a full sync.
+        limit (int): The maximum number of changes returned, at most MAX_LIMIT.
+
+    Returns:
+        SyncResponse: The changes and the cursor to continue from.
+
+    Example:
+        await syncChanges(1, "WzkxMiwxLDQyLDE3MDAwMDAwMDBd")
+        > SyncResponse(todo_lists=[], tasks=[SyncTask(id=43, ...)], deleted=[SyncTombstone(entity="task", id=42, ...)], cursor="...", has_more=False)
+    """
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    shard = await project.shards.use_user(user_id)
+    position, reset = START, False
+    if cursor is not None:
+        position, issued, issued_shard = decode_cursor(cursor)
+        # Transaction ids are per database, so a user moved to another shard starts over.
+        if (
+            issued < time.time() - project.tombstones.RETENTION_DAYS * 86400
+            or issued_shard != shard
+        ):
+            position, reset = START, True
+    repo = project.repository.get()
+    horizon = await repo.sync_horizon()
+    entries = await _fetch(
+        repo.sync_todo_lists, LIST, user_id, position, horizon, limit
+    )
+    entries += await _fetch(repo.sync_tasks, TASK, user_id, position, horizon, limit)
+    if position != START:
+        # A full resync only needs what exists now.
+        entries += await _fetch(
+            repo.sync_tombstones, TOMBSTONE, user_id, position, horizon, limit
+        )
+    entries.sort(key=lambda entry: entry[0])
+    page = entries[:limit]
+    models = {LIST: SyncTodoList, TASK: SyncTask, TOMBSTONE: SyncTombstone}
+    changes: Dict[int, list] = {LIST: [], TASK: [], TOMBSTONE: []}
+    for entry_position, row in page:
+        changes[entry_position.kind].append(models[entry_position.kind](**row))
+    return SyncResponse(
+        todo_lists=changes[LIST],
+        tasks=changes[TASK],
+        deleted=changes[TOMBSTONE],
+        cursor=encode_cursor(page[-1][0] if page else position, shard),
+        has_more=len(entries) > limit,
+        reset=reset,
+    )
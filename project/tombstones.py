@@ -0,0 +1,45 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import project.background
+import project.repository
+import project.shards
+
+RETENTION_DAYS = float(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+
+PURGE_INTERVAL_SECONDS = float(
+    os.getenv("SYNC_TOMBSTONE_PURGE_INTERVAL_SECONDS", "3600")
+)
+
+# Tombstones are kept a little longer than sync cursors stay valid, so a deletion that committed
+# just after a cursor was issued is still there when that cursor is last accepted.
+PURGE_GRACE = timedelta(hours=1)
+
+_last_purge = 0.0
+
+
+async def schedule_purge() -> None:
+    """
+    Purges expired tombstones of every shard in the background, at most once every PURGE_INTERVAL_SECONDS per process. Called after writing tombstones.
+    """
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    await project.background.executor.submit("tombstone_purge", purge_expired)
+
+
+async def purge_expired() -> int:
+    """
+    Deletes the tombstones older than RETENTION_DAYS on every shard, whichever shard the request that scheduled the purge ran on. Sync cursors issued before then are answered with a full resync instead.
+
+    Returns:
+        int: The number of tombstones deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS) - PURGE_GRACE
+    purged = await project.shards.gather(
+        lambda: project.repository.get().purge_tombstones(cutoff)
+    )
+    return sum(purged)
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import project.background
+import project.changefeed
+import project.partialUpdateTask_service
+import project.recurrence
+import project.repository
+import project.shards
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+
+class OccurrenceResponse(BaseModel):
+    """
+    One occurrence of a repeating task, with the task's fields it does not override filled in. `id` is the task's id and `version` the occurrence's own.
+    """
+
+    id: int
+    occurrenceAt: datetime
+    title: str
+    dueDate: Optional[datetime] = None
+    priority: Optional[int] = None
+    notes: Optional[str] = None
+    completed: bool
+    recurrence: Optional[str] = None
+    updatedAt: datetime
+    todoListId: int
+    version: int
+
+
+class OccurrencePatch(BaseModel):
+    """
+    JSON Merge Patch (RFC 7396) document for one occurrence of a repeating task. `null` drops the occurrence's own value of a field, so that it follows the task again.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    title: Optional[str] = None
+    dueDate: Optional[datetime] = None
+    priority: Optional[int] = None
+    notes: Optional[str] = None
+    completed: Optional[bool] = None
+
+
+class OccurrenceNotFoundError(LookupError):
+    pass
+
+
+def parse_patch(patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validates a merge patch document for an occurrence and returns the supplied fields with their parsed values.
+
+    Raises:
+        InvalidPatchError: The document has unknown fields or values of the wrong type, or clears `completed`.
+
+    Example:
+        parse_patch({"completed": True, "title": None})
+        > {"completed": True, "title": None}
+    """
+    try:
+        parsed = OccurrencePatch.model_validate(patch)
+    except ValidationError as e:
+        raise project.partialUpdateTask_service.InvalidPatchError(str(e))
+    changes = {field: getattr(parsed, field) for field in parsed.model_fields_set}
+    if "completed" in changes and changes["completed"] is None:
+        raise project.partialUpdateTask_service.InvalidPatchError(
+            "Fields cannot be null: completed"
+        )
+    return changes
+
+
+async def updateOccurrence(
+    taskId: int,
+    occurrence_at: datetime,
+    patch: Dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> OccurrenceResponse:
+    """
+    Completes or edits one occurrence of a repeating task, e.g. ticks off this week's "Water the plants" without touching the task or its other occurrences. The first write to an occurrence stores a row for it; occurrences never written stay computed from the task's rule.
+
+    Args:
+        taskId (int): The ID of the repeating task.
+        occurrence_at (datetime): The time the task's rule schedules the occurrence at, as returned in `occurrence_at`/`occurrenceAt` by the windowed task reads.
+        patch (Dict[str, Any]): The merge patch document, e.g. {"completed": true}.
+        expected_version (Optional[int]): When given, the patch only applies if the occurrence is still at this version; an occurrence never written is at version 0.
+
+    Returns:
+        OccurrenceResponse: The occurrence after the update.
+
+    Raises:
+        OccurrenceNotFoundError: The task does not exist or has no occurrence at that time.
+
+    Example:
+        await updateOccurrence(1, datetime(2026, 3, 2, 9, tzinfo=timezone.utc), {"completed": True})
+        > OccurrenceResponse(id=1, occurrenceAt=datetime(2026, 3, 2, 9, ...), completed=True, version=1, ...)
+    """
+    changes = parse_patch(patch)
+    occurrence_at = project.recurrence.utc(occurrence_at)
+    await project.shards.use_task(taskId)
+    repository = project.repository.get()
+    task = await repository.get_task(taskId)
+    if task is None or not project.recurrence.is_occurrence(task, occurrence_at):
+        raise OccurrenceNotFoundError(
+            f"Task {taskId} has no occurrence at {occurrence_at.isoformat()}"
+        )
+    if changes:
+        saved = await repository.save_occurrence(
+            taskId, occurrence_at, changes, expected_version
+        )
+        if saved is None:
+            raise OccurrenceNotFoundError(f"Task {taskId} not found")
+        stored = saved.occurrence
+    else:
+        found = await repository.find_occurrences(
+            [taskId], occurrence_at, occurrence_at + timedelta(milliseconds=1)
+        )
+        stored = found[0] if found else None
+    occurrence = project.recurrence.merge(task, occurrence_at, stored)
+    if changes:
+        project.changefeed.publish(
+            "task.occurrence.updated",
+            saved.user_id,
+            task.todoListId,
+            {
+                **project.changefeed.task_data(occurrence),
+                "occurrenceAt": occurrence_at,
+            },
+        )
+        timestamp = datetime.now(timezone.utc)
+        await project.background.executor.submit(
+            "audit",
+            lambda: project.repository.get().create_audit_log(
+                {
+                    "action": "updateOccurrence",
+                    "timestamp": timestamp,
+                    "userId": saved.user_id,
+                    "todoListId": task.todoListId,
+                    "taskId": taskId,
+                }
+            ),
+        )
+    return OccurrenceResponse(
+        id=occurrence.id,
+        occurrenceAt=occurrence_at,
+        title=occurrence.title,
+        dueDate=occurrence.dueDate,
+        priority=occurrence.priority,
+        notes=occurrence.notes,
+        completed=occurrence.completed,
+        recurrence=occurrence.recurrence,
+        updatedAt=occurrence.updatedAt,
+        todoListId=occurrence.todoListId,
+        version=occurrence.version,
+    )
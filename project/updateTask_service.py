@@ -1,8 +1,11 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
-import prisma
-import prisma.models
+import project.background
+import project.changefeed
+import project.repository
+import project.shards
+import project.singleflight
 from pydantic import BaseModel
 
 
@@ -19,6 +22,7 @@ class Task(BaseModel):
     completed: bool
     createdAt: datetime
     updatedAt: datetime
+    version: int
 
 
 class UpdateTaskResponse(BaseModel):
@@ -37,6 +41,7 @@ async def updateTask(
     priority: Optional[int],
     notes: Optional[str],
     completed: Optional[bool],
+    expected_version: Optional[int] = None,
 ) -> UpdateTaskResponse:
     """
     This endpoint allows users to update the details of an existing task. Users must provide the task ID as a URL parameter and the updated task details in the request body. On successful update, a confirmation message along with the updated task details is returned. This route ensures the task belongs to the user's TODO list before updating and logs the operation via AuditLogModule.
@@ -48,6 +53,7 @@ async def updateTask(
     priority (Optional[int]): The updated priority of the task, if any.
     notes (Optional[str]): The updated notes for the task, if any.
     completed (Optional[bool]): The updated completion status of the task.
+    expected_version (Optional[int]): When given, the update only applies if the task is still at this version; the check and the write are atomic.
 
     Returns:
     UpdateTaskResponse: The response model for task updates. It includes a confirmation message and the details of the updated task.
@@ -56,39 +62,53 @@ async def updateTask(
         await updateTask(1, "New Title", None, 3, "Some notes", True)
         > UpdateTaskResponse(message='Task updated successfully', updatedTask=Task(id=1, title='New Title', dueDate=None, priority=3, notes='Some notes', completed=True, createdAt=datetime.datetime(...), updatedAt=datetime.datetime(...)))
     """
-    task = await prisma.models.Task.prisma().find_unique(
-        where={"id": taskId}, include={"todoList": {"include": {"user": True}}}
+    await project.shards.use_task(taskId)
+    # Fields left out (None) keep their value. The update, the version check and the list's
+    # completed counter are one write.
+    fields = {
+        "title": title,
+        "dueDate": dueDate,
+        "priority": priority,
+        "notes": notes,
+        "completed": completed,
+    }
+    updated = await project.repository.get().update_task(
+        taskId,
+        {field: value for field, value in fields.items() if value is not None},
+        expected_version,
     )
-    if not task:
+    if updated is None:
         raise ValueError("Task not found")
-    if not task.todoList or not task.todoList.user:
-        raise ValueError("Task does not belong to any user's TODO list")
-    updated_data = {}
-    if title is not None:
-        updated_data["title"] = title
-    if dueDate is not None:
-        updated_data["dueDate"] = dueDate
-    if priority is not None:
-        updated_data["priority"] = priority
-    if notes is not None:
-        updated_data["notes"] = notes
-    if completed is not None:
-        updated_data["completed"] = completed
-    updated_task = await prisma.models.Task.prisma().update(
-        where={"id": taskId}, data=updated_data
+    task = updated.task
+    project.singleflight.todo_list_reads.forget(task.todoListId)
+    project.changefeed.publish(
+        "task.updated",
+        updated.user_id,
+        task.todoListId,
+        project.changefeed.task_data(task),
     )
-    await prisma.models.AuditLog.prisma().create(
-        data={"action": "updateTask", "userId": task.todoList.userId, "taskId": taskId}
+    timestamp = datetime.now(timezone.utc)
+    await project.background.executor.submit(
+        "audit",
+        lambda: project.repository.get().create_audit_log(
+            {
+                "action": "updateTask",
+                "timestamp": timestamp,
+                "userId": updated.user_id,
+                "taskId": taskId,
+            }
+        ),
     )
     updated_task_model = Task(
-        id=updated_task.id,
-        title=updated_task.title,
-        dueDate=updated_task.dueDate,
-        priority=updated_task.priority,
-        notes=updated_task.notes,
-        completed=updated_task.completed,
-        createdAt=updated_task.createdAt,
-        updatedAt=updated_task.updatedAt,
+        id=task.id,
+        title=task.title,
+        dueDate=task.dueDate,
+        priority=task.priority,
+        notes=task.notes,
+        completed=task.completed,
+        createdAt=task.createdAt,
+        updatedAt=task.updatedAt,
+        version=task.version,
     )
     response = UpdateTaskResponse(
         message="Task updated successfully", updatedTask=updated_task_model
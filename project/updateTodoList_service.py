@@ -1,8 +1,10 @@
 from datetime import datetime
 from typing import Optional
 
-import prisma
-import prisma.models
+import project.changefeed
+import project.repository
+import project.shards
+import project.singleflight
 from pydantic import BaseModel
 
 
@@ -17,10 +19,14 @@ class TodoListOutputObject(BaseModel):
     createdAt: datetime
     updatedAt: datetime
     userId: int
+    version: int
 
 
 async def updateTodoList(
-    id: int, title: str, description: Optional[str]
+    id: int,
+    title: str,
+    description: Optional[str],
+    expected_version: Optional[int] = None,
 ) -> TodoListOutputObject:
     """
     Updates the details of an existing TODO list identified by its unique identifier. The request should provide the updated title and description. The response will return the updated TODO list.
@@ -29,18 +35,35 @@ async def updateTodoList(
         id (int): The unique identifier of the TODO list to update.
         title (str): The updated title of the TODO list.
         description (Optional[str]): The updated description of the TODO list.
+        expected_version (Optional[int]): When given, the update only applies if the list is still at this version; the check and the write are atomic.
 
     Returns:
         TodoListOutputObject: Will return the updated TODO list object.
 
+    Raises:
+        project.versioning.VersionConflictError: The list was changed since `expected_version`.
+
     Example:
         updated_todo = await updateTodoList(1, 'New Title', 'Updated Description')
     """
-    existing_todo = await prisma.models.TodoList.prisma().find_unique(where={"id": id})
-    if not existing_todo:
+    await project.shards.use_todo_list(id)
+    updated_todo = await project.repository.get().update_todo_list(
+        id, title, description, expected_version
+    )
+    if updated_todo is None:
         raise ValueError("TodoList not found")
-    updated_todo = await prisma.models.TodoList.prisma().update(
-        where={"id": id}, data={"name": title, "description": description}
+    project.singleflight.todo_list_reads.forget(id)
+    project.changefeed.publish(
+        "todolist.updated",
+        updated_todo.userId,
+        id,
+        {
+            "id": id,
+            "name": updated_todo.name,
+            "description": updated_todo.description,
+            "version": updated_todo.version,
+            "updatedAt": updated_todo.updatedAt,
+        },
     )
     output = TodoListOutputObject(
         id=updated_todo.id,
@@ -49,5 +72,6 @@ async def updateTodoList(
         createdAt=updated_todo.createdAt,
         updatedAt=updated_todo.updatedAt,
         userId=updated_todo.userId,
+        version=updated_todo.version,
     )
     return output
@@ -2,8 +2,7 @@ from datetime import datetime
 from typing import Optional
 
 import bcrypt
-import prisma
-import prisma.models
+import project.repository
 from pydantic import BaseModel
 
 
@@ -41,7 +40,7 @@ async def updateUserProfile(
         > UpdateUserProfileResponse(id=1, email='newemail@example.com', role='Admin', createdAt=datetime, updatedAt=datetime)
     """
     user_id = 1
-    user = await prisma.models.User.prisma().find_unique(where={"id": user_id})
+    user = await project.repository.get().get_user(user_id)
     if not user:
         raise ValueError("User not found")
     update_data = {}
@@ -54,9 +53,7 @@ async def updateUserProfile(
         update_data["role"] = role
     if not update_data:
         raise ValueError("Nothing to update")
-    updated_user = await prisma.models.User.prisma().update(
-        where={"id": user_id}, data=update_data
-    )
+    updated_user = await project.repository.get().update_user(user_id, update_data)
     if not updated_user:
         raise ValueError("Failed to update user profile")
     return UpdateUserProfileResponse(
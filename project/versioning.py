@@ -0,0 +1,73 @@
+import re
+from typing import Optional
+
+import prisma
+
+_ETAG = re.compile(r'^(?:W/)?"?(\d+)"?$')
+
+
+class VersionConflictError(Exception):
+    """
+    The row was changed since the client read it: its current version differs from the version
+    the update was conditioned on.
+    """
+
+    def __init__(self, resource: str, id: int, expected: int, current: int):
+        super().__init__(
+            f"{resource} {id} is at version {current}, not {expected}; reload and retry"
+        )
+        self.current_version = current
+
+
+class InvalidVersionError(ValueError):
+    pass
+
+
+def expected_version(
+    if_match: Optional[str], expected_version: Optional[int]
+) -> Optional[int]:
+    """
+    Returns the version an update is conditioned on, taken from the `expected_version` parameter
+    or else from an `If-Match` header holding the version as an entity tag. None (no header, or
+    `If-Match: *`) makes the update unconditional.
+
+    Args:
+        if_match (Optional[str]): The If-Match header, e.g. '"3"', 'W/"3"' or '3'.
+        expected_version (Optional[int]): The expected_version parameter.
+
+    Returns:
+        Optional[int]: The expected version, if any.
+
+    Raises:
+        InvalidVersionError: The If-Match header is not a version.
+
+    Example:
+        expected_version('"3"', None)
+        > 3
+    """
+    if expected_version is not None:
+        return expected_version
+    if if_match is None or if_match.strip() == "*":
+        return None
+    match = _ETAG.match(if_match.strip())
+    if match is None:
+        raise InvalidVersionError("If-Match must be a version such as '\"3\"'")
+    return int(match.group(1))
+
+
+async def raise_for_conflict(
+    client: prisma.Prisma, table: str, id: int, expected: Optional[int]
+) -> None:
+    """
+    Explains why a conditional write matched no row. Only runs after such a write failed, so
+    successful updates still take a single statement. Returns when the row does not exist.
+
+    Raises:
+        VersionConflictError: The row exists at another version than `expected`.
+    """
+    if expected is not None:
+        row = await client.query_first(
+            f'SELECT "version" FROM "{table}" WHERE "id" = $1', id
+        )
+        if row is not None:
+            raise VersionConflictError(table, id, expected, row["version"])
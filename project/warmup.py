@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import project.repository
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("WARMUP_ENABLED", "1").lower() in ("1", "true", "yes")
+
+BLOCKING = os.getenv("WARMUP_BLOCKING", "").lower() in ("1", "true", "yes")
+
+RETRY_INTERVAL_SECONDS = float(os.getenv("WARMUP_RETRY_INTERVAL_SECONDS", "1"))
+
+
+@dataclass
+class WarmupState:
+    """
+    Readiness of this instance. `ready` turns true once warm-up has succeeded (or immediately when
+    warm-up is disabled) and false again when the application starts shutting down.
+    """
+
+    ready: bool = False
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+
+state = WarmupState()
+
+
+async def warm_up() -> None:
+    """
+    Warms up the storage backend (for Postgres: pre-opens WARMUP_POOL_CONNECTIONS connections on
+    the primary, the other shards and the replica, when connected, and runs one cheap query per
+    model) so the first real requests do not pay for connection setup or the engine's first-query
+    planning. Retries every RETRY_INTERVAL_SECONDS until it succeeds, then marks the instance ready.
+    """
+    start = time.perf_counter()
+    while True:
+        try:
+            await project.repository.get().warm_up()
+            break
+        except Exception as e:
+            logger.exception("Warm-up failed, retrying")
+            state.error = str(e)
+            await asyncio.sleep(RETRY_INTERVAL_SECONDS)
+    state.duration = time.perf_counter() - start
+    state.error = None
+    state.ready = True
+    logger.info("Warm-up finished in %.3fs", state.duration)
+
+
+async def start() -> Optional[asyncio.Task]:
+    """
+    Runs warm-up according to the WARMUP_ENABLED and WARMUP_BLOCKING settings. In the default
+    background mode the server starts accepting connections, answering liveness checks while
+    readiness reports 503, until warm-up completes.
+
+    Returns:
+        Optional[asyncio.Task]: The background warm-up task, if one was started.
+    """
+    if not ENABLED:
+        state.ready = True
+        return None
+    if BLOCKING:
+        await warm_up()
+        return None
+    return asyncio.create_task(warm_up())
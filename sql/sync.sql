@@ -0,0 +1,29 @@
+-- Stamps "Task" and "TodoList" rows with the id of the transaction that last wrote them, which
+-- `GET /sync` pages through, and stamps existing rows. Prisma cannot declare triggers, so apply
+-- this after `prisma db push`; it is idempotent:
+--
+--     prisma db execute --file sql/sync.sql --schema schema.prisma
+
+CREATE OR REPLACE FUNCTION sync_xid_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW."syncXid" := pg_current_xact_id();
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS sync_xid ON "TodoList";
+
+CREATE TRIGGER sync_xid
+    BEFORE INSERT OR UPDATE ON "TodoList"
+    FOR EACH ROW EXECUTE FUNCTION sync_xid_trigger();
+
+DROP TRIGGER IF EXISTS sync_xid ON "Task";
+
+CREATE TRIGGER sync_xid
+    BEFORE INSERT OR UPDATE ON "Task"
+    FOR EACH ROW EXECUTE FUNCTION sync_xid_trigger();
+
+UPDATE "TodoList" SET "syncXid" = pg_current_xact_id() WHERE "syncXid" IS NULL;
+
+UPDATE "Task" SET "syncXid" = pg_current_xact_id() WHERE "syncXid" IS NULL;
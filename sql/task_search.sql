@@ -0,0 +1,27 @@
+-- Keeps "Task"."searchVector" in sync with the task's title and notes, and fills it for existing
+-- rows. Prisma cannot declare triggers, so apply this after `prisma db push`; it is idempotent:
+--
+--     prisma db execute --file sql/task_search.sql --schema schema.prisma
+
+CREATE OR REPLACE FUNCTION task_search_vector(title text, notes text) RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(notes, '')), 'B')
+$$;
+
+CREATE OR REPLACE FUNCTION task_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW."searchVector" := task_search_vector(NEW."title", NEW."notes");
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS task_search_vector ON "Task";
+
+CREATE TRIGGER task_search_vector
+    BEFORE INSERT OR UPDATE OF "title", "notes" ON "Task"
+    FOR EACH ROW EXECUTE FUNCTION task_search_vector_trigger();
+
+UPDATE "Task" SET "searchVector" = task_search_vector("title", "notes")
+WHERE "searchVector" IS NULL;
@@ -0,0 +1,18 @@
+import os
+
+# Services pick their backend on first use; tests run against the in-process one.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import project.memory_repository  # noqa: E402
+import project.repository  # noqa: E402
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def repository() -> project.memory_repository.MemoryRepository:
+    """
+    A fresh, empty MemoryRepository that the services use for the duration of the test.
+    """
+    repository = project.memory_repository.MemoryRepository()
+    project.repository.use(repository)
+    return repository
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import project.createTask_service
+import project.idempotency
+import project.partialUpdateTask_service
+import project.server
+import project.updateTodoList_service
+import pytest
+
+# The route functions are called directly: headers are plain arguments once FastAPI has parsed
+# them, and the routes own the mapping of errors to status codes. The services they call are
+# imported above, as materializing the routes would.
+
+
+@pytest.fixture
+def idempotency_store(monkeypatch) -> project.idempotency.IdempotencyStore:
+    store = project.idempotency.IdempotencyStore()
+    monkeypatch.setattr(project.idempotency, "store", store)
+    return store
+
+
+async def _todo_list(repository):
+    user = await repository.create_user("owner@example.com", "secret")
+    return await repository.create_todo_list(user.id, "Groceries", None)
+
+
+def _error(response):
+    return response.status_code, json.loads(response.body)
+
+
+def test_update_todo_list_with_stale_if_match_is_409(repository):
+    async def scenario():
+        todo_list = await _todo_list(repository)
+        updated = await project.server.api_put_updateTodoList(
+            todo_list.id, "Errands", None, None, '"0"'
+        )
+        assert updated.version == 1
+
+        status, body = _error(
+            await project.server.api_put_updateTodoList(
+                todo_list.id, "Chores", None, None, '"0"'
+            )
+        )
+        assert status == 409
+        assert body["current_version"] == 1
+        assert (await repository.get_todo_list(todo_list.id)).name == "Errands"
+
+        status, _ = _error(
+            await project.server.api_put_updateTodoList(
+                todo_list.id, "Chores", None, None, "latest"
+            )
+        )
+        assert status == 400
+
+    asyncio.run(scenario())
+
+
+def test_patch_task_with_stale_if_match_is_409(repository):
+    async def scenario():
+        todo_list = await _todo_list(repository)
+        task = (await repository.create_task(todo_list.id, {"title": "Milk"})).task
+        patched = await project.server.api_patch_partialUpdateTask(
+            task.id, {"completed": True}, None, 'W/"0"'
+        )
+        assert patched.version == 1
+
+        status, body = _error(
+            await project.server.api_patch_partialUpdateTask(
+                task.id, {"title": "Oat milk"}, None, 'W/"0"'
+            )
+        )
+        assert (status, body["current_version"]) == (409, 1)
+        assert (await repository.get_task(task.id)).title == "Milk"
+
+        unconditional = await project.server.api_patch_partialUpdateTask(
+            task.id, {"title": "Oat milk"}, None, "*"
+        )
+        assert unconditional.version == 2
+
+    asyncio.run(scenario())
+
+
+async def _create_task(todo_list_id, title, key):
+    return await project.server.api_post_createTask(
+        todo_list_id, title, None, None, None, None, None, idempotency_key=key
+    )
+
+
+def test_repeated_idempotency_key_returns_the_first_response(
+    repository, idempotency_store
+):
+    async def scenario():
+        todo_list = await _todo_list(repository)
+        first = await _create_task(todo_list.id, "Milk", "key-1")
+        assert isinstance(first, project.createTask_service.CreateTaskResponse)
+        assert await _create_task(todo_list.id, "Milk", "key-1") == first
+
+        # Another instance has no cached response and replays the stored one.
+        project.idempotency.store = project.idempotency.IdempotencyStore()
+        assert await _create_task(todo_list.id, "Milk", "key-1") == first
+        assert (await repository.get_todo_list(todo_list.id)).taskCount == 1
+
+        other = await _create_task(todo_list.id, "Milk", "key-2")
+        assert other.id != first.id
+        assert (await repository.get_todo_list(todo_list.id)).taskCount == 2
+
+    asyncio.run(scenario())
+
+
+def test_idempotency_key_reused_with_other_parameters_is_422(
+    repository, idempotency_store
+):
+    async def scenario():
+        todo_list = await _todo_list(repository)
+        await _create_task(todo_list.id, "Milk", "key-1")
+        status, _ = _error(await _create_task(todo_list.id, "Bread", "key-1"))
+        assert status == 422
+        assert (await repository.get_todo_list(todo_list.id)).taskCount == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import project.importTasks_service
+import pytest
+
+ImportFormatError = project.importTasks_service.ImportFormatError
+
+
+def _parse(parser, document: str, chunk_size: int):
+    async def chunks():
+        data = document.encode()
+        for start in range(0, len(data), chunk_size):
+            yield data[start : start + chunk_size]
+
+    async def collect():
+        items = []
+        try:
+            async for item in parser(chunks()):
+                items.append(str(item) if isinstance(item, Exception) else item)
+        except ImportFormatError as e:
+            items.append(f"raised: {e}")
+        return items
+
+    return asyncio.run(collect())
+
+
+def _parse_json(document: str, chunk_size: int = 1 << 16):
+    return _parse(project.importTasks_service.parse_json, document, chunk_size)
+
+
+def _parse_csv(document: str, chunk_size: int = 1 << 16):
+    return _parse(project.importTasks_service.parse_csv, document, chunk_size)
+
+
+def test_json_elements_split_at_every_byte():
+    elements = [
+        {"title": 'café "au lait"', "priority": 12345},
+        1.5e-3,
+        -12,
+        True,
+        None,
+        "tab\tand \\u escape ☃",
+        [1, [2, {"a": []}]],
+    ]
+    document = json.dumps(elements, ensure_ascii=False)
+    for chunk_size in range(1, len(document.encode()) + 1):
+        assert _parse_json(document, chunk_size) == elements, chunk_size
+
+
+def test_json_number_split_across_chunks_is_not_cut():
+    for chunk_size in range(1, 12):
+        assert _parse_json("[1234.5e-1, 6789]", chunk_size) == [123.45, 6789]
+
+
+def test_json_malformed_elements_are_reported_and_skipped():
+    document = (
+        '[{"title": "a"}, {"title": tru}, {"x": [1, "],", {"y": ,}]}, 5 6, '
+        '{"title": "b"}]'
+    )
+    expected = [
+        {"title": "a"},
+        "invalid JSON: Expecting value",
+        "invalid JSON: Expecting value",
+        "invalid JSON: Expecting ',' delimiter",
+        {"title": "b"},
+    ]
+    for chunk_size in range(1, len(document) + 1):
+        assert _parse_json(document, chunk_size) == expected, chunk_size
+
+
+def test_json_trailing_comma_is_rejected():
+    assert _parse_json("[1, 2,]") == [1, 2, "invalid JSON: Expecting value"]
+    assert _parse_json("[]") == []
+
+
+def test_json_unterminated_array():
+    assert _parse_json('[{"title": "a"}, {"title": "b"') == [
+        {"title": "a"},
+        "invalid JSON: Expecting ',' delimiter",
+        "raised: unexpected end of JSON array",
+    ]
+    assert _parse_json("[1, 2", 2) == [1, 2, "raised: unexpected end of JSON array"]
+    assert _parse_json('[1, "ab', 2) == [
+        1,
+        "invalid JSON: Unterminated string starting at",
+        "raised: unexpected end of JSON array",
+    ]
+    assert _parse_json('{"title": "a"}') == ["raised: JSON upload must be an array"]
+
+
+def test_json_element_size_is_capped(monkeypatch):
+    monkeypatch.setattr(project.importTasks_service, "MAX_JSON_ELEMENT_SIZE", 50)
+    document = json.dumps([{"title": "x" * 500}, {"title": "ok"}])
+    assert _parse_json(document, 7) == [
+        "JSON element longer than 50 characters",
+        {"title": "ok"},
+    ]
+
+
+def test_csv_quoted_field_spanning_lines():
+    document = (
+        'list,title,notes\r\nHome,"Paint, then dry","line one\nline ""two""\n"\r\n'
+        "Home,Sweep,\n"
+    )
+    expected = [
+        {"list": "Home", "title": "Paint, then dry", "notes": 'line one\nline "two"\n'},
+        {"list": "Home", "title": "Sweep"},
+    ]
+    for chunk_size in range(1, len(document) + 1):
+        assert _parse_csv(document, chunk_size) == expected, chunk_size
+
+
+def test_csv_bad_rows():
+    assert _parse_csv('title,notes\na\nb,"open\n') == [
+        "expected 2 columns, found 1",
+        "unterminated quoted field",
+    ]
+
+
+def test_validate_batch_numbers_the_failed_rows():
+    valid, errors = project.importTasks_service.validate_batch(
+        [(7, {"title": "a"}), (8, {"title": " "}), (9, {"titel": "c"})]
+    )
+    assert [number for number, _ in valid] == [7]
+    assert [(error.row, error.error) for error in errors] == [
+        (8, "title: Value error, title must not be blank"),
+        (9, "title: Field required; titel: Extra inputs are not permitted"),
+    ]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 1000])
+def test_import_reports_rows_by_their_upload_position(
+    repository, monkeypatch, batch_size
+):
+    monkeypatch.setattr(project.importTasks_service, "BATCH_SIZE", batch_size)
+    document = (
+        '[{"title": "a"}, {"title": tru}, {"title": ""}, {"title": "b"}, '
+        '{"title": "c", "list": "Other"}, {"title": "d"},]'
+    )
+
+    async def scenario():
+        user = await repository.create_user("owner@example.com", "secret")
+        todo_list = await repository.create_todo_list(user.id, "Inbox", None)
+
+        async def chunks():
+            yield document.encode()
+
+        response = await project.importTasks_service.importTasks(
+            user.id, chunks(), "json", todo_list.id
+        )
+        titles = [
+            task.title for task in (await repository.read_todo_list(todo_list.id)).tasks
+        ]
+        return response, titles
+
+    response, titles = asyncio.run(scenario())
+    assert (response.imported_tasks, response.created_lists) == (4, 1)
+    assert [(error.row, error.error) for error in response.errors] == [
+        (2, "invalid JSON: Expecting value"),
+        (3, "title: Value error, title must not be blank"),
+        (7, "invalid JSON: Expecting value"),
+    ]
+    assert titles == ["a", "b", "d"]
@@ -0,0 +1,161 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import project.versioning
+import pytest
+
+
+async def _list_with_tasks(repository, titles):
+    user = await repository.create_user("owner@example.com", "secret")
+    todo_list = await repository.create_todo_list(user.id, "Groceries", None)
+    tasks = [
+        (await repository.create_task(todo_list.id, {"title": title})).task
+        for title in titles
+    ]
+    return user, todo_list, tasks
+
+
+async def _titles(repository, todo_list_id):
+    todo_list = await repository.read_todo_list(todo_list_id)
+    return [task.title for task in todo_list.tasks]
+
+
+def test_create_task_appends_and_counts(repository):
+    async def scenario():
+        user, todo_list, tasks = await _list_with_tasks(repository, ["a", "b", "c"])
+        assert [task.version for task in tasks] == [0, 0, 0]
+        assert tasks[0].position < tasks[1].position < tasks[2].position
+        assert await _titles(repository, todo_list.id) == ["a", "b", "c"]
+        stored = await repository.get_todo_list(todo_list.id)
+        assert (stored.taskCount, stored.completedCount) == (3, 0)
+        assert await repository.create_task(todo_list.id + 1, {"title": "x"}) is None
+
+    asyncio.run(scenario())
+
+
+def test_update_task_bumps_version_and_completed_count(repository):
+    async def scenario():
+        user, todo_list, (task,) = await _list_with_tasks(repository, ["a"])
+        updated = await repository.update_task(
+            task.id, {"completed": True, "notes": "bio"}, expected_version=0
+        )
+        assert updated.user_id == user.id
+        assert (updated.task.version, updated.task.completed) == (1, True)
+        assert (await repository.get_todo_list(todo_list.id)).completedCount == 1
+
+        cleared = await repository.update_task(task.id, {"notes": None})
+        assert cleared.task.notes is None
+        assert cleared.task.version == 2
+
+        unchanged = await repository.update_task(task.id, {})
+        assert unchanged.task.version == 2
+        assert await repository.update_task(task.id + 1, {"title": "x"}) is None
+
+    asyncio.run(scenario())
+
+
+def test_update_task_with_stale_version_conflicts(repository):
+    async def scenario():
+        _, _, (task,) = await _list_with_tasks(repository, ["a"])
+        await repository.update_task(task.id, {"title": "b"}, expected_version=0)
+        with pytest.raises(project.versioning.VersionConflictError) as conflict:
+            await repository.update_task(task.id, {"title": "c"}, expected_version=0)
+        assert conflict.value.current_version == 1
+        assert (await repository.get_task(task.id)).title == "b"
+
+    asyncio.run(scenario())
+
+
+def test_update_todo_list_with_stale_version_conflicts(repository):
+    async def scenario():
+        _, todo_list, _ = await _list_with_tasks(repository, [])
+        renamed = await repository.update_todo_list(
+            todo_list.id, "Errands", None, expected_version=0
+        )
+        assert (renamed.name, renamed.version) == ("Errands", 1)
+        with pytest.raises(project.versioning.VersionConflictError):
+            await repository.update_todo_list(
+                todo_list.id, "Chores", None, expected_version=0
+            )
+        assert (await repository.get_todo_list(todo_list.id)).name == "Errands"
+
+    asyncio.run(scenario())
+
+
+def test_move_task(repository):
+    async def scenario():
+        user, todo_list, (a, b, c) = await _list_with_tasks(repository, ["a", "b", "c"])
+        moved = await repository.move_task(c.id, None)
+        assert moved.user_id == user.id
+        assert await _titles(repository, todo_list.id) == ["c", "a", "b"]
+        await repository.move_task(c.id, a.id)
+        assert await _titles(repository, todo_list.id) == ["a", "c", "b"]
+        await repository.move_task(a.id, b.id)
+        assert await _titles(repository, todo_list.id) == ["c", "b", "a"]
+        assert await repository.move_task(a.id + 100, None) is None
+
+        other = await repository.create_todo_list(user.id, "Other", None)
+        stranger = (await repository.create_task(other.id, {"title": "x"})).task
+        with pytest.raises(ValueError):
+            await repository.move_task(a.id, stranger.id)
+
+    asyncio.run(scenario())
+
+
+def test_move_task_between_equal_keys_rebalances(repository):
+    async def scenario():
+        user, todo_list, (a, b, c) = await _list_with_tasks(repository, ["a", "b", "c"])
+        for task in (a, b):
+            repository._put_task(task.model_copy(update={"position": "i0"}), user.id)
+        moved = await repository.move_task(c.id, a.id)
+        assert moved.rebalanced
+        assert await _titles(repository, todo_list.id) == ["a", "c", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_delete_task_leaves_tombstone(repository):
+    async def scenario():
+        user, todo_list, (a, b) = await _list_with_tasks(repository, ["a", "b"])
+        await repository.update_task(a.id, {"completed": True})
+        after = (0, 0)
+        horizon = await repository.sync_horizon()
+        assert await repository.sync_tombstones(user.id, after, horizon, 100) == []
+
+        deleted = await repository.delete_task(a.id)
+        assert (deleted.task.id, deleted.user_id) == (a.id, user.id)
+        assert await repository.get_task(a.id) is None
+        assert await repository.delete_task(a.id) is None
+        stored = await repository.get_todo_list(todo_list.id)
+        assert (stored.taskCount, stored.completedCount) == (1, 0)
+
+        horizon = await repository.sync_horizon()
+        (tombstone,) = await repository.sync_tombstones(user.id, after, horizon, 100)
+        assert (tombstone["entity"], tombstone["id"]) == ("task", a.id)
+        assert tombstone["todoListId"] == todo_list.id
+        synced = await repository.sync_tasks(user.id, after, horizon, 100)
+        assert [row["id"] for row in synced] == [b.id]
+
+        earlier = datetime.now(timezone.utc) - timedelta(hours=1)
+        assert await repository.purge_tombstones(earlier) == 0
+        later = datetime.now(timezone.utc) + timedelta(seconds=1)
+        assert await repository.purge_tombstones(later) == 1
+        horizon = await repository.sync_horizon()
+        assert await repository.sync_tombstones(user.id, after, horizon, 100) == []
+
+    asyncio.run(scenario())
+
+
+def test_delete_todo_list_leaves_tombstone(repository):
+    async def scenario():
+        user, todo_list, _ = await _list_with_tasks(repository, ["a", "b"])
+        assert await repository.delete_todo_list(todo_list.id) == 2
+        assert await repository.get_todo_list(todo_list.id) is None
+        horizon = await repository.sync_horizon()
+        tombstones = await repository.sync_tombstones(user.id, (0, 0), horizon, 100)
+        assert ("todolist", todo_list.id) in [
+            (tombstone["entity"], tombstone["id"]) for tombstone in tombstones
+        ]
+        assert await repository.sync_todo_lists(user.id, (0, 0), horizon, 100) == []
+
+    asyncio.run(scenario())
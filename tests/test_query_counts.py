@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+
+import prisma.models
+import project.background
+import project.database
+import project.deleteTask_service
+import project.prisma_repository
+import project.query_profiler
+import project.repository
+import project.updateTodoList_service
+import project.versioning
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("DATABASE_URL"), reason="needs DATABASE_URL with the schema applied"
+)
+
+
+def _against_database(scenario) -> None:
+    """
+    Runs `scenario(todo_list, tasks)` on the Prisma backend with a freshly seeded list of three
+    tasks, deferring audit entries to the background executor as the running application does.
+    """
+
+    async def run():
+        project.repository.use(project.prisma_repository.PrismaRepository())
+        await project.database.connect()
+        await project.background.executor.start()
+        try:
+            user = await prisma.models.User.prisma().create(
+                data={
+                    "email": f"queries-{time.time_ns()}@test.invalid",
+                    "password": "x",
+                }
+            )
+            todo_list = await prisma.models.TodoList.prisma().create(
+                data={"name": "queries", "userId": user.id}
+            )
+            tasks = [
+                (
+                    await project.repository.get().create_task(
+                        todo_list.id, {"title": title}
+                    )
+                ).task
+                for title in ("a", "b", "c")
+            ]
+            await scenario(todo_list, tasks)
+        finally:
+            await project.background.executor.stop()
+            await project.database.disconnect()
+
+    asyncio.run(run())
+
+
+def test_delete_task_is_one_query():
+    async def scenario(todo_list, tasks):
+        with project.query_profiler.assert_max_queries(1):
+            await project.deleteTask_service.deleteTask(tasks[0].id)
+        with project.query_profiler.assert_max_queries(1):
+            with pytest.raises(ValueError):
+                await project.deleteTask_service.deleteTask(tasks[0].id)
+
+    _against_database(scenario)
+
+
+def test_update_todo_list_is_one_query():
+    async def scenario(todo_list, tasks):
+        with project.query_profiler.assert_max_queries(1):
+            updated = await project.updateTodoList_service.updateTodoList(
+                todo_list.id, "renamed", None
+            )
+        with project.query_profiler.assert_max_queries(1):
+            await project.updateTodoList_service.updateTodoList(
+                todo_list.id, "again", "notes", expected_version=updated.version
+            )
+
+    _against_database(scenario)
+
+
+def test_update_todo_list_conflict_costs_one_more_query():
+    async def scenario(todo_list, tasks):
+        with project.query_profiler.assert_max_queries(2):
+            with pytest.raises(project.versioning.VersionConflictError):
+                await project.updateTodoList_service.updateTodoList(
+                    todo_list.id,
+                    "renamed",
+                    None,
+                    expected_version=todo_list.version + 1,
+                )
+
+    _against_database(scenario)
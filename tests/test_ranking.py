@@ -0,0 +1,129 @@
+import asyncio
+import random
+
+import project.ranking
+import pytest
+
+key_between = project.ranking.key_between
+SMALLEST_INTEGER = project.ranking.SMALLEST_INTEGER
+LARGEST_INTEGER = project.ranking.DIGITS[-1] * 19
+
+
+def _assert_between(a, b):
+    key = key_between(a, b)
+    assert project.ranking.is_key(key), key
+    assert a is None or a < key
+    assert b is None or key < b
+    return key
+
+
+def test_documented_examples():
+    assert key_between(None, None) == "i0"
+    assert key_between("i5", None) == "i6"
+    assert key_between("i5", "i6") == "i5i"
+    assert project.ranking.keys_after("i5", 2) == ["i6", "i7"]
+    assert project.ranking.spread_keys(3) == ["i9", "ii", "ir"]
+
+
+def test_random_inserts_stay_between_their_neighbours():
+    rng = random.Random(43)
+    keys = [key_between(None, None)]
+    for _ in range(5000):
+        n = rng.randrange(len(keys) + 1)
+        a = keys[n - 1] if n > 0 else None
+        b = keys[n] if n < len(keys) else None
+        keys.insert(n, _assert_between(a, b))
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_repeated_inserts_at_one_spot_stay_ordered():
+    a, b = "i0", "i1"
+    for _ in range(200):
+        b = _assert_between(a, b)
+    a, b = "i0", "i1"
+    for _ in range(200):
+        a = _assert_between(a, b)
+
+
+@pytest.mark.parametrize("start", [None, "i0"])
+def test_appends_and_prepends_grow_keys_logarithmically(start):
+    last = first = key_between(start, None)
+    for _ in range(20_000):
+        last = _assert_between(last, None)
+        first = _assert_between(None, first)
+    assert len(last) <= 4
+    assert len(first) <= 4
+
+
+def test_integer_carries_into_the_next_head_digit():
+    assert key_between("iz", None) == "j00"
+    assert key_between("jzz", None) == "k000"
+    assert key_between(None, "i0") == "hz"
+    assert key_between(None, "h0") == "gzz"
+    assert key_between("hz", None) == "i0"
+    assert key_between(None, "j00") == "iz"
+
+
+def test_ends_of_the_integer_range():
+    assert key_between(LARGEST_INTEGER, None) == LARGEST_INTEGER + "i"
+    _assert_between(LARGEST_INTEGER, None)
+    above_smallest = SMALLEST_INTEGER[:-1] + "1"
+    smallest = _assert_between(None, above_smallest)
+    assert smallest.startswith(SMALLEST_INTEGER)
+    below = smallest
+    for _ in range(50):
+        below = _assert_between(None, below)
+    assert not project.ranking.is_key(SMALLEST_INTEGER)
+    with pytest.raises(ValueError):
+        key_between(SMALLEST_INTEGER, None)
+
+
+@pytest.mark.parametrize("key", ["5", "a", "8zz", "i50", "", "I5", "i-"])
+def test_keys_in_other_formats_are_rejected(key):
+    assert not project.ranking.is_key(key)
+    with pytest.raises(ValueError):
+        key_between(key, None)
+    with pytest.raises(ValueError):
+        key_between(None, key)
+
+
+def test_equal_or_reversed_neighbours_are_rejected():
+    with pytest.raises(ValueError):
+        key_between("i5", "i5")
+    with pytest.raises(ValueError):
+        key_between("i6", "i5")
+
+
+@pytest.mark.parametrize("count", [1, 2, 17, 18, 647, 648, 10_000])
+def test_spread_keys(count):
+    keys = project.ranking.spread_keys(count)
+    assert len(keys) == count
+    assert keys == sorted(set(keys))
+    assert len({len(key) for key in keys}) == 1
+    assert len(keys[0]) <= 2 + len(str(2 * count))
+    for a, b in zip([None] + keys, keys + [None]):
+        _assert_between(a, b)
+
+
+def test_legacy_keys_are_rebalanced_on_append(repository):
+    async def scenario():
+        user = await repository.create_user("owner@example.com", "secret")
+        todo_list = await repository.create_todo_list(user.id, "Inbox", None)
+        tasks = [
+            (await repository.create_task(todo_list.id, {"title": title})).task
+            for title in ("a", "b", "c")
+        ]
+        for task, legacy in zip(tasks, ("4", "8", "8i")):
+            repository._put_task(task.model_copy(update={"position": legacy}), user.id)
+        await repository.create_task(todo_list.id, {"title": "d"})
+        ordered = (await repository.read_todo_list(todo_list.id)).tasks
+        assert [task.title for task in ordered] == ["a", "b", "c", "d"]
+        assert [task.position for task in ordered[:3]] == project.ranking.spread_keys(3)
+        assert all(project.ranking.is_key(task.position) for task in ordered)
+
+        assert await repository.rebalance_todo_list(todo_list.id) == (user.id, 4)
+        ordered = (await repository.read_todo_list(todo_list.id)).tasks
+        assert [task.position for task in ordered] == project.ranking.spread_keys(4)
+
+    asyncio.run(scenario())
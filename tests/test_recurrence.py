@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import project.recurrence
+import project.updateOccurrence_service
+import project.versioning
+import pytest
+
+# A Wednesday.
+START = datetime(2026, 3, 4, 9, tzinfo=timezone.utc)
+
+
+def _at(day: int, month: int = 3) -> datetime:
+    return datetime(2026, month, day, 9, tzinfo=timezone.utc)
+
+
+def _occurrences(rule: str, start=START, window_start=START, days=28, limit=100):
+    return project.recurrence.occurrences(
+        project.recurrence.parse(rule),
+        start,
+        window_start,
+        window_start + timedelta(days=days),
+        limit,
+    )
+
+
+def test_byday_starts_at_the_first_listed_day_on_or_after_the_start():
+    assert _occurrences("FREQ=WEEKLY;BYDAY=MO,TH", days=14) == [
+        _at(5),
+        _at(9),
+        _at(12),
+        _at(16),
+    ]
+    assert _occurrences("FREQ=WEEKLY;BYDAY=WE", days=14) == [_at(4), _at(11)]
+
+
+def test_byday_with_interval_skips_weeks_from_the_start():
+    assert _occurrences("RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR", days=28) == [
+        _at(6),
+        _at(16),
+        _at(20),
+        _at(30),
+    ]
+
+
+def test_byday_window_after_the_start():
+    assert _occurrences("FREQ=WEEKLY;BYDAY=MO,TH", window_start=_at(10), days=7) == [
+        _at(12),
+        _at(16),
+    ]
+
+
+def test_count_counts_from_the_start_not_the_window():
+    rule = "FREQ=WEEKLY;BYDAY=MO,TH;COUNT=3"
+    assert _occurrences(rule) == [_at(5), _at(9), _at(12)]
+    assert _occurrences(rule, window_start=_at(10)) == [_at(12)]
+    assert _occurrences(rule, window_start=_at(13)) == []
+    assert _occurrences("FREQ=DAILY;COUNT=2", window_start=_at(1, 4)) == []
+
+
+def test_until_is_inclusive():
+    assert _occurrences("FREQ=DAILY;UNTIL=20260306T090000Z") == [
+        _at(4),
+        _at(5),
+        _at(6),
+    ]
+    assert _occurrences("FREQ=DAILY;UNTIL=20260306T085959Z") == [_at(4), _at(5)]
+    assert _occurrences("FREQ=WEEKLY;BYDAY=MO,TH;UNTIL=20260312") == [_at(5), _at(9)]
+
+
+def test_monthly_keeps_to_the_end_of_shorter_months():
+    assert _occurrences(
+        "FREQ=MONTHLY;COUNT=3",
+        start=datetime(2026, 1, 31, 9, tzinfo=timezone.utc),
+        window_start=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        days=120,
+    ) == [
+        datetime(2026, 1, 31, 9, tzinfo=timezone.utc),
+        datetime(2026, 2, 28, 9, tzinfo=timezone.utc),
+        datetime(2026, 3, 31, 9, tzinfo=timezone.utc),
+    ]
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        "FREQ=HOURLY",
+        "FREQ=DAILY;BYDAY=MO",
+        "FREQ=WEEKLY;BYDAY=XX",
+        "FREQ=DAILY;COUNT=2;UNTIL=20260310",
+        "FREQ=DAILY;COUNT=0",
+        "FREQ=DAILY;BYMONTH=1",
+    ],
+)
+def test_unsupported_rules_are_rejected(rule):
+    with pytest.raises(project.recurrence.InvalidRecurrenceError):
+        project.recurrence.parse(rule)
+
+
+async def _repeating_task(repository, rule):
+    user = await repository.create_user("owner@example.com", "secret")
+    todo_list = await repository.create_todo_list(user.id, "Chores", None)
+    created = await repository.create_task(
+        todo_list.id,
+        {"title": "Water the plants", "dueDate": START, "recurrence": rule},
+    )
+    return created.task
+
+
+def test_occurrence_override_only_changes_that_occurrence(repository):
+    async def scenario():
+        task = await _repeating_task(repository, "FREQ=WEEKLY;BYDAY=MO,TH")
+        updated = await project.updateOccurrence_service.updateOccurrence(
+            task.id, _at(9), {"completed": True, "title": "Water the cactus"}
+        )
+        assert (updated.completed, updated.title, updated.version) == (
+            True,
+            "Water the cactus",
+            1,
+        )
+
+        expansion = await project.recurrence.expand([task], START, _at(13))
+        assert not expansion.truncated
+        assert [
+            (at, occurrence.completed, occurrence.title)
+            for occurrence, at in expansion.tasks
+        ] == [
+            (_at(5), False, "Water the plants"),
+            (_at(9), True, "Water the cactus"),
+            (_at(12), False, "Water the plants"),
+        ]
+        assert (await repository.get_task(task.id)).completed is False
+
+        reverted = await project.updateOccurrence_service.updateOccurrence(
+            task.id, _at(9), {"title": None}, expected_version=1
+        )
+        assert (reverted.title, reverted.completed, reverted.version) == (
+            "Water the plants",
+            True,
+            2,
+        )
+
+    asyncio.run(scenario())
+
+
+def test_occurrence_override_conflicts_and_unknown_times(repository):
+    async def scenario():
+        task = await _repeating_task(repository, "FREQ=WEEKLY;BYDAY=MO,TH;COUNT=3")
+        await project.updateOccurrence_service.updateOccurrence(
+            task.id, _at(5), {"completed": True}, expected_version=0
+        )
+        with pytest.raises(project.versioning.VersionConflictError):
+            await project.updateOccurrence_service.updateOccurrence(
+                task.id, _at(5), {"completed": False}, expected_version=0
+            )
+        for not_scheduled in (_at(6), _at(16)):
+            with pytest.raises(
+                project.updateOccurrence_service.OccurrenceNotFoundError
+            ):
+                await project.updateOccurrence_service.updateOccurrence(
+                    task.id, not_scheduled, {"completed": True}
+                )
+
+    asyncio.run(scenario())
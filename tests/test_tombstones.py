@@ -0,0 +1,32 @@
+import asyncio
+
+import project.database
+import project.deleteTask_service
+import project.shards
+import project.tombstones
+
+
+def test_delete_on_one_shard_purges_every_shard(repository, monkeypatch):
+    purged_on = []
+
+    async def purge_tombstones(before):
+        purged_on.append(project.database.current_shard())
+        return 1
+
+    monkeypatch.setattr(project.database, "shard_clients", [object(), object()])
+    monkeypatch.setattr(project.tombstones, "_last_purge", float("-inf"))
+    monkeypatch.setattr(repository, "purge_tombstones", purge_tombstones)
+
+    async def scenario():
+        user = await repository.create_user("owner@example.com", "secret")
+        todo_list = await repository.create_todo_list(user.id, "Groceries", None)
+        task = (await repository.create_task(todo_list.id, {"title": "Milk"})).task
+
+        async def use_task(task_id):
+            project.database.use_shard(1)
+
+        monkeypatch.setattr(project.shards, "use_task", use_task)
+        await project.deleteTask_service.deleteTask(task.id)
+
+    asyncio.run(scenario())
+    assert sorted(purged_on) == [0, 1]